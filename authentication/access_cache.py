@@ -0,0 +1,118 @@
+"""
+Cross-request cache of each user's branch access and permission flags
+
+Entries are keyed by user and by two version tokens: one per user (bumped
+when the user's profile or branch assignments change) and one shared by all
+users (bumped when any branch changes, since admins see every active branch
+and ``is_active`` affects everyone). Bumping a version orphans the old
+entries, which then expire on their own.
+
+Invalidation only works if every worker process reads the same cache; with
+a per-process backend (local memory, dummy) entries are not cached at all.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+CACHE_PREFIX = 'branch_access'
+BRANCHES_VERSION_KEY = f'{CACHE_PREFIX}:branches:version'
+
+PERMISSION_FLAGS = (
+    'can_register_members',
+    'can_view_directory',
+    'can_view_full_details',
+    'can_manage_users',
+    'can_export_data',
+    'can_manage_attendance',
+    'can_manage_news',
+    'is_system_admin',
+    'is_branch_admin',
+)
+
+
+def user_version_key(user_id):
+    return f'{CACHE_PREFIX}:user:{user_id}:version'
+
+
+def is_shared_cache():
+    """False for per-process caches, whose invalidations other workers never see"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _current_version(key):
+    version = cache.get(key)
+    if version is None:
+        # add() so concurrent workers agree on a single initial version
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def _invalidate(key):
+    _bump_version(key)
+    # Bump again after commit so a request that read the old rows before the
+    # commit cannot keep its stale entry under the new version
+    transaction.on_commit(lambda: _bump_version(key))
+
+
+def build_user_access(profile):
+    """Compute the access entry for a profile from the database"""
+    from membership.models import Branch
+    if profile.is_system_admin:
+        branches = Branch.objects.filter(is_active=True)
+    else:
+        branches = profile.branches.filter(is_active=True)
+    return {
+        'role': profile.role,
+        'primary_branch_id': profile.primary_branch_id,
+        'branch_ids': frozenset(branches.values_list('id', flat=True)),
+        'permissions': {flag: getattr(profile, flag) for flag in PERMISSION_FLAGS},
+    }
+
+
+def get_user_access(user_id, profile=None):
+    """
+    Return the cached access entry for a user, building it from ``profile``
+    (loaded if not given) on a miss; None if the user has no profile.
+    """
+    if not is_shared_cache():
+        return _build_for_user(user_id, profile)
+    key = '{prefix}:user:{user_id}:{user_version}:{branches_version}'.format(
+        prefix=CACHE_PREFIX,
+        user_id=user_id,
+        user_version=_current_version(user_version_key(user_id)),
+        branches_version=_current_version(BRANCHES_VERSION_KEY),
+    )
+    access = cache.get(key)
+    if access is None:
+        access = _build_for_user(user_id, profile)
+        if access is not None:
+            cache.set(key, access, settings.BRANCH_ACCESS_CACHE_TIMEOUT)
+    return access
+
+
+def _build_for_user(user_id, profile=None):
+    if profile is None:
+        from .models import UserProfile
+        profile = UserProfile.objects.filter(user_id=user_id).first()
+        if profile is None:
+            return None
+    return build_user_access(profile)
+
+
+def invalidate_user_access(user_id):
+    """Drop one user's cached access (role or branch assignment changed)"""
+    _invalidate(user_version_key(user_id))
+
+
+def invalidate_all_access():
+    """Drop every user's cached access (a branch was added, changed or removed)"""
+    _invalidate(BRANCHES_VERSION_KEY)
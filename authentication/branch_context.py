@@ -6,65 +6,50 @@ from django.shortcuts import get_object_or_404
 from django.http import Http404
 from functools import wraps
 
+from .access_cache import get_user_access
+from .middleware import BranchAccess, get_branch_access
+
 
 class BranchContextManager:
     """Manages branch context for user sessions"""
     
-    SESSION_KEY = 'selected_branch_id'
+    SESSION_KEY = BranchAccess.SESSION_KEY
     
     @classmethod
     def set_branch_context(cls, request, branch_id):
         """Set the selected branch in user session"""
         if request.user.is_authenticated:
             # Verify user has access to this branch
-            if cls.user_can_access_branch(request.user, branch_id):
-                request.session[cls.SESSION_KEY] = branch_id
-                return True
+            return get_branch_access(request).select(branch_id)
         return False
     
     @classmethod
     def get_branch_context(cls, request):
         """Get the currently selected branch from session"""
         if request.user.is_authenticated:
-            branch_id = request.session.get(cls.SESSION_KEY)
-            if branch_id:
-                try:
-                    from membership.models import Branch
-                    branch = Branch.objects.get(id=branch_id, is_active=True)
-                    # Verify user still has access
-                    if cls.user_can_access_branch(request.user, branch_id):
-                        return branch
-                    else:
-                        # Remove invalid branch from session
-                        cls.clear_branch_context(request)
-                except Branch.DoesNotExist:
-                    cls.clear_branch_context(request)
+            return get_branch_access(request).selected_branch
         return None
     
     @classmethod
     def clear_branch_context(cls, request):
         """Clear branch context from session"""
-        if cls.SESSION_KEY in request.session:
-            del request.session[cls.SESSION_KEY]
+        get_branch_access(request).clear()
     
     @classmethod
-    def user_can_access_branch(cls, user, branch_id):
+    def user_can_access_branch(cls, user, branch_id, request=None):
         """Check if user can access the specified branch"""
-        if not user.is_authenticated or not hasattr(user, 'profile'):
-            return False
+        if request is not None and request.user == user:
+            return get_branch_access(request).can_access(branch_id)
         
-        profile = user.profile
-        
-        # System admin can access all branches
-        if profile.is_system_admin:
-            return True
+        if not user.is_authenticated:
+            return False
         
-        # Check if branch is in user's accessible branches
+        access = get_user_access(user.pk)
+        if not access:
+            return False
         try:
-            from membership.models import Branch
-            branch = Branch.objects.get(id=branch_id, is_active=True)
-            return profile.get_accessible_branches().filter(id=branch_id).exists()
-        except Branch.DoesNotExist:
+            return int(branch_id) in access['branch_ids']
+        except (TypeError, ValueError):
             return False
     
     @classmethod
@@ -86,7 +71,7 @@ def require_branch_access(view_func):
         branch_id = request.GET.get('branch') or request.session.get(BranchContextManager.SESSION_KEY)
         
         if branch_id:
-            if not BranchContextManager.user_can_access_branch(request.user, branch_id):
+            if not get_branch_access(request).can_access(branch_id):
                 raise Http404("Branch not found or access denied")
         
         return view_func(request, *args, **kwargs)
@@ -113,9 +98,9 @@ def branch_scoped_queryset(queryset, request, branch_field='branch'):
     """
     Filter queryset to only include records from the selected branch
     """
-    branch = BranchContextManager.get_branch_context(request)
-    if branch:
-        filter_kwargs = {branch_field: branch}
+    branch_id = get_branch_access(request).selected_branch_id
+    if branch_id:
+        filter_kwargs = {f'{branch_field}_id': branch_id}
         return queryset.filter(**filter_kwargs)
     
     # If no branch context, return empty queryset for security
@@ -126,57 +111,28 @@ def get_branch_scoped_stats(request, branch=None):
     """
     Get detailed statistics scoped to the selected branch
     """
-    from membership.models import Member
-    from datetime import datetime
+    from membership.stats import rollup_member_stats, empty_member_stats
     
     if not branch:
         branch = BranchContextManager.get_branch_context(request)
     
     if not branch:
-        return {
-            'total_members': 0,
-            'new_members_this_month': 0,
-            'baptized_members': 0,
-            'membership_class_completed': 0,
-        }
-    
-    # Get current month for filtering
-    current_month = datetime.now().replace(day=1)
+        return empty_member_stats()
     
-    # Filter members by branch
-    branch_members = Member.objects.filter(branch=branch)
-    
-    return {
-        'total_members': branch_members.count(),
-        'new_members_this_month': branch_members.filter(registration_date__gte=current_month).count(),
-        'baptized_members': branch_members.filter(baptized='Yes').count(),
-        'membership_class_completed': branch_members.filter(membership_class='Yes').count(),
-    }
+    return rollup_member_stats(branch=branch)
 
 
 def get_aggregated_overview_stats(request):
     """
     Get aggregated overview statistics across all user's accessible branches
     """
-    from membership.models import Member
-    from datetime import datetime
-    
-    # Get current month for filtering
-    current_month = datetime.now().replace(day=1)
+    from membership.stats import rollup_member_stats, empty_member_stats
     
-    # Get user's accessible members based on their role and branch assignments
-    if request.user.is_authenticated and hasattr(request.user, 'profile'):
-        profile = request.user.profile
-        if profile.is_system_admin:
-            members_queryset = Member.objects.all()
-        else:
-            members_queryset = profile.get_accessible_members()
-    else:
-        members_queryset = Member.objects.none()
+    # Scope the rollup to the user's branches based on their role and assignments
+    access = get_branch_access(request)
+    if not access.user_access:
+        return empty_member_stats()
     
-    return {
-        'total_members': members_queryset.count(),
-        'new_members_this_month': members_queryset.filter(registration_date__gte=current_month).count(),
-        'baptized_members': members_queryset.filter(baptized='Yes').count(),
-        'membership_class_completed': members_queryset.filter(membership_class='Yes').count(),
-    }
+    if access.is_system_admin:
+        return rollup_member_stats()
+    return rollup_member_stats(branch_id__in=access.accessible_branch_ids)
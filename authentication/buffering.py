@@ -0,0 +1,141 @@
+"""
+Buffered background writer for append-only rows (audit logs, attendance)
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.db import DataError, IntegrityError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedBulkWriter:
+    """
+    Queue unsaved model instances in process and insert them with
+    ``bulk_create`` from a background thread.
+
+    A flush happens when ``max_batch_size`` rows are queued or every
+    ``flush_interval`` seconds, whichever comes first. ``flush()`` may also be
+    called directly (e.g. from a gunicorn ``worker_exit`` hook); it is
+    registered with ``atexit`` so queued rows are written on graceful
+    shutdown.
+
+    If a batch fails, its rows are retried one at a time and rows the
+    database still rejects (e.g. a foreign key to a deleted user) are logged
+    and dropped, so one bad row cannot block later flushes. While the
+    database is unreachable rows stay queued, up to ``max_queue_size``;
+    beyond that the oldest rows are dropped.
+    """
+
+    def __init__(self, model, max_batch_size=100, flush_interval=2.0, ignore_conflicts=False,
+                 max_queue_size=10000):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.ignore_conflicts = ignore_conflicts
+        self.max_queue_size = max_queue_size
+        self._queue = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def add(self, instance):
+        """Queue one unsaved instance for insertion"""
+        with self._lock:
+            self._ensure_thread()
+            self._queue.append(instance)
+            overflow = len(self._queue) > self.max_queue_size
+            if overflow:
+                del self._queue[0]
+            full = len(self._queue) >= self.max_batch_size
+        if overflow:
+            logger.error(f"Buffered {self.model.__name__} queue is full, dropped the oldest row")
+        if full:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        """Start the flush thread (again after a fork, e.g. gunicorn preload_app)"""
+        if self._pid != os.getpid():
+            # Rows queued before a fork belong to the parent process
+            self._queue = []
+            self._thread = None
+            self._pid = os.getpid()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name=f'{self.model.__name__}Writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # The thread never sees request_finished, so never reuse a stale connection
+                connection.close()
+
+    def flush(self):
+        """Write every queued row now; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queue = self._queue, []
+            if not batch:
+                return 0
+            try:
+                # Savepoint, so a failure does not break a surrounding transaction
+                with transaction.atomic():
+                    batch = self.prepare(batch)
+                    self._insert(batch)
+            except Exception:
+                logger.warning(
+                    f"Failed to write {len(batch)} buffered {self.model.__name__} rows, retrying one by one",
+                    exc_info=True,
+                )
+                return self._flush_one_by_one(batch)
+            return len(batch)
+
+    def prepare(self, batch):
+        """Hook for subclasses: filter the rows about to be written"""
+        return batch
+
+    def _insert(self, rows):
+        self.model.objects.bulk_create(
+            rows, batch_size=self.max_batch_size, ignore_conflicts=self.ignore_conflicts
+        )
+
+    def _flush_one_by_one(self, batch):
+        """Write rows individually, dropping the ones the database rejects"""
+        written = 0
+        for position, row in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    self._insert([row])
+            except (IntegrityError, DataError):
+                logger.exception(f"Dropping buffered {self.model.__name__} row the database rejected")
+            except Exception:
+                logger.exception(f"Database unavailable, keeping {len(batch) - position} buffered {self.model.__name__} rows")
+                self._requeue(batch[position:])
+                break
+            else:
+                written += 1
+        return written
+
+    def _requeue(self, rows):
+        """Put unwritten rows back in front of the queue, within max_queue_size"""
+        with self._lock:
+            self._queue[:0] = rows
+            overflow = len(self._queue) - self.max_queue_size
+            if overflow > 0:
+                del self._queue[:overflow]
+        if overflow > 0:
+            logger.error(f"Buffered {self.model.__name__} queue is full, dropped the {overflow} oldest rows")
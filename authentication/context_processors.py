@@ -1,49 +1,53 @@
 """
 Context processors for authentication app
 """
-from .models import UserProfile
+from django.utils.functional import SimpleLazyObject
+
+from .middleware import get_branch_access
 
 
 def user_profile_context(request):
     """
     Add user profile information to template context
+
+    Every value is lazy: nothing is queried unless the template uses it.
+    Role and permission flags come from the per-request branch access (backed
+    by the cross-request access cache); ``user_profile`` reuses
+    ``request.user.profile``. The render never creates a profile.
     """
-    context = {}
-    
-    if request.user.is_authenticated:
-        try:
-            # Get or create user profile
-            profile, created = UserProfile.objects.get_or_create(user=request.user)
-            
-            # Add profile information to context
-            context.update({
-                'user_profile': profile,
-                'user_role': profile.role,
-                'can_register_members': profile.can_register_members,
-                'can_view_directory': profile.can_view_directory,
-                'can_manage_users': getattr(profile, 'can_manage_users', False),
-                'is_admin': profile.role == 'admin',
-            })
-            
-        except Exception as e:
-            # Fallback if profile doesn't exist or there's an error
-            context.update({
-                'user_profile': None,
-                'user_role': 'member',
-                'can_register_members': False,
-                'can_view_directory': False,
-                'can_manage_users': False,
-                'is_admin': False,
-            })
-    else:
+    if not request.user.is_authenticated:
         # For anonymous users
-        context.update({
+        return {
             'user_profile': None,
             'user_role': None,
             'can_register_members': False,
             'can_view_directory': False,
             'can_manage_users': False,
             'is_admin': False,
-        })
-    
-    return context
+        }
+
+    def user_access():
+        return get_branch_access(request).user_access
+
+    def get_profile():
+        # Users without a profile get None instead of a new row
+        return getattr(request.user, 'profile', None)
+
+    def get_role():
+        access = user_access()
+        return access['role'] if access else 'member'
+
+    def permission(flag):
+        def get_flag():
+            access = user_access()
+            return bool(access and access['permissions'][flag])
+        return SimpleLazyObject(get_flag)
+
+    return {
+        'user_profile': SimpleLazyObject(get_profile),
+        'user_role': SimpleLazyObject(get_role),
+        'can_register_members': permission('can_register_members'),
+        'can_view_directory': permission('can_view_directory'),
+        'can_manage_users': permission('can_manage_users'),
+        'is_admin': permission('is_system_admin'),
+    }
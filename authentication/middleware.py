@@ -0,0 +1,103 @@
+"""
+Middleware for authentication app
+"""
+from django.utils.functional import cached_property
+
+from .access_cache import get_user_access
+
+
+class BranchAccess:
+    """
+    Branch access of the current request's user, resolved lazily and at most
+    once per request: the accessible branch ID set (from the cross-request
+    access cache), the selected branch ID (validated against that set) and the
+    selected Branch object.
+    """
+    SESSION_KEY = 'selected_branch_id'
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def user_access(self):
+        """The user's cached role, permission flags and branch IDs (None if anonymous)"""
+        user = getattr(self.request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        return get_user_access(user.pk)
+
+    @cached_property
+    def is_system_admin(self):
+        return bool(self.user_access and self.user_access['permissions']['is_system_admin'])
+
+    @cached_property
+    def accessible_branch_ids(self):
+        """IDs of the active branches the user may access"""
+        if not self.user_access:
+            return frozenset()
+        return self.user_access['branch_ids']
+
+    def can_access(self, branch_id):
+        """Check if the user can access the specified branch"""
+        try:
+            return int(branch_id) in self.accessible_branch_ids
+        except (TypeError, ValueError):
+            return False
+
+    @cached_property
+    def selected_branch_id(self):
+        """Selected branch from the session, if the user may still access it"""
+        if not self.user_access:
+            return None
+        branch_id = self.request.session.get(self.SESSION_KEY)
+        if not branch_id:
+            return None
+        if not self.can_access(branch_id):
+            # Remove invalid branch from session
+            self.clear()
+            return None
+        return int(branch_id)
+
+    @cached_property
+    def selected_branch(self):
+        if self.selected_branch_id is None:
+            return None
+        from membership.models import Branch
+        return Branch.objects.filter(id=self.selected_branch_id).first()
+
+    def select(self, branch_id):
+        """Store the selected branch in the session; False if access is denied"""
+        if not self.can_access(branch_id):
+            return False
+        if self.request.session.get(self.SESSION_KEY) != branch_id:
+            self.request.session[self.SESSION_KEY] = branch_id
+        self._reset_selection()
+        return True
+
+    def clear(self):
+        if self.SESSION_KEY in self.request.session:
+            del self.request.session[self.SESSION_KEY]
+        self._reset_selection()
+
+    def _reset_selection(self):
+        self.__dict__.pop('selected_branch_id', None)
+        self.__dict__.pop('selected_branch', None)
+
+
+def get_branch_access(request):
+    """Return the request's BranchAccess, creating it if the middleware did not run"""
+    access = getattr(request, 'branch_access', None)
+    if access is None:
+        access = request.branch_access = BranchAccess(request)
+    return access
+
+
+class BranchAccessMiddleware:
+    """Attach a lazily-resolved BranchAccess to every request as ``request.branch_access``"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.branch_access = BranchAccess(request)
+        return self.get_response(request)
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:10
+
+from django.db import migrations, models
+import django.utils.timezone
+import sys
+import os
+
+# Add the project root to the path to import safe_migration_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from safe_migration_utils import SafeAlterField
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_userprofile_branches_userprofile_primary_branch_and_more'),
+    ]
+
+    operations = [
+        SafeAlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
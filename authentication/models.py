@@ -1,7 +1,8 @@
 from django.contrib.auth.models import User, Group
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 class UserProfile(models.Model):
@@ -90,26 +91,29 @@ class UserProfile(models.Model):
         """Check if user is branch administrator"""
         return self.role == 'branch_admin'
     
+    @property
+    def accessible_branch_ids(self):
+        """IDs of the active branches this user can access (cached across requests)"""
+        from .access_cache import get_user_access
+        return get_user_access(self.user_id, profile=self)['branch_ids']
+    
     def get_accessible_branches(self):
         """Get branches this user can access"""
-        if self.is_system_admin:
-            from membership.models import Branch
-            return Branch.objects.filter(is_active=True)
-        return self.branches.filter(is_active=True)
+        from membership.models import Branch
+        return Branch.objects.filter(id__in=self.accessible_branch_ids)
     
     def can_access_branch(self, branch):
         """Check if user can access a specific branch"""
         if self.is_system_admin:
             return True
-        return self.branches.filter(id=branch.id).exists()
+        return branch.id in self.accessible_branch_ids
     
     def get_accessible_members(self):
         """Get members this user can access"""
         from membership.models import Member
         if self.is_system_admin:
             return Member.objects.all()
-        accessible_branches = self.get_accessible_branches()
-        return Member.objects.filter(branch__in=accessible_branches)
+        return Member.objects.filter(branch_id__in=self.accessible_branch_ids)
     
     def get_accessible_member_fields(self):
         """Return list of member fields this user can access"""
@@ -136,6 +140,35 @@ def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
 
 
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_access(sender, instance, **kwargs):
+    """Role or profile changes invalidate the user's cached branch access"""
+    from .access_cache import invalidate_user_access
+    invalidate_user_access(instance.user_id)
+
+
+@receiver(m2m_changed, sender=UserProfile.branches.through)
+def invalidate_branch_assignment_access(sender, instance, action, reverse, **kwargs):
+    """Branch assignment changes invalidate the affected users' cached access"""
+    if not action.startswith('post_'):
+        return
+    from .access_cache import invalidate_user_access, invalidate_all_access
+    if reverse:
+        # Changed from the branch side (branch.users.add(...)): many users may be affected
+        invalidate_all_access()
+    else:
+        invalidate_user_access(instance.user_id)
+
+
+@receiver(post_save, sender='membership.Branch')
+@receiver(post_delete, sender='membership.Branch')
+def invalidate_branch_access(sender, instance, **kwargs):
+    """Branch changes (e.g. is_active) invalidate every user's cached access"""
+    from .access_cache import invalidate_all_access
+    invalidate_all_access()
+
+
 class AuditLog(models.Model):
     """Track user actions for security and compliance"""
     
@@ -154,7 +187,8 @@ class AuditLog(models.Model):
     target_member_id = models.CharField(max_length=20, blank=True, null=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     user_agent = models.TextField(blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the action happens, not when a buffered row is flushed
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     details = models.JSONField(blank=True, null=True, help_text="Additional action details")
     
     class Meta:
@@ -1,3 +1,289 @@
-from django.test import TestCase
+from datetime import timedelta
+import decimal
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import Http404, HttpResponse
+from django.db import OperationalError, connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from church_portal.renderers import OrjsonRenderer, OrjsonResponse
+from church_portal.test_runner import SharedCacheMixin
+from membership.models import Branch, Member
+from .branch_context import BranchContextManager, branch_scoped_queryset, require_branch_access
+from .access_cache import get_user_access
+from .buffering import BufferedBulkWriter
+from .context_processors import user_profile_context
+from .middleware import BranchAccessMiddleware
+from .models import AuditLog, UserProfile
+from .utils import log_user_action
+
+
+class BufferedAuditLogTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('admin', password='x')
+        # Long interval so only explicit flushes write during the test
+        self.writer = BufferedBulkWriter(AuditLog, max_batch_size=50, flush_interval=3600)
+
+    @override_settings(AUDIT_LOG_BUFFERED=True)
+    def test_log_user_action_is_queued_until_flush(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        with mock.patch('authentication.utils.audit_log_writer', self.writer):
+            with self.assertNumQueries(0):
+                for i in range(3):
+                    log_user_action(self.user, 'export_data', request=request, details={'n': i})
+        self.assertEqual(len(self.writer), 3)
+        self.assertFalse(AuditLog.objects.exists())
+
+        # One INSERT, wrapped in a savepoint
+        with self.assertNumQueries(3):
+            self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(AuditLog.objects.filter(ip_address='10.0.0.1').count(), 3)
+        self.assertEqual(self.writer.flush(), 0)
+
+    def test_flush_keeps_event_timestamps(self):
+        happened_at = timezone.now() - timedelta(minutes=5)
+        self.writer.add(AuditLog(user=self.user, action='login', timestamp=happened_at))
+        self.writer.flush()
+        self.assertEqual(AuditLog.objects.get().timestamp, happened_at)
+
+    def test_rejected_row_is_dropped_without_blocking_the_queue(self):
+        self.writer.add(AuditLog(user=self.user, action='login'))
+        # NOT NULL violation: the batch fails, then only this row is dropped
+        self.writer.add(AuditLog(user=self.user, action=None))
+        self.writer.add(AuditLog(user=self.user, action='logout'))
+        with self.assertLogs('authentication.buffering', 'ERROR'):
+            self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(len(self.writer), 0)
+        self.assertEqual(AuditLog.objects.count(), 2)
+
+        self.writer.add(AuditLog(user=self.user, action='login'))
+        self.assertEqual(self.writer.flush(), 1)
+
+    def test_rows_are_kept_while_the_database_is_down_up_to_the_cap(self):
+        writer = BufferedBulkWriter(AuditLog, max_batch_size=50, flush_interval=3600, max_queue_size=3)
+        with mock.patch.object(writer, '_insert', side_effect=OperationalError('database is locked')):
+            for action in ['login', 'logout', 'login']:
+                writer.add(AuditLog(user=self.user, action=action))
+            with self.assertLogs('authentication.buffering', 'ERROR'):
+                self.assertEqual(writer.flush(), 0)
+                writer.add(AuditLog(user=self.user, action='export_data'))
+        self.assertEqual([row.action for row in writer._queue], ['logout', 'login', 'export_data'])
+        self.assertEqual(writer.flush(), 3)
+
+    def test_synchronous_fallback(self):
+        with override_settings(AUDIT_LOG_BUFFERED=False):
+            log_user_action(self.user, 'logout')
+        self.assertEqual(AuditLog.objects.filter(action='logout').count(), 1)
+
+
+class BranchAccessMiddlewareTests(SharedCacheMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+        cls.user = User.objects.create_user('secretary', password='x')
+        cls.user.profile.role = 'secretary'
+        cls.user.profile.save()
+        cls.user.profile.branches.add(cls.branch)
+
+    def make_request(self, path='/', **params):
+        request = RequestFactory().get(path, params)
+        request.user = User.objects.select_related('profile').get(pk=self.user.pk)
+        request.session = SessionStore()
+        BranchAccessMiddleware(lambda request: HttpResponse())(request)
+        return request
+
+    def test_branch_access_resolved_once_per_request(self):
+        request = self.make_request()
+        view = require_branch_access(lambda request: HttpResponse())
+        get_user_access(self.user.pk)
+
+        # Branch IDs come from the access cache; only the selected Branch is fetched
+        with self.assertNumQueries(1):
+            self.assertTrue(BranchContextManager.set_branch_context(request, str(self.branch.id)))
+            self.assertEqual(BranchContextManager.get_branch_context(request), self.branch)
+            self.assertEqual(BranchContextManager.get_branch_context(request), self.branch)
+            self.assertTrue(BranchContextManager.user_can_access_branch(
+                request.user, self.branch.id, request=request
+            ))
+            self.assertEqual(view(request).status_code, 200)
+            self.assertIn('branch_id', str(branch_scoped_queryset(Member.objects.all(), request).query))
+
+    def test_reselecting_branch_does_not_write_session(self):
+        request = self.make_request()
+        request.session[BranchContextManager.SESSION_KEY] = str(self.branch.id)
+        request.session.modified = False
+        self.assertTrue(BranchContextManager.set_branch_context(request, str(self.branch.id)))
+        self.assertFalse(request.session.modified)
+
+    def test_inaccessible_branch_is_rejected(self):
+        request = self.make_request(branch=self.other.id)
+        self.assertFalse(BranchContextManager.set_branch_context(request, self.other.id))
+        with self.assertRaises(Http404):
+            require_branch_access(lambda request: HttpResponse())(request)
+
+        # A stale selection is dropped from the session
+        request = self.make_request()
+        request.session[BranchContextManager.SESSION_KEY] = self.other.id
+        self.assertIsNone(BranchContextManager.get_branch_context(request))
+        self.assertNotIn(BranchContextManager.SESSION_KEY, request.session)
+        self.assertFalse(branch_scoped_queryset(Member.objects.all(), request).exists())
+
+
+class UserAccessCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+        cls.user = User.objects.create_user('pastor', password='x')
+        cls.user.profile.role = 'pastor'
+        cls.user.profile.save()
+        cls.user.profile.branches.add(cls.branch)
+
+    def assert_invalidation(self):
+        profile = self.user.profile
+        self.assertEqual(get_user_access(self.user.pk)['branch_ids'], {self.branch.id})
+        with self.assertNumQueries(0):
+            self.assertTrue(profile.can_access_branch(self.branch))
+            self.assertFalse(profile.can_access_branch(self.other))
+            self.assertTrue(get_user_access(self.user.pk)['permissions']['can_view_full_details'])
+
+        # Branch assignment
+        profile.branches.add(self.other)
+        self.assertEqual(get_user_access(self.user.pk)['branch_ids'], {self.branch.id, self.other.id})
+
+        # Branch deactivation
+        self.other.is_active = False
+        self.other.save()
+        self.assertEqual(get_user_access(self.user.pk)['branch_ids'], {self.branch.id})
+
+        # Role change
+        profile.role = 'admin'
+        profile.save()
+        access = get_user_access(self.user.pk)
+        self.assertEqual(access['role'], 'admin')
+        self.assertTrue(access['permissions']['is_system_admin'])
+
+    def test_per_process_cache_is_not_used(self):
+        # Other workers would never see invalidations made in a local memory cache
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}):
+            get_user_access(self.user.pk)
+            with self.assertNumQueries(2):
+                self.assertEqual(get_user_access(self.user.pk)['branch_ids'], {self.branch.id})
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                self.assert_invalidation()
+
+
+class UserProfileContextTests(SharedCacheMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('secretary', password='x')
+        self.user.profile.role = 'secretary'
+        self.user.profile.save()
+
+    def make_request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_unused_values_are_never_queried(self):
+        request = self.make_request(User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(0):
+            user_profile_context(request)
+
+    def test_flags_come_from_access_cache(self):
+        get_user_access(self.user.pk)
+        context = user_profile_context(self.make_request(User.objects.get(pk=self.user.pk)))
+        with self.assertNumQueries(0):
+            self.assertEqual(context['user_role'], 'secretary')
+            self.assertTrue(context['can_register_members'])
+            self.assertFalse(context['can_manage_users'])
+            self.assertFalse(context['is_admin'])
+
+    def test_render_never_creates_profile(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        context = user_profile_context(self.make_request(User.objects.get(pk=self.user.pk)))
+        self.assertFalse(context['can_view_directory'])
+        self.assertFalse(context['user_profile'])
+        self.assertFalse(UserProfile.objects.filter(user=self.user).exists())
+
+
+class SessionEngineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.user = User.objects.create_user('secretary', password='x')
+        cls.user.profile.role = 'secretary'
+        cls.user.profile.save()
+        cls.user.profile.branches.add(cls.branch)
+
+    def session_queries(self, engine):
+        with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+            self.client.force_login(self.user)
+            self.client.get('/', {'branch': self.branch.id})
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/')
+        self.assertEqual(response.context['current_branch'], self.branch)
+        return [q['sql'] for q in queries.captured_queries if 'django_session' in q['sql']]
+
+    def test_db_sessions(self):
+        self.assertEqual(len(self.session_queries('db')), 1)
+
+    def test_cached_db_sessions_read_from_cache(self):
+        self.assertEqual(self.session_queries('cached_db'), [])
+
+    def test_signed_cookie_sessions_keep_branch_selection(self):
+        self.assertEqual(self.session_queries('signed_cookies'), [])
+
+
+class OrjsonResponseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.target = User.objects.create_user('target', password='x')
+
+    def test_user_management_endpoints_return_json(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(f'/auth/toggle-user-status/{self.target.id}/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['is_active'], False)
+
+        response = self.client.post(f'/auth/update-user-role/{self.target.id}/', {'role': 'pastor'})
+        self.assertEqual(response.json()['new_role'], 'Pastor/Leader')
+
+    def test_encodes_django_types(self):
+        rendered = OrjsonRenderer().render({
+            'amount': decimal.Decimal('12.50'),
+            'label': gettext_lazy('Member'),
+            'day': timezone.datetime(2024, 2, 29).date(),
+            'at': timezone.datetime(2024, 2, 29, 8, 30, tzinfo=timezone.utc),
+            1: 'non-string key',
+        })
+        self.assertEqual(
+            rendered,
+            b'{"amount":12.5,"label":"Member","day":"2024-02-29","at":"2024-02-29T08:30:00Z","1":"non-string key"}'
+        )
+        with self.assertRaises(TypeError):
+            OrjsonResponse(['not', 'a', 'dict'])
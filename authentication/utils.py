@@ -1,7 +1,17 @@
+from django.conf import settings
 from django.utils import timezone
+from .buffering import BufferedBulkWriter
 from .models import AuditLog
 
 
+# Audit rows are queued per worker and written in batches off the request path
+audit_log_writer = BufferedBulkWriter(
+    AuditLog,
+    max_batch_size=getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 2.0),
+)
+
+
 def get_client_ip(request):
     """Get client IP address from request"""
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -26,14 +36,25 @@ def log_user_action(user, action, request=None, target_member_id=None, details=N
         ip_address = get_client_ip(request)
         user_agent = get_user_agent(request)
     
-    AuditLog.objects.create(
+    entry = AuditLog(
         user=user,
         action=action,
         target_member_id=target_member_id,
         ip_address=ip_address,
         user_agent=user_agent,
+        timestamp=timezone.now(),
         details=details or {}
     )
+    
+    if getattr(settings, 'AUDIT_LOG_BUFFERED', False):
+        audit_log_writer.add(entry)
+    else:
+        entry.save()
+
+
+def flush_audit_log():
+    """Write any buffered audit log rows immediately"""
+    return audit_log_writer.flush()
 
 
 def require_role(allowed_roles):
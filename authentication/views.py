@@ -3,7 +3,6 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
@@ -14,6 +13,7 @@ from django.utils import timezone
 from .models import UserProfile, AuditLog
 from .forms import UserRegistrationForm, UserProfileForm
 from .utils import log_user_action, get_client_ip, get_user_agent
+from church_portal.renderers import OrjsonResponse
 import json
 
 
@@ -246,13 +246,13 @@ def toggle_user_status(request, user_id):
             }
         )
         
-        return JsonResponse({
+        return OrjsonResponse({
             'success': True,
             'is_active': user.is_active,
             'message': f'Hali ya mtumiaji {user.username} imebadilishwa.'
         })
     except Exception as e:
-        return JsonResponse({
+        return OrjsonResponse({
             'success': False,
             'message': f'Hitilafu: {str(e)}'
         })
@@ -290,18 +290,18 @@ def update_user_role(request, user_id):
                 }
             )
             
-            return JsonResponse({
+            return OrjsonResponse({
                 'success': True,
                 'new_role': profile.get_role_display(),
                 'message': f'Jukumu la mtumiaji {user.username} limebadilishwa.'
             })
         else:
-            return JsonResponse({
+            return OrjsonResponse({
                 'success': False,
                 'message': 'Jukumu si halali.'
             })
     except Exception as e:
-        return JsonResponse({
+        return OrjsonResponse({
             'success': False,
             'message': f'Hitilafu: {str(e)}'
         })
@@ -103,6 +103,9 @@ MIGRATION_EOF
 echo "Running migrations after state resolution..."
 python manage.py migrate
 
+# Remove expired sessions (no-op for SESSION_BACKEND=signed_cookies)
+python manage.py clearsessions
+
 # Create superuser if it doesn't exist (for production)
 python manage.py shell << EOF
 from django.contrib.auth.models import User
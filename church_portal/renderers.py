@@ -0,0 +1,75 @@
+"""
+orjson-based JSON rendering for the API and AJAX views
+
+Dates, datetimes, UUIDs and dict/list subclasses are encoded natively by
+orjson; ``orjson_default`` covers the remaining types DRF's encoder knows
+(Decimal, lazy translation strings, timedelta, querysets and other
+iterables). Aware datetimes in UTC end in ``Z`` as with DRF, but keep
+microsecond precision.
+"""
+import datetime
+import decimal
+
+import orjson
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from django.utils.http import parse_header_parameters
+from rest_framework.renderers import BaseRenderer
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def orjson_default(obj):
+    """Encode types orjson does not handle natively (mirrors DRF's JSONEncoder)"""
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__iter__'):
+        return tuple(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(data, indent=False):
+    option = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+    return orjson.dumps(data, default=orjson_default, option=option)
+
+
+class OrjsonRenderer(BaseRenderer):
+    """Drop-in replacement for DRF's JSONRenderer"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Honour "Accept: application/json; indent=4" and the browsable
+        # API's indent like JSONRenderer (orjson only indents by two spaces)
+        indent = (renderer_context or {}).get('indent')
+        if accepted_media_type and not indent:
+            indent = parse_header_parameters(accepted_media_type)[1].get('indent')
+        return dumps(data, indent=bool(indent))
+
+
+class OrjsonResponse(HttpResponse):
+    """JsonResponse equivalent encoded with orjson"""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                'In order to allow non-dict objects to be serialized set the '
+                'safe parameter to False.'
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
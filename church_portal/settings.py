@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 import os
 from pathlib import Path
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 import sentry_sdk
 from sentry_sdk.integrations.django import DjangoIntegration
@@ -75,6 +76,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'authentication.middleware.BranchAccessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -113,9 +115,83 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Wait for concurrent writers instead of failing with "database is locked"
+            'OPTIONS': {'timeout': 20},
+            # File-backed test database so multi-threaded tests get real
+            # SQLite locking instead of shared-cache "table is locked" errors
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
+# Cache
+# Set CACHE_LOCATION in production (render.yaml does) to a directory every
+# gunicorn worker on the host can write: the file-based cache is shared by the
+# workers, so they see each other's invalidations (the branch access cache and
+# cached_db sessions rely on this). Without it the cache is per-process local
+# memory, the branch access cache is bypassed and cached_db is refused.
+if os.getenv('CACHE_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'church-portal',
+        }
+    }
+PER_PROCESS_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Seconds a user's cached branch access/permission flags stay valid (they are
+# also invalidated on role, branch assignment and branch changes)
+BRANCH_ACCESS_CACHE_TIMEOUT = int(os.getenv('BRANCH_ACCESS_CACHE_TIMEOUT', 300))
+
+# Sessions
+# SESSION_BACKEND selects where sessions live:
+#   db             - database table (default); one django_session query per request
+#   cached_db      - read from the cache, written through to the database;
+#                    refused unless the cache is shared between workers
+#   signed_cookies - no server-side storage: the session (user id and selected
+#                    branch) travels in a signed cookie and is not revoked
+#                    server-side on logout
+# Expired db/cached_db sessions are removed by `python manage.py clearsessions`
+# (run from build.sh on every deploy).
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'db')
+if SESSION_BACKEND not in SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        f"SESSION_BACKEND must be one of {', '.join(SESSION_ENGINES)}, not {SESSION_BACKEND!r}"
+    )
+if SESSION_BACKEND == 'cached_db' and CACHES['default']['BACKEND'] in PER_PROCESS_CACHE_BACKENDS:
+    # A logout or flush would only evict the session from one worker's cache
+    raise ImproperlyConfigured("SESSION_BACKEND=cached_db needs a cache shared by all workers")
+SESSION_ENGINE = SESSION_ENGINES[SESSION_BACKEND]
+
+# Django REST Framework
+# JSON is encoded and decoded with orjson (see church_portal/renderers.py)
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'church_portal.renderers.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'church_portal.parsers.OrjsonParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -236,6 +312,24 @@ LOGGING = {
     },
 }
 
+# Audit logging: rows are buffered per worker and bulk-inserted by a background
+# thread (flushed by size, by time, and on worker shutdown via gunicorn.conf.py).
+# Set AUDIT_LOG_BUFFERED=False to write synchronously inside the request (the
+# test runner in church_portal/test_runner.py does this for the test suite).
+AUDIT_LOG_BUFFERED = os.getenv('AUDIT_LOG_BUFFERED', 'True').lower() in ['true', '1', 'yes']
+AUDIT_LOG_BATCH_SIZE = int(os.getenv('AUDIT_LOG_BATCH_SIZE', 100))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', 2.0))
+
+# Kiosk check-ins (membership/kiosk.py): attendance rows are queued per worker
+# and bulk-inserted every KIOSK_CHECKIN_BATCH_SIZE scans or
+# KIOSK_CHECKIN_FLUSH_INTERVAL seconds; session rosters are reloaded after
+# KIOSK_ROSTER_MAX_AGE seconds.
+KIOSK_CHECKIN_BATCH_SIZE = int(os.getenv('KIOSK_CHECKIN_BATCH_SIZE', 50))
+KIOSK_CHECKIN_FLUSH_INTERVAL = float(os.getenv('KIOSK_CHECKIN_FLUSH_INTERVAL', 0.25))
+KIOSK_ROSTER_MAX_AGE = int(os.getenv('KIOSK_ROSTER_MAX_AGE', 300))
+
+TEST_RUNNER = 'church_portal.test_runner.ChurchPortalTestRunner'
+
 # Django Authentication URLs
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = '/'
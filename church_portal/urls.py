@@ -19,8 +19,9 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from membership.views import (
-    MemberListView, member_directory_page, MemberCreateView, 
-    register_page, home_page, member_statistics
+    MemberListView, member_directory_page, MemberCreateView, MemberBulkCreateView,
+    register_page, home_page, member_statistics, member_export, member_suggest,
+    member_changes, attendance_mark, attendance_checkin, attendance_roster, attendance_sync
 )
 from membership.test_view import minimal_test, template_test
 
@@ -35,7 +36,15 @@ urlpatterns = [
 
     # API endpoints
     path("api/members/", MemberListView.as_view(), name="member-list"),
+    path("api/members/export/", member_export, name="member-export"),
+    path("api/members/suggest/", member_suggest, name="member-suggest"),
+    path("api/members/changes/", member_changes, name="member-changes"),
+    path("api/attendance/<int:session_id>/mark/", attendance_mark, name="attendance-mark"),
+    path("api/attendance/<int:session_id>/checkin/", attendance_checkin, name="attendance-checkin"),
+    path("api/attendance/<int:session_id>/roster/", attendance_roster, name="attendance-roster"),
+    path("api/attendance/sync/", attendance_sync, name="attendance-sync"),
     path("api/register/", MemberCreateView.as_view(), name="member-register"),
+    path("api/register/bulk/", MemberBulkCreateView.as_view(), name="member-register-bulk"),
     path("api/statistics/", member_statistics, name="member-statistics"),
 
     # Front-end pages
@@ -35,3 +35,12 @@ tmp_upload_dir = None
 # SSL
 keyfile = None
 certfile = None
+
+
+# Server hooks
+def worker_exit(server, worker):
+    """Write buffered audit log rows and kiosk check-ins before the worker process exits"""
+    from authentication.utils import flush_audit_log
+    from membership.kiosk import flush_checkins
+    flush_audit_log()
+    flush_checkins()
@@ -95,7 +95,7 @@ class AttendanceSessionAdmin(admin.ModelAdmin):
 
 @admin.register(AttendanceRecord)
 class AttendanceRecordAdmin(admin.ModelAdmin):
-    list_display = ['member', 'session', 'marked_by', 'marked_at']
+    list_display = ['member', 'session', 'marked_by', 'marked_at', 'client_marked_at']
     list_filter = ['session__branch', 'session__service_type', 'session__date', 'marked_at']
     search_fields = ['member__full_name', 'session__title', 'notes']
     date_hierarchy = 'marked_at'
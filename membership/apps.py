@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class MembershipConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "membership"
+
+    def ready(self):
+        from . import typeahead  # noqa: F401 (connects the index's signal receivers)
+        from .search import update_search_index
+        post_migrate.connect(update_search_index, sender=self)
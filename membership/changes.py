@@ -0,0 +1,135 @@
+"""
+Member change feed
+
+Every branch keeps its own member change log: ``Member.change_seq`` and
+``MemberTombstone.change_seq`` are positions in the log of the member's
+branch (``ChangeSequence.member_log``), so writers in different branches
+never queue behind one counter.
+
+A feed cursor therefore holds one position per branch, written as
+``<branch>:<seq>`` pairs (``3:120,5:41``; branch 0 holds members without
+a branch). A feed for a single branch also takes and returns a plain
+number, and ``0`` starts any feed from scratch. ``read_changes`` reads the
+counters, the changed rows and the tombstones from one snapshot, so the
+cursor it returns never skips a change that committed while the feed was
+being read.
+"""
+import heapq
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .models import ChangeSequence
+
+
+class CursorExpired(Exception):
+    """The cursor points before pruned tombstones; the client must resync from 0"""
+
+
+def parse_cursor(value, branch=None):
+    """
+    ``{branch: seq}`` from a ``since`` parameter; a plain number is a
+    position in ``branch``'s log (only 0 without a branch). ValueError if
+    malformed.
+    """
+    value = str(value).strip()
+    if ':' not in value:
+        seq = max(int(value), 0)
+        if branch is None:
+            if seq:
+                raise ValueError(value)
+            return {}
+        return {branch: seq}
+    positions = {}
+    for pair in value.split(','):
+        log, seq = pair.split(':')
+        positions[int(log)] = max(int(seq), 0)
+    return positions
+
+
+def format_cursor(positions):
+    return ','.join(f'{branch}:{seq}' for branch, seq in sorted(positions.items())) or '0'
+
+
+@contextmanager
+def read_snapshot():
+    """
+    Run several reads against one snapshot. PostgreSQL needs REPEATABLE READ
+    (READ COMMITTED takes a new snapshot per statement); SQLite and MySQL
+    keep the snapshot of the transaction's first read.
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+def in_log(branch, **lookups):
+    """Q for the rows of one branch log"""
+    if branch:
+        return Q(branch_id=branch, **lookups)
+    return Q(branch__isnull=True, **lookups)
+
+
+def read_changes(members, tombstones, branches, since, limit, columns=()):
+    """
+    Changes in the logs of ``branches`` (None for every log) after the
+    positions in ``since`` (as returned by ``parse_cursor``; missing logs
+    start from 0), at most ``limit`` events in (branch, change_seq) order.
+    ``members`` is the caller's scope: tombstones of members that are back
+    in it are left out.
+
+    Returns ``(changed, deleted, positions, has_more)`` where ``positions``
+    is the next cursor; raises CursorExpired.
+    """
+    with read_snapshot():
+        logs = {
+            ChangeSequence.member_log_branch(name): (last_value, pruned_through)
+            for name, last_value, pruned_through in ChangeSequence.objects.filter(
+                name__startswith=f'{ChangeSequence.MEMBERS}:'
+            ).values_list('name', 'last_value', 'pruned_through')
+        }
+        if branches is not None:
+            logs = {branch: log for branch, log in logs.items() if branch in branches}
+        start = {branch: since.get(branch, 0) for branch in logs}
+        if any(0 < start[branch] < pruned_through for branch, (_, pruned_through) in logs.items()):
+            raise CursorExpired()
+
+        pending = Q()
+        for branch, (last_value, _) in logs.items():
+            if start[branch] < last_value:
+                pending |= in_log(branch, change_seq__gt=start[branch])
+        events = []
+        if pending:
+            order = (F('branch_id').asc(nulls_first=True), 'change_seq')
+            changed = members.filter(pending).order_by(*order).values(
+                'id', 'branch_id', 'change_seq', *columns
+            )[:limit + 1]
+            deleted = tombstones.filter(pending).exclude(
+                member_id__in=members.values('id')
+            ).order_by(*order).values('member_id', 'branch_id', 'change_seq')[:limit + 1]
+            events = list(islice(heapq.merge(
+                ((row['branch_id'] or 0, row['change_seq'], True, row) for row in changed),
+                ((row['branch_id'] or 0, row['change_seq'], False, row) for row in deleted),
+                key=lambda event: event[:2],
+            ), limit + 1))
+
+    has_more = len(events) > limit
+    events = events[:limit]
+    if has_more:
+        # Logs before the last event's branch were read to the end
+        last_branch, last_seq = events[-1][:2]
+        positions = {
+            branch: last_value if branch < last_branch else start[branch]
+            for branch, (last_value, _) in logs.items()
+        }
+        positions[last_branch] = last_seq
+    else:
+        positions = {branch: last_value for branch, (last_value, _) in logs.items()}
+    changed = [row for branch, seq, is_change, row in events if is_change]
+    deleted = [row for branch, seq, is_change, row in events if not is_change]
+    return changed, deleted, positions, has_more
@@ -0,0 +1,61 @@
+"""
+Conditional GET (ETag) helpers for polled API endpoints
+
+``queryset_validators`` computes the validators with one aggregate query:
+the newest modification timestamp and the row count of the response's
+scope. The count catches deletions, which do not move the timestamp. It
+suits small scopes such as the statistics rollup.
+
+``content_validators`` hashes the payload itself, for paginated lists where
+an aggregate over the whole filtered scope would cost more than the page:
+the page is built anyway, and a client whose copy still matches gets a 304
+instead of the body.
+
+The ETag also covers the request path and query string plus anything else
+the payload depends on (e.g. the caller's role or today's date), so
+different views of the same rows never share a tag.
+
+No Last-Modified header is sent: a client revalidating with only
+If-Modified-Since would miss deletions and edits made within the same
+second, which the seconds-resolution timestamp cannot express.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from church_portal.renderers import dumps
+
+
+class ConditionalValidators:
+    """ETag for one response; ``not_modified`` is a 304 response or None"""
+
+    def __init__(self, request, *parts):
+        digest = hashlib.md5(
+            repr((request.get_full_path(),) + parts).encode('utf-8'),
+            usedforsecurity=False,
+        ).hexdigest()
+        self.etag = quote_etag(digest)
+        self.not_modified = get_conditional_response(request, etag=self.etag)
+        if self.not_modified is not None:
+            self.apply(self.not_modified)
+
+    def apply(self, response):
+        """Add the validator headers to a response"""
+        response['ETag'] = self.etag
+        # Browsers may keep the copy but must revalidate it on every poll
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+def queryset_validators(request, queryset, *parts, field='updated_at'):
+    """Validators for a response built from ``queryset``"""
+    row = queryset.order_by().aggregate(last_modified=Max(field), count=Count('pk'))
+    return ConditionalValidators(request, row['last_modified'], row['count'], *parts)
+
+
+def content_validators(request, data, *parts):
+    """Validators for a response whose body renders ``data``"""
+    digest = hashlib.md5(dumps(data), usedforsecurity=False).hexdigest()
+    return ConditionalValidators(request, digest, *parts)
@@ -0,0 +1,180 @@
+"""
+Door kiosk check-in for attendance sessions
+
+Each worker keeps the roster of a session's branch (membership ID ->
+member) and the set of members already checked in, so repeat scans are
+answered from memory. New attendance rows are queued on a BufferedBulkWriter and
+inserted in small batches (every ``KIOSK_CHECKIN_BATCH_SIZE`` scans or
+``KIOSK_CHECKIN_FLUSH_INTERVAL`` seconds) with ``ignore_conflicts``, so a
+member scanned at two kiosks served by different workers is still stored
+once. Rosters are reloaded after ``KIOSK_ROSTER_MAX_AGE`` seconds; an ID
+missing from the roster is looked up once in the database in case the
+member registered after it was loaded.
+
+Because the roster may be minutes old, a first scan is confirmed with one
+query (session still open, member still in its branch), and rows whose
+member or session was deleted before the flush are dropped.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from authentication.buffering import BufferedBulkWriter
+
+from .models import AttendanceRecord, AttendanceSession, Member
+
+logger = logging.getLogger(__name__)
+
+CHECKED_IN = 'checked_in'
+ALREADY_CHECKED_IN = 'already_checked_in'
+NOT_FOUND = 'not_found'
+SESSION_CLOSED = 'session_closed'
+
+
+class AttendanceWriter(BufferedBulkWriter):
+    """Drops queued check-ins whose member or session has been deleted since the scan"""
+
+    def prepare(self, batch):
+        sessions = set(AttendanceSession.objects.filter(
+            pk__in={row.session_id for row in batch}
+        ).values_list('id', flat=True))
+        members = set(Member.objects.filter(
+            pk__in={row.member_id for row in batch}
+        ).values_list('id', flat=True))
+        kept = [row for row in batch if row.session_id in sessions and row.member_id in members]
+        if len(kept) < len(batch):
+            logger.warning(f"Dropped {len(batch) - len(kept)} check-ins for deleted members or sessions")
+        return kept
+
+
+attendance_writer = AttendanceWriter(
+    AttendanceRecord,
+    max_batch_size=getattr(settings, 'KIOSK_CHECKIN_BATCH_SIZE', 50),
+    flush_interval=getattr(settings, 'KIOSK_CHECKIN_FLUSH_INTERVAL', 0.25),
+    ignore_conflicts=True,
+)
+
+
+def normalize_membership_id(value):
+    return value.strip().upper()
+
+
+class SessionRoster:
+    """Members of one session's branch plus who has checked in so far"""
+
+    def __init__(self, session_id, branch_id, is_active, members, checked_in):
+        self.session_id = session_id
+        self.branch_id = branch_id
+        self.is_active = is_active
+        # membership_id -> (member_id, full_name)
+        self.members = members
+        self.checked_in = checked_in
+        self.loaded_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, session_id):
+        """Roster for ``session_id``, or None if the session does not exist"""
+        session = AttendanceSession.objects.filter(pk=session_id).values('branch_id', 'is_active').first()
+        if session is None:
+            return None
+        members = {
+            normalize_membership_id(membership_id): (member_id, full_name)
+            for membership_id, member_id, full_name in Member.objects.filter(
+                branch_id=session['branch_id'], membership_id__isnull=False
+            ).order_by().values_list('membership_id', 'id', 'full_name').iterator(chunk_size=5000)
+        }
+        checked_in = set(
+            AttendanceRecord.objects.filter(session_id=session_id)
+            .order_by().values_list('member_id', flat=True)
+        )
+        return cls(session_id, session['branch_id'], session['is_active'], members, checked_in)
+
+    def lookup(self, membership_id):
+        """(member_id, full_name) for a scanned ID, or None"""
+        member = self.members.get(membership_id)
+        if member is None:
+            # Registered after the roster was loaded?
+            row = Member.objects.filter(
+                branch_id=self.branch_id, membership_id=membership_id
+            ).values_list('id', 'full_name').first()
+            if row is not None:
+                member = self.members[membership_id] = tuple(row)
+        return member
+
+    def check_in(self, membership_id, user):
+        """Return (status, full_name) and queue the attendance row for new arrivals"""
+        member = self.lookup(normalize_membership_id(membership_id))
+        if member is None:
+            return NOT_FOUND, None
+        member_id, full_name = member
+        if member_id in self.checked_in:
+            return ALREADY_CHECKED_IN, full_name
+        if not AttendanceSession.objects.filter(
+            pk=self.session_id, is_active=True, branch__members=member_id
+        ).exists():
+            if not AttendanceSession.objects.filter(pk=self.session_id, is_active=True).exists():
+                self.is_active = False
+                return SESSION_CLOSED, None
+            # Deleted or moved to another branch since the roster was loaded
+            self.members.pop(normalize_membership_id(membership_id), None)
+            return NOT_FOUND, None
+        with self._lock:
+            if member_id in self.checked_in:
+                return ALREADY_CHECKED_IN, full_name
+            self.checked_in.add(member_id)
+        attendance_writer.add(AttendanceRecord(session_id=self.session_id, member_id=member_id, marked_by=user))
+        return CHECKED_IN, full_name
+
+
+class RosterCache:
+    """Per-worker LRU of session rosters"""
+
+    def __init__(self, max_sessions=20, max_age=300):
+        self.max_sessions = max_sessions
+        self.max_age = max_age
+        self._rosters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            roster = self._rosters.get(session_id)
+            if roster is not None and time.monotonic() - roster.loaded_at <= self.max_age:
+                self._rosters.move_to_end(session_id)
+                return roster
+        # Load outside the lock so one slow load does not block other sessions
+        roster = SessionRoster.load(session_id)
+        if roster is not None:
+            with self._lock:
+                previous = self._rosters.get(session_id)
+                if previous is not None:
+                    # Keep check-ins queued but not yet written when reloading
+                    roster.checked_in |= previous.checked_in
+                self._rosters[session_id] = roster
+                self._rosters.move_to_end(session_id)
+                while len(self._rosters) > self.max_sessions:
+                    self._rosters.popitem(last=False)
+        return roster
+
+    def branch_id(self, session_id):
+        """Branch of a session without loading its roster; None if the session does not exist"""
+        with self._lock:
+            roster = self._rosters.get(session_id)
+        if roster is not None:
+            return roster.branch_id
+        return AttendanceSession.objects.filter(pk=session_id).values_list('branch_id', flat=True).first()
+
+    def clear(self):
+        with self._lock:
+            self._rosters.clear()
+
+
+roster_cache = RosterCache(max_age=getattr(settings, 'KIOSK_ROSTER_MAX_AGE', 300))
+
+
+def flush_checkins():
+    """Write any queued check-ins immediately"""
+    return attendance_writer.flush()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from membership.models import Member
+from membership.phones import backfill_phone_e164
+
+
+class Command(BaseCommand):
+    help = 'Fill the normalized E.164 phone columns for members saved without them (e.g. by bulk updates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of members read and written per batch'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Normalizing member phone numbers...')
+        updated = backfill_phone_e164(Member, batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated E.164 phone numbers for {updated} members')
+        )
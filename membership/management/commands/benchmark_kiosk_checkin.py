@@ -0,0 +1,92 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from membership import kiosk
+from membership.models import AttendanceRecord, AttendanceSession, Branch, Member
+
+
+class Command(BaseCommand):
+    help = 'Replay paced kiosk check-in scans against a throwaway database and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rate', type=int, default=50,
+            help='Scans per second (default: 50)'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=2,
+            help='Seconds to keep scanning (default: 2)'
+        )
+        parser.add_argument(
+            '--members', type=int, default=250,
+            help='Members on the roster; scans beyond this repeat earlier IDs (default: 250)'
+        )
+
+    def handle(self, *args, **options):
+        rate, members = options['rate'], options['members']
+        scans = int(rate * options['duration'])
+        # Never touch the configured database: scans run against a fresh test copy
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            session = self.create_session(members)
+            client = APIClient()
+            client.force_authenticate(session.created_by)
+            url = f'/api/attendance/{session.id}/checkin/'
+            kiosk.roster_cache.clear()
+
+            latencies = []
+            start = time.perf_counter()
+            for n in range(scans):
+                delay = start + n / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                sent = time.perf_counter()
+                response = client.post(url, {'membership_id': f'BEN{n % members:05d}'}, format='json')
+                latencies.append(time.perf_counter() - sent)
+                if response.status_code != 200:
+                    self.stderr.write(f'Scan {n} failed with status {response.status_code}')
+            elapsed = time.perf_counter() - start
+            kiosk.flush_checkins()
+            stored = AttendanceRecord.objects.filter(session=session).count()
+        finally:
+            kiosk.roster_cache.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        latencies.sort()
+        self.stdout.write(
+            f'{scans} scans in {elapsed:.2f}s (offered {options["duration"]}s at {rate}/s)\n'
+            f'p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, '
+            f'max {latencies[-1] * 1000:.1f} ms'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Stored {stored} attendance rows for {min(scans, members)} members')
+        )
+
+    def create_session(self, members):
+        branch = Branch.objects.create(name='Benchmark', code='BEN')
+        user = User.objects.create_user('kiosk-benchmark')
+        user.profile.role = 'secretary'
+        user.profile.save()
+        user.profile.branches.add(branch)
+        Member.objects.bulk_create(
+            Member(
+                branch=branch, full_name=f'Mshirika {i}', membership_id=f'BEN{i:05d}',
+                gender='Male', age_category='Mtu mzima', address='Benchmark', baptized='No',
+                emergency_name='Mwasiliani', emergency_relation='Kaka', emergency_phone='0712345678',
+                membership_type='New', registration_date=date.today(),
+            )
+            for i in range(members)
+        )
+        return AttendanceSession.objects.create(
+            branch=branch, title='Ibada ya Jumapili', service_type='sunday_service',
+            date=date.today(), start_time='09:00', created_by=user,
+        )
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from membership.changes import in_log
+from membership.models import ChangeSequence, MemberTombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete old member tombstones; delta-sync clients older than them must resync from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=90,
+            help='Keep tombstones from the last N days'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        with transaction.atomic():
+            # Each branch log remembers how far its tombstones were pruned
+            pruned = MemberTombstone.objects.filter(deleted_at__lt=cutoff).order_by().values(
+                'branch_id'
+            ).annotate(through=Max('change_seq'))
+            if not pruned:
+                self.stdout.write('No tombstones to prune')
+                return
+            deleted = 0
+            for row in pruned:
+                deleted += MemberTombstone.objects.filter(
+                    in_log(row['branch_id'], change_seq__lte=row['through'])
+                ).delete()[0]
+                ChangeSequence.objects.filter(name=ChangeSequence.member_log(row['branch_id'])).update(
+                    pruned_through=Greatest('pruned_through', row['through'])
+                )
+        self.stdout.write(
+            self.style.SUCCESS(f'Pruned {deleted} tombstones from {len(pruned)} branch logs')
+        )
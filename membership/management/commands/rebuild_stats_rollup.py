@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from membership.stats import rebuild_stats_rollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the branch statistics rollup table from the member table'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding branch statistics rollup...')
+        row_count = rebuild_stats_rollup()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt branch statistics rollup ({row_count} branch/month rows)')
+        )
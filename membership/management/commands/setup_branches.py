@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 from membership.models import Branch, NewsCategory
 from django.contrib.auth.models import User
@@ -102,12 +103,30 @@ class Command(BaseCommand):
                 )
         
         # Update existing members to have a branch if they don't have one
-        from membership.models import Member
+        from membership.models import Member, ChangeSequence
+        from membership.stats import ROLLUP_SOURCE_FIELDS, apply_rollup_changes, member_rollup_values
         members_without_branch = Member.objects.filter(branch__isnull=True)
         if members_without_branch.exists():
             default_branch = Branch.objects.first()
             if default_branch:
-                updated_count = members_without_branch.update(branch=default_branch)
+                with transaction.atomic():
+                    # Each member needs its own change feed position
+                    members = list(members_without_branch.only('pk', *ROLLUP_SOURCE_FIELDS))
+                    previous = [member_rollup_values(member) for member in members]
+                    first_seq = ChangeSequence.reserve(
+                        ChangeSequence.member_log(default_branch.id), count=len(members)
+                    )
+                    now = timezone.now()
+                    for offset, member in enumerate(members):
+                        member.branch = default_branch
+                        member.updated_at = now
+                        member.change_seq = first_seq + offset
+                    Member.objects.bulk_update(
+                        members, ['branch', 'updated_at', 'change_seq'], batch_size=500
+                    )
+                    # bulk_update bypasses the rollup signals
+                    apply_rollup_changes(zip(previous, map(member_rollup_values, members)))
+                updated_count = len(members)
                 self.stdout.write(
                     self.style.SUCCESS(
                         f'Assigned {updated_count} existing members to {default_branch.name}'
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:04
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+import sys
+import os
+
+# Add the project root to the path to import safe_migration_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from safe_migration_utils import SafeCreateModel
+
+
+# Frozen copy of membership.stats.ROLLUP_COUNTERS as of this migration, so
+# later changes to the app code do not change what it does.
+ROLLUP_COUNTERS = {
+    'male': ('gender', 'Male'),
+    'female': ('gender', 'Female'),
+    'baptized': ('baptized', 'Yes'),
+    'membership_class_completed': ('membership_class', 'Yes'),
+    'age_mtoto': ('age_category', 'Mtoto'),
+    'age_kijana': ('age_category', 'Kijana'),
+    'age_mtu_mzima': ('age_category', 'Mtu mzima'),
+    'type_new': ('membership_type', 'New'),
+    'type_transfer': ('membership_type', 'Transfer'),
+    'type_returning': ('membership_type', 'Returning'),
+}
+
+
+def populate_stats_rollup(apps, schema_editor):
+    """Fill the rollup with one GROUP BY over the member table"""
+    Member = apps.get_model('membership', 'Member')
+    BranchStatsRollup = apps.get_model('membership', 'BranchStatsRollup')
+
+    aggregates = {'total': Count('id')}
+    for counter, (field, value) in ROLLUP_COUNTERS.items():
+        aggregates[counter] = Count('id', filter=Q(**{field: value}))
+    rows = (
+        Member.objects.order_by()
+        .annotate(month=TruncMonth('registration_date'))
+        .values('branch_id', 'month')
+        .annotate(**aggregates)
+    )
+    BranchStatsRollup.objects.bulk_create([BranchStatsRollup(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('membership', '0004_branch_newscategory_attendancesession_member_branch_and_more'),
+    ]
+
+    operations = [
+        SafeCreateModel(
+            name='BranchStatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the registration month')),
+                ('total', models.IntegerField(default=0)),
+                ('male', models.IntegerField(default=0)),
+                ('female', models.IntegerField(default=0)),
+                ('baptized', models.IntegerField(default=0)),
+                ('membership_class_completed', models.IntegerField(default=0)),
+                ('age_mtoto', models.IntegerField(default=0)),
+                ('age_kijana', models.IntegerField(default=0)),
+                ('age_mtu_mzima', models.IntegerField(default=0)),
+                ('type_new', models.IntegerField(default=0)),
+                ('type_transfer', models.IntegerField(default=0)),
+                ('type_returning', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stats_rollups', to='membership.branch')),
+            ],
+            options={
+                'verbose_name': 'Takwimu za Tawi',
+                'verbose_name_plural': 'Takwimu za Matawi',
+                'ordering': ['branch', '-month'],
+                'unique_together': {('branch', 'month')},
+            },
+        ),
+        migrations.RunPython(populate_stats_rollup, migrations.RunPython.noop),
+    ]
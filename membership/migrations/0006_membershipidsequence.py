@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import sys
+import os
+
+# Add the project root to the path to import safe_migration_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from safe_migration_utils import SafeCreateModel, SafeAlterField
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('membership', '0005_branchstatsrollup'),
+    ]
+
+    operations = [
+        SafeAlterField(
+            model_name='member',
+            name='membership_id',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+        SafeCreateModel(
+            name='MembershipIdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('next_value', models.PositiveIntegerField(default=1)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='membership_id_sequences', to='membership.branch')),
+            ],
+            options={
+                'verbose_name': 'Mfuatano wa Namba za Ushirika',
+                'verbose_name_plural': 'Mifuatano ya Namba za Ushirika',
+                'unique_together': {('branch', 'year')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:16
+
+from django.db import migrations, models
+import sys
+import os
+
+# Add the project root to the path to import safe_migration_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from safe_migration_utils import SafeAddIndex
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('membership', '0006_membershipidsequence'),
+    ]
+
+    operations = [
+        SafeAddIndex(
+            model_name='member',
+            index=models.Index(fields=['branch', 'registration_date'], name='member_branch_regdate_idx'),
+        ),
+        SafeAddIndex(
+            model_name='member',
+            index=models.Index(fields=['branch', 'baptized'], name='member_branch_baptized_idx'),
+        ),
+        SafeAddIndex(
+            model_name='member',
+            index=models.Index(fields=['branch', 'membership_class'], name='member_branch_class_idx'),
+        ),
+        SafeAddIndex(
+            model_name='member',
+            index=models.Index(fields=['branch', 'gender'], name='member_branch_gender_idx'),
+        ),
+        SafeAddIndex(
+            model_name='member',
+            index=models.Index(condition=models.Q(('baptized', 'Yes')), fields=['branch', '-registration_date'], name='member_baptized_recent_idx'),
+        ),
+        SafeAddIndex(
+            model_name='member',
+            index=models.Index(condition=models.Q(('membership_class', 'Yes')), fields=['branch', '-registration_date'], name='member_class_done_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:30
+
+from django.db import OperationalError, migrations
+
+# The index definitions are copied here rather than imported from
+# membership.search so this migration keeps doing the same thing if the
+# app code changes later.
+SEARCH_FIELDS = ('full_name', 'membership_id', 'phone', 'email', 'emergency_phone')
+
+POSTGRES_TRGM_INDEXES = {
+    f'member_{field}_trgm_idx': f'UPPER(({field})::text) gin_trgm_ops'
+    for field in SEARCH_FIELDS
+}
+
+FTS_COLUMNS = ', '.join(SEARCH_FIELDS)
+FTS_NEW_VALUES = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+FTS_OLD_VALUES = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+
+SQLITE_FTS_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS membership_member_fts USING fts5("
+    f"{FTS_COLUMNS}, content='membership_member', content_rowid='id', tokenize='trigram')"
+)
+SQLITE_FTS_TRIGGERS_SQL = {
+    'membership_member_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS membership_member_fts_ai AFTER INSERT ON membership_member BEGIN
+            INSERT INTO membership_member_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {FTS_NEW_VALUES});
+        END""",
+    'membership_member_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS membership_member_fts_ad AFTER DELETE ON membership_member BEGIN
+            INSERT INTO membership_member_fts(membership_member_fts, rowid, {FTS_COLUMNS})
+            VALUES ('delete', old.id, {FTS_OLD_VALUES});
+        END""",
+    'membership_member_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS membership_member_fts_au AFTER UPDATE ON membership_member BEGIN
+            INSERT INTO membership_member_fts(membership_member_fts, rowid, {FTS_COLUMNS})
+            VALUES ('delete', old.id, {FTS_OLD_VALUES});
+            INSERT INTO membership_member_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {FTS_NEW_VALUES});
+        END""",
+}
+
+
+def create_search_index(apps, schema_editor):
+    """pg_trgm GIN indexes on PostgreSQL, an FTS5 shadow table on SQLite"""
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, expression in POSTGRES_TRGM_INDEXES.items():
+            schema_editor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+                f'ON membership_member USING gin ({expression})'
+            )
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(SQLITE_FTS_TABLE_SQL)
+            except OperationalError as e:
+                print(f"SQLite full-text search unavailable ({e}); member search falls back to icontains")
+                return
+            for sql in SQLITE_FTS_TRIGGERS_SQL.values():
+                cursor.execute(sql)
+            cursor.execute("INSERT INTO membership_member_fts(membership_member_fts) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for name in POSTGRES_TRGM_INDEXES:
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for name in SQLITE_FTS_TRIGGERS_SQL:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute('DROP TABLE IF EXISTS membership_member_fts')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('membership', '0007_member_branch_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
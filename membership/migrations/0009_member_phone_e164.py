@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:23
+
+from django.conf import settings
+from django.db import migrations, models
+import re
+import sys
+import os
+
+# Add the project root to the path to import safe_migration_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from safe_migration_utils import SafeAddField
+
+
+# Frozen copy of membership.phones.to_e164 as of this migration, so later
+# changes to the app code do not change what it does.
+DEFAULT_COUNTRY_CODE = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '254')
+PHONE_SEPARATORS = re.compile(r'[\s\-\(\)\.]')
+
+
+def to_e164(value):
+    if not value:
+        return None
+    phone = PHONE_SEPARATORS.sub('', value)
+    if phone.startswith('00'):
+        digits = phone[2:]
+    elif phone.startswith('+'):
+        digits = phone[1:]
+    elif phone.startswith('0'):
+        digits = DEFAULT_COUNTRY_CODE + phone[1:]
+    elif phone.startswith(DEFAULT_COUNTRY_CODE):
+        digits = phone
+    else:
+        return None
+    if not digits or not digits.isdigit() or not 8 <= len(digits) <= 15:
+        return None
+    return f'+{digits}'
+
+
+def populate_phone_e164(apps, schema_editor):
+    """Fill the E.164 columns 1000 members at a time by primary key"""
+    Member = apps.get_model('membership', 'Member')
+    last_pk = 0
+    while True:
+        batch = list(
+            Member.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'phone', 'emergency_phone')[:1000]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        for member in batch:
+            member.phone_e164 = to_e164(member.phone)
+            member.emergency_phone_e164 = to_e164(member.emergency_phone)
+        Member.objects.bulk_update(batch, ['phone_e164', 'emergency_phone_e164'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('membership', '0008_member_search_index'),
+    ]
+
+    operations = [
+        SafeAddField(
+            model_name='member',
+            name='emergency_phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+        SafeAddField(
+            model_name='member',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(populate_phone_e164, migrations.RunPython.noop),
+    ]
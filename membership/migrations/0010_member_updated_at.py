@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:29
+
+from django.db import migrations, models
+import sys
+import os
+
+# Add the project root to the path to import safe_migration_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from safe_migration_utils import SafeAddField
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('membership', '0009_member_phone_e164'),
+    ]
+
+    operations = [
+        SafeAddField(
+            model_name='member',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
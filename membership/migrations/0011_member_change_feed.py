@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import sys
+import os
+
+# Add the project root to the path to import safe_migration_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from safe_migration_utils import SafeCreateModel, SafeAddField, SafeAddIndex
+
+
+def populate_change_seq(apps, schema_editor):
+    """Give existing members distinct positions and start each branch's log after them"""
+    Member = apps.get_model('membership', 'Member')
+    ChangeSequence = apps.get_model('membership', 'ChangeSequence')
+    Member.objects.update(change_seq=models.F('id'))
+    last_values = Member.objects.order_by().values('branch_id').annotate(last=models.Max('id'))
+    for row in last_values:
+        ChangeSequence.objects.update_or_create(
+            name=f"members:{row['branch_id'] or 0}", defaults={'last_value': row['last']}
+        )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('membership', '0010_member_updated_at'),
+    ]
+
+    operations = [
+        SafeCreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.BigIntegerField(default=0)),
+                ('pruned_through', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Mfuatano wa Mabadiliko',
+                'verbose_name_plural': 'Mifuatano ya Mabadiliko',
+            },
+        ),
+        SafeCreateModel(
+            name='MemberTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('member_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('branch', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='membership.branch')),
+            ],
+            options={
+                'verbose_name': 'Kumbukumbu ya Mshirika Aliyeondolewa',
+                'verbose_name_plural': 'Kumbukumbu za Washirika Walioondolewa',
+                'indexes': [models.Index(fields=['branch', 'change_seq'], name='tombstone_branch_seq_idx')],
+            },
+        ),
+        SafeAddField(
+            model_name='member',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_change_seq, migrations.RunPython.noop),
+        SafeAddIndex(
+            model_name='member',
+            index=models.Index(fields=['change_seq'], name='member_change_seq_idx'),
+        ),
+        SafeAddIndex(
+            model_name='member',
+            index=models.Index(fields=['branch', 'change_seq'], name='member_branch_change_seq_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import sys
+import os
+
+# Add the project root to the path to import safe_migration_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from safe_migration_utils import SafeCreateModel, SafeAddField
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('membership', '0011_member_change_feed'),
+    ]
+
+    operations = [
+        SafeCreateModel(
+            name='AttendanceSyncBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.UUIDField(unique=True)),
+                ('device_id', models.CharField(blank=True, max_length=100)),
+                ('record_count', models.IntegerField(default=0)),
+                ('result', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_sync_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Kundi la Mahudhurio Nje ya Mtandao',
+                'verbose_name_plural': 'Makundi ya Mahudhurio Nje ya Mtandao',
+            },
+        ),
+        SafeAddField(
+            model_name='attendancerecord',
+            name='client_marked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        SafeAddField(
+            model_name='attendancerecord',
+            name='sync_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='records', to='membership.attendancesyncbatch'),
+        ),
+    ]
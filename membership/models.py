@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, transaction, connection, IntegrityError
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.core.validators import RegexValidator
 from django.utils import timezone
 from django.contrib.auth.models import User
 import uuid
 
+from .phones import to_e164
+
 
 class Branch(models.Model):
     """Model for different church branches/locations"""
@@ -71,19 +75,60 @@ class Member(models.Model):
     emergency_name = models.CharField(max_length=100)
     emergency_relation = models.CharField(max_length=50)
     emergency_phone = models.CharField(max_length=15)
+    # Canonical E.164 copies of the phone fields for indexed exact/prefix lookup
+    phone_e164 = models.CharField(max_length=16, null=True, blank=True, editable=False, db_index=True)
+    emergency_phone_e164 = models.CharField(max_length=16, null=True, blank=True, editable=False, db_index=True)
 
     membership_type = models.CharField(max_length=20, choices=MEMBERSHIP_CHOICES)
     registration_date = models.DateField()
+    # Not touched by QuerySet.update(); bump it explicitly there
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Position in the branch's member change log; reassigned on every save
+    # (and by bulk writes, which must reserve values from ChangeSequence themselves)
+    change_seq = models.BigIntegerField(default=0, editable=False)
     membership_id = models.CharField(
-        max_length=8,
+        max_length=20,
         unique=True,
         blank=True,    # allows it to be empty at creation
         null=True,     # stores NULL in the DB until set
         editable=True  # admin can edit it in the Django admin UI
     )
     def save(self, *args, **kwargs):
+        self.normalize_phones()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'phone' in update_fields:
+                update_fields.add('phone_e164')
+            if 'emergency_phone' in update_fields:
+                update_fields.add('emergency_phone_e164')
+            kwargs['update_fields'] = update_fields | {'change_seq'}
         # Skip auto-generation in admin to prevent errors
-        super().save(*args, **kwargs)
+        # Atomic so the statistics rollup signals commit together with the row,
+        # and so the branch change logs stay locked until the row is visible
+        with transaction.atomic():
+            self._stats_previous = self.stored_rollup_values()
+            self._tombstone_seq = None
+            if self._stats_previous and self._stats_previous['branch_id'] != self.branch_id:
+                # Moving: the old branch's log gets a tombstone (record_member_branch_move)
+                self.change_seq, self._tombstone_seq = ChangeSequence.reserve_member_logs(
+                    self.branch_id, self._stats_previous['branch_id']
+                )
+            else:
+                self.change_seq, = ChangeSequence.reserve_member_logs(self.branch_id)
+            super().save(*args, **kwargs)
+
+    def stored_rollup_values(self):
+        """The stored attributes the statistics rollup depends on; None if not saved yet"""
+        from .stats import ROLLUP_SOURCE_FIELDS
+        if self.pk is None:
+            return None
+        return Member.objects.filter(pk=self.pk).values(*ROLLUP_SOURCE_FIELDS).first()
+    
+    def normalize_phones(self):
+        """Refresh the E.164 phone columns (also call before bulk_create)"""
+        self.phone_e164 = to_e164(self.phone)
+        self.emergency_phone_e164 = to_e164(self.emergency_phone)
     
     def generate_membership_id(self):
         """Generate a unique membership ID with branch code"""
@@ -94,25 +139,7 @@ class Member(models.Model):
             return f"TEMP{year}{timezone.now().microsecond:06d}"
         
         # Format: BRANCH_CODE + YEAR + 4-digit sequential number
-        year = timezone.now().year
-        branch_code = self.branch.code.upper()
-        prefix = f"{branch_code}{year}"
-        
-        last_member = Member.objects.filter(
-            branch=self.branch,
-            membership_id__startswith=prefix
-        ).order_by('membership_id').last()
-        
-        if last_member and last_member.membership_id:
-            try:
-                last_number = int(last_member.membership_id[len(prefix):])
-                new_number = last_number + 1
-            except (ValueError, IndexError):
-                new_number = 1
-        else:
-            new_number = 1
-        
-        return f"{prefix}{new_number:04d}"
+        return MembershipIdSequence.allocate_ids(self.branch)[0]
     
     @property
     def age_from_dob(self):
@@ -154,12 +181,274 @@ class Member(models.Model):
             models.Index(fields=['full_name']),
             models.Index(fields=['registration_date']),
             models.Index(fields=['membership_type']),
+            # Branch-scoped directory filters and "new members" counters
+            models.Index(fields=['branch', 'registration_date'], name='member_branch_regdate_idx'),
+            models.Index(fields=['branch', 'baptized'], name='member_branch_baptized_idx'),
+            models.Index(fields=['branch', 'membership_class'], name='member_branch_class_idx'),
+            models.Index(fields=['branch', 'gender'], name='member_branch_gender_idx'),
+            # Partial indexes for the common "baptized" / "class completed" filters
+            models.Index(
+                fields=['branch', '-registration_date'], condition=models.Q(baptized='Yes'),
+                name='member_baptized_recent_idx',
+            ),
+            models.Index(
+                fields=['branch', '-registration_date'], condition=models.Q(membership_class='Yes'),
+                name='member_class_done_recent_idx',
+            ),
+            # Change feed, for all branches and per branch
+            models.Index(fields=['change_seq'], name='member_change_seq_idx'),
+            models.Index(fields=['branch', 'change_seq'], name='member_branch_change_seq_idx'),
         ]
     
     def __str__(self):
         return f"{self.membership_id} - {self.full_name}" if self.membership_id else self.full_name
 
 
+def supports_update_returning():
+    """PostgreSQL and SQLite >= 3.35 support UPDATE ... RETURNING; MySQL and MariaDB do not"""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+class MembershipIdSequence(models.Model):
+    """Next membership ID number per branch and year.
+
+    Numbers are handed out with a single atomic ``UPDATE ... RETURNING`` (or
+    a ``select_for_update`` fallback), so concurrent registrations never
+    receive the same ID and no prefix scan is needed per registration.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='membership_id_sequences')
+    year = models.PositiveIntegerField()
+    next_value = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Mfuatano wa Namba za Ushirika"
+        verbose_name_plural = "Mifuatano ya Namba za Ushirika"
+        unique_together = ['branch', 'year']
+
+    def __str__(self):
+        return f"{self.branch.code}{self.year} -> {self.next_value}"
+
+    @staticmethod
+    def format_membership_id(branch, year, number):
+        """Format: BRANCH_CODE + YEAR + 4-digit sequential number"""
+        return f"{branch.code.upper()}{year}{number:04d}"
+
+    @classmethod
+    def allocate_ids(cls, branch, count=1, year=None):
+        """Reserve ``count`` consecutive membership IDs for a branch (e.g. for bulk imports)"""
+        year = year or timezone.now().year
+        first = cls.reserve(branch, year, count)
+        return [cls.format_membership_id(branch, year, number) for number in range(first, first + count)]
+
+    @classmethod
+    def reserve(cls, branch, year, count=1):
+        """Atomically reserve ``count`` numbers and return the first one"""
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        first = cls._reserve_existing(branch, year, count)
+        if first is None:
+            cls._create_sequence(branch, year)
+            first = cls._reserve_existing(branch, year, count)
+        return first
+
+    @classmethod
+    def _reserve_existing(cls, branch, year, count):
+        """Reserve from an existing sequence row; None if the row does not exist yet"""
+        if supports_update_returning():
+            qn = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {qn(cls._meta.db_table)} SET {qn('next_value')} = {qn('next_value')} + %s "
+                    f"WHERE {qn('branch_id')} = %s AND {qn('year')} = %s RETURNING {qn('next_value')}",
+                    [count, branch.pk, year],
+                )
+                rows = cursor.fetchall()
+            return rows[0][0] - count if rows else None
+
+        with transaction.atomic():
+            sequence = cls.objects.select_for_update().filter(branch=branch, year=year).first()
+            if sequence is None:
+                return None
+            first = sequence.next_value
+            cls.objects.filter(pk=sequence.pk).update(next_value=models.F('next_value') + count)
+            return first
+
+    @classmethod
+    def _create_sequence(cls, branch, year):
+        """Create the sequence row, continuing after any IDs already issued for the prefix"""
+        prefix = f"{branch.code.upper()}{year}"
+        issued = Member.objects.filter(
+            branch=branch, membership_id__startswith=prefix
+        ).values_list('membership_id', flat=True)
+        numbers = [int(value[len(prefix):]) for value in issued if value[len(prefix):].isdigit()]
+        try:
+            with transaction.atomic():
+                cls.objects.create(branch=branch, year=year, next_value=max(numbers, default=0) + 1)
+        except IntegrityError:
+            # Another registration created the row first
+            pass
+
+
+class ChangeSequence(models.Model):
+    """Monotonic counters behind change feeds (e.g. the member delta sync).
+
+    Members have one counter per branch (``member_log``), so writes in
+    different branches never wait for each other. Values are reserved with
+    an ``UPDATE ... RETURNING`` on the counter row inside the writer's
+    transaction. The row stays locked until that transaction commits, so a
+    branch's values become visible in increasing order and a client that
+    has seen value N of a branch never misses a later commit with a smaller
+    value.
+    """
+    MEMBERS = 'members'
+
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+    # Tombstones up to this value have been pruned; older clients must resync
+    pruned_through = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Mfuatano wa Mabadiliko"
+        verbose_name_plural = "Mifuatano ya Mabadiliko"
+
+    def __str__(self):
+        return f"{self.name} -> {self.last_value}"
+
+    @classmethod
+    def reserve(cls, name, count=1):
+        """Reserve ``count`` consecutive values and return the first one"""
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        last = cls._reserve_existing(name, count)
+        if last is None:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(name=name)
+            except IntegrityError:
+                # Another writer created the row first
+                pass
+            last = cls._reserve_existing(name, count)
+        return last - count + 1
+
+    @classmethod
+    def _reserve_existing(cls, name, count):
+        """Advance an existing counter and return its new value; None if missing"""
+        if supports_update_returning():
+            qn = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {qn(cls._meta.db_table)} SET {qn('last_value')} = {qn('last_value')} + %s "
+                    f"WHERE {qn('name')} = %s RETURNING {qn('last_value')}",
+                    [count, name],
+                )
+                rows = cursor.fetchall()
+            return rows[0][0] if rows else None
+
+        with transaction.atomic():
+            sequence = cls.objects.select_for_update().filter(name=name).first()
+            if sequence is None:
+                return None
+            cls.objects.filter(pk=sequence.pk).update(last_value=models.F('last_value') + count)
+            return sequence.last_value + count
+
+    @classmethod
+    def member_log(cls, branch_id):
+        """Counter name of a branch's member change log (``members:0`` for members without a branch)"""
+        return f'{cls.MEMBERS}:{branch_id or 0}'
+
+    @classmethod
+    def member_log_branch(cls, name):
+        """Branch id of a member change log counter (0 for members without a branch)"""
+        return int(name.rpartition(':')[2])
+
+    @classmethod
+    def reserve_member_logs(cls, *branch_ids):
+        """
+        Reserve one value in each branch's member change log; returns them
+        in argument order. Counters are locked in branch order so two
+        members moving in opposite directions cannot deadlock.
+        """
+        reserved = {
+            branch_id or 0: cls.reserve(cls.member_log(branch_id))
+            for branch_id in sorted({branch_id or 0 for branch_id in branch_ids})
+        }
+        return [reserved[branch_id or 0] for branch_id in branch_ids]
+
+    @classmethod
+    def current(cls, name):
+        """Return (last_value, pruned_through) for a counter"""
+        row = cls.objects.filter(name=name).values_list('last_value', 'pruned_through').first()
+        return row or (0, 0)
+
+
+class MemberTombstone(models.Model):
+    """Record of a member leaving a branch (deleted or moved), for delta sync"""
+    member_id = models.BigIntegerField()
+    # No constraint: tombstones must outlive deleted branches
+    branch = models.ForeignKey(
+        Branch, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+'
+    )
+    # Position in the branch's member change log
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Kumbukumbu ya Mshirika Aliyeondolewa"
+        verbose_name_plural = "Kumbukumbu za Washirika Walioondolewa"
+        indexes = [
+            models.Index(fields=['branch', 'change_seq'], name='tombstone_branch_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id} @ {self.change_seq}"
+
+    @classmethod
+    def record(cls, member_id, branch_id, change_seq=None):
+        if change_seq is None:
+            change_seq, = ChangeSequence.reserve_member_logs(branch_id)
+        return cls.objects.create(member_id=member_id, branch_id=branch_id, change_seq=change_seq)
+
+
+class BranchStatsRollup(models.Model):
+    """Pre-aggregated member counters per branch and registration month.
+
+    Kept up to date by the Member save/delete signals below. Bulk ORM writes
+    (``QuerySet.update()``, ``bulk_create()``) bypass the signals; run the
+    ``rebuild_stats_rollup`` management command after those.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='stats_rollups',
+                               null=True, blank=True)
+    month = models.DateField(help_text="First day of the registration month")
+
+    total = models.IntegerField(default=0)
+    male = models.IntegerField(default=0)
+    female = models.IntegerField(default=0)
+    baptized = models.IntegerField(default=0)
+    membership_class_completed = models.IntegerField(default=0)
+    age_mtoto = models.IntegerField(default=0)
+    age_kijana = models.IntegerField(default=0)
+    age_mtu_mzima = models.IntegerField(default=0)
+    type_new = models.IntegerField(default=0)
+    type_transfer = models.IntegerField(default=0)
+    type_returning = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['branch', '-month']
+        verbose_name = "Takwimu za Tawi"
+        verbose_name_plural = "Takwimu za Matawi"
+        unique_together = ['branch', 'month']
+
+    def __str__(self):
+        branch_name = self.branch.name if self.branch else 'Bila tawi'
+        return f"{branch_name} - {self.month:%Y-%m} ({self.total})"
+
+
 class AttendanceSession(models.Model):
     """Model for tracking attendance sessions (services, events, etc.)"""
     SERVICE_TYPES = [
@@ -203,6 +492,23 @@ class AttendanceSession(models.Model):
         return round((self.get_attendance_count() / total_members) * 100, 2)
 
 
+class AttendanceSyncBatch(models.Model):
+    """One offline attendance upload, kept so a retried upload is not applied twice"""
+    batch_id = models.UUIDField(unique=True)
+    device_id = models.CharField(max_length=100, blank=True)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_sync_batches')
+    record_count = models.IntegerField(default=0)
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Kundi la Mahudhurio Nje ya Mtandao"
+        verbose_name_plural = "Makundi ya Mahudhurio Nje ya Mtandao"
+
+    def __str__(self):
+        return f"{self.batch_id} ({self.record_count})"
+
+
 class AttendanceRecord(models.Model):
     """Model for individual attendance records"""
     session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE, related_name='attendance_records')
@@ -210,6 +516,12 @@ class AttendanceRecord(models.Model):
     marked_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='marked_attendance')
     marked_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
+    # Set for records captured offline: when the device marked the member,
+    # and the upload that delivered the record
+    client_marked_at = models.DateTimeField(null=True, blank=True)
+    sync_batch = models.ForeignKey(
+        AttendanceSyncBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='records'
+    )
     
     class Meta:
         unique_together = ['session', 'member']
@@ -220,6 +532,55 @@ class AttendanceRecord(models.Model):
     def __str__(self):
         return f"{self.member.full_name} - {self.session.title}"
 
+    @classmethod
+    def mark_present(cls, session, member_ids, marked_by, notes='', batch_size=500):
+        """
+        Insert a record for every member in ``member_ids`` not yet marked for
+        ``session`` and return the ids of the members this call inserted.
+        Members marked meanwhile (another request, the kiosk or an offline
+        upload) are skipped by the (session, member) unique constraint.
+        """
+        member_ids = sorted(member_ids)
+        if not supports_update_returning():
+            # No INSERT ... RETURNING: read what is there with the session row
+            # locked, so concurrent marks of the session take turns
+            with transaction.atomic():
+                AttendanceSession.objects.select_for_update().filter(pk=session.pk).first()
+                existing = set(
+                    cls.objects.filter(session=session, member_id__in=member_ids)
+                    .values_list('member_id', flat=True)
+                )
+                new = [member_id for member_id in member_ids if member_id not in existing]
+                cls.objects.bulk_create(
+                    [cls(session=session, member_id=member_id, marked_by=marked_by, notes=notes) for member_id in new],
+                    batch_size=batch_size,
+                    ignore_conflicts=True,
+                )
+            return set(new)
+
+        qn = connection.ops.quote_name
+        columns = ', '.join(qn(cls._meta.get_field(name).column) for name in (
+            'session', 'member', 'marked_by', 'marked_at', 'notes'
+        ))
+        marked_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        inserted = set()
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(member_ids), batch_size):
+                chunk = member_ids[start:start + batch_size]
+                params = []
+                for member_id in chunk:
+                    params += [session.pk, member_id, marked_by.pk, marked_at, notes]
+                # RETURNING reports exactly the rows stored, not the skipped ones
+                cursor.execute(
+                    f"INSERT INTO {qn(cls._meta.db_table)} ({columns}) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))} "
+                    f"ON CONFLICT ({qn('session_id')}, {qn('member_id')}) DO NOTHING "
+                    f"RETURNING {qn('member_id')}",
+                    params,
+                )
+                inserted.update(member_id for member_id, in cursor.fetchall())
+        return inserted
+
 
 class NewsCategory(models.Model):
     """Categories for news and announcements"""
@@ -301,3 +662,34 @@ class News(models.Model):
             raise ValidationError("Branch-specific news must have a branch assigned.")
         if self.scope == 'general' and self.branch:
             raise ValidationError("General news should not have a branch assigned.")
+
+
+@receiver(post_save, sender=Member)
+def update_stats_rollup_on_save(sender, instance, raw=False, **kwargs):
+    """Move the member's counters from its previous bucket to its current one"""
+    if raw:
+        return
+    from .stats import apply_rollup_changes, member_rollup_values
+    apply_rollup_changes([(getattr(instance, '_stats_previous', None), member_rollup_values(instance))])
+
+
+@receiver(post_save, sender=Member)
+def record_member_branch_move(sender, instance, raw=False, created=False, **kwargs):
+    """A member moved to another branch leaves a tombstone in the old one"""
+    previous = getattr(instance, '_stats_previous', None)
+    if raw or created or not previous or previous['branch_id'] == instance.branch_id:
+        return
+    MemberTombstone.record(instance.pk, previous['branch_id'], instance._tombstone_seq)
+
+
+@receiver(post_delete, sender=Member)
+def update_stats_rollup_on_delete(sender, instance, **kwargs):
+    """Remove a deleted member's counters from the rollup"""
+    from .stats import apply_rollup_changes, member_rollup_values
+    apply_rollup_changes([(member_rollup_values(instance), None)])
+
+
+@receiver(post_delete, sender=Member)
+def record_member_deletion(sender, instance, **kwargs):
+    """Deleted members leave a tombstone for delta-sync clients"""
+    MemberTombstone.record(instance.pk, instance.branch_id)
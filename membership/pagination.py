@@ -0,0 +1,240 @@
+"""
+Pagination classes for the membership API
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class MemberPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class MemberKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for the member list.
+
+    Opt in with ``?pagination=cursor``; follow-up pages carry an opaque
+    ``cursor`` parameter. Pages are fetched with a ``WHERE (key) > (last key)``
+    predicate on the queryset's ordering plus stable tie-breakers, so deep
+    pages cost the same as the first one and no COUNT(*) is issued.
+    """
+    page_size = MemberPagination.page_size
+    page_size_query_param = MemberPagination.page_size_query_param
+    max_page_size = MemberPagination.max_page_size
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    tie_breakers = ('full_name', 'id')
+    invalid_cursor_message = 'Cursor si sahihi.'
+
+    @classmethod
+    def is_requested(cls, request):
+        """Check if the client asked for cursor pagination"""
+        params = request.query_params
+        return params.get(cls.mode_query_param) == 'cursor' or cls.cursor_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        ordering = self.get_ordering(queryset)
+        self.keys = self.get_keys(queryset.model, ordering)
+        position, reverse = self.decode_cursor(request, ordering)
+        self.ordering = ordering
+
+        queryset = queryset.order_by(*[
+            self.order_expression(field, descending != reverse, nullable)
+            for field, descending, nullable in self.keys
+        ])
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position, reverse))
+        queryset = self.load_keys(queryset)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        if results:
+            self.next_position = self.get_position(results[-1])
+            self.previous_position = self.get_position(results[0])
+        else:
+            # Empty page: both links resume from the requested position
+            self.next_position = self.previous_position = position
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """Primary ordering as set by the view (falls back to Meta.ordering)"""
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return ordering[0]
+
+    def get_keys(self, model, ordering):
+        """Return (field, descending, nullable) for the ordering plus tie-breakers"""
+        primary = ordering.lstrip('-')
+        fields = [(primary, ordering.startswith('-'))]
+        fields += [(field, False) for field in self.tie_breakers if field != primary]
+        return [
+            (field, descending, self.is_nullable(model, field))
+            for field, descending in fields
+        ]
+
+    def load_keys(self, queryset):
+        """Make sure a narrowed queryset still loads every cursor key"""
+        keys = [field for field, descending, nullable in self.keys]
+        if queryset._fields:
+            # .values(...) rows: add any missing key column
+            missing = [field for field in keys if field not in queryset._fields]
+            return queryset.values(*queryset._fields, *missing) if missing else queryset
+        loaded, deferred = queryset.query.deferred_loading
+        if not deferred:
+            # .only(...) instances: annotations are always loaded
+            return queryset.only(*loaded, *[
+                field for field in keys if self.is_model_field(queryset.model, field)
+            ])
+        return queryset
+
+    @staticmethod
+    def is_model_field(model, field):
+        try:
+            model._meta.get_field(field)
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    @staticmethod
+    def is_nullable(model, field):
+        try:
+            return model._meta.get_field(field).null
+        except FieldDoesNotExist:
+            # Annotation such as the search rank; never NULL for matched rows
+            return False
+
+    @staticmethod
+    def order_expression(field, descending, nullable):
+        """Order expression that always sorts NULL as the smallest value"""
+        if not nullable:
+            return f'-{field}' if descending else field
+        if descending:
+            return F(field).desc(nulls_last=True)
+        return F(field).asc(nulls_first=True)
+
+    def keyset_filter(self, position, reverse):
+        """
+        Build ``(k1, k2, ...) > (v1, v2, ...)`` honouring each key's direction,
+        expanded as ``k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...``
+        """
+        condition = Q(pk__in=[])
+        equal_so_far = Q()
+        for (field, descending, nullable), value in zip(self.keys, position):
+            after = self.after_value(field, value, descending != reverse, nullable)
+            condition |= equal_so_far & after
+            equal_so_far &= Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+        return condition
+
+    @staticmethod
+    def after_value(field, value, descending, nullable):
+        """Rows that sort strictly after ``value`` on a single key"""
+        if value is None:
+            # NULL sorts first: everything non-null comes after it ascending,
+            # nothing comes after it descending
+            return Q(pk__in=[]) if descending else Q(**{f'{field}__isnull': False})
+        if descending:
+            after = Q(**{f'{field}__lt': value})
+            if nullable:
+                after |= Q(**{f'{field}__isnull': True})
+            return after
+        return Q(**{f'{field}__gt': value})
+
+    def get_position(self, instance):
+        return [
+            instance[field] if isinstance(instance, dict)
+            else instance.pk if field == 'id' else getattr(instance, field)
+            for field, descending, nullable in self.keys
+        ]
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps(
+            {'o': self.ordering, 'p': position, 'r': int(reverse)},
+            cls=DjangoJSONEncoder,
+            separators=(',', ':'),
+        )
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, ordering):
+        """Return (position, reverse) from the request cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = payload['p']
+            reverse = bool(payload.get('r'))
+            if not isinstance(position, list):
+                raise ValueError(position)
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only valid for the ordering it was issued under
+        if payload.get('o') != ordering or len(position) != len(self.keys):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_next_link(self):
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,88 @@
+"""
+Phone number normalization
+
+Members type phone numbers in many shapes (``0712 345-678``,
+``+254712345678``, ``254712345678``). ``to_e164`` maps them to one canonical
+E.164 string so the indexed ``phone_e164`` / ``emergency_phone_e164`` columns
+support exact and prefix lookups.
+"""
+import re
+
+from django.conf import settings
+
+# Country code assumed for numbers written in local format (leading 0)
+DEFAULT_COUNTRY_CODE = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '254')
+
+PHONE_SEPARATORS = re.compile(r'[\s\-\(\)\.]')
+PHONE_LIKE = re.compile(r'^\+?[\d\s\-\(\)\.]+$')
+# Shortest search term routed to the phone index
+MIN_PHONE_SEARCH_DIGITS = 4
+
+
+def _canonical_digits(value):
+    """Digits of the number including the country code, or None"""
+    phone = PHONE_SEPARATORS.sub('', value)
+    if phone.startswith('00'):
+        return phone[2:]
+    if phone.startswith('+'):
+        return phone[1:]
+    if phone.startswith('0'):
+        return DEFAULT_COUNTRY_CODE + phone[1:]
+    if phone.startswith(DEFAULT_COUNTRY_CODE):
+        return phone
+    return None
+
+
+def to_e164(value):
+    """Return ``value`` in E.164 format (``+254712345678``), or None if it is not a phone number"""
+    if not value:
+        return None
+    digits = _canonical_digits(value)
+    if not digits or not digits.isdigit() or not 8 <= len(digits) <= 15:
+        return None
+    return f'+{digits}'
+
+
+def phone_search_prefix(term):
+    """
+    If a search term looks like (the start of) a phone number, return its
+    E.164 prefix (``0712`` -> ``+254712``); otherwise None.
+    """
+    if not PHONE_LIKE.match(term):
+        return None
+    digits = _canonical_digits(term)
+    if not digits or not digits.isdigit():
+        return None
+    if len(PHONE_SEPARATORS.sub('', term).lstrip('+')) < MIN_PHONE_SEARCH_DIGITS:
+        return None
+    return f'+{digits}'
+
+
+def backfill_phone_e164(member_model, batch_size=1000):
+    """
+    Fill the E.164 columns of every member, ``batch_size`` rows at a time by
+    primary key; only changed rows are written. Returns the number updated.
+    """
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            member_model.objects.filter(pk__gt=last_pk).order_by('pk').only(
+                'pk', 'phone', 'emergency_phone', 'phone_e164', 'emergency_phone_e164'
+            )[:batch_size]
+        )
+        if not batch:
+            return updated
+        last_pk = batch[-1].pk
+
+        changed = []
+        for member in batch:
+            phone_e164 = to_e164(member.phone)
+            emergency_phone_e164 = to_e164(member.emergency_phone)
+            if (phone_e164, emergency_phone_e164) != (member.phone_e164, member.emergency_phone_e164):
+                member.phone_e164 = phone_e164
+                member.emergency_phone_e164 = emergency_phone_e164
+                changed.append(member)
+        if changed:
+            member_model.objects.bulk_update(changed, ['phone_e164', 'emergency_phone_e164'])
+            updated += len(changed)
@@ -0,0 +1,241 @@
+"""
+Member search backends
+
+``filter_member_queryset`` hands the ``search`` parameter to the backend for
+the current database:
+
+* PostgreSQL - ``icontains`` served by pg_trgm GIN indexes, ranked with
+  ``SearchRank`` plus trigram similarity on the name
+* SQLite - an FTS5 shadow table (trigram tokenizer) kept in sync by
+  triggers, ranked by how well the name matches
+* anything else - plain ``icontains`` without ranking
+
+Phone-like terms (``0712``, ``+254 712``) additionally match with a range
+scan on the indexed E.164 columns, so local and international spellings of
+a number find each other. Set ``MEMBER_SEARCH_BACKEND`` to a
+dotted path to force a backend.
+"""
+import logging
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+
+from .phones import phone_search_prefix
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ('full_name', 'membership_id', 'phone', 'email', 'emergency_phone')
+
+# Annotation holding the relevance score (higher is better); ranked backends add it
+RANK_ANNOTATION = 'search_rank'
+
+
+class IContainsSearchBackend:
+    """Case-insensitive substring match on every search field, unranked"""
+
+    def filter_q(self, term):
+        query = Q()
+        for field in SEARCH_FIELDS:
+            query |= Q(**{f'{field}__icontains': term})
+        return query
+
+    def search(self, queryset, term):
+        return queryset.filter(self.filter_q(term))
+
+
+class PostgresSearchBackend(IContainsSearchBackend):
+    """
+    ``icontains`` is compiled to ``UPPER(col::text) LIKE UPPER(%s)``, which the
+    ``UPPER(col::text) gin_trgm_ops`` indexes from migration 0008 serve.
+    """
+
+    def search(self, queryset, term):
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVector, TrigramSimilarity,
+        )
+        vector = (
+            SearchVector('full_name', weight='A', config='simple')
+            + SearchVector('membership_id', 'email', 'phone', 'emergency_phone', weight='B', config='simple')
+        )
+        # SearchRank and similarity are float4; keyset cursors compare the rank
+        # against a Python float, so use float8 to round-trip it exactly
+        rank = Cast(
+            SearchRank(vector, SearchQuery(term, config='simple')) + TrigramSimilarity('full_name', term),
+            FloatField(),
+        )
+        return super().search(queryset, term).annotate(**{RANK_ANNOTATION: rank})
+
+
+def name_match_rank(term):
+    """Cheap per-row relevance: exact name > name prefix > name substring > other fields"""
+    return Case(
+        When(full_name__iexact=term, then=Value(3.0)),
+        When(full_name__istartswith=term, then=Value(2.0)),
+        When(full_name__icontains=term, then=Value(1.0)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+class SQLiteSearchBackend(IContainsSearchBackend):
+    """
+    Match against the ``membership_member_fts`` FTS5 table.
+
+    Rows are ranked with ``name_match_rank``: a per-row bm25() lookup needs a
+    correlated MATCH per candidate and took seconds on 200k members.
+    """
+    table = 'membership_member_fts'
+    # The trigram tokenizer cannot match terms shorter than three characters
+    min_term_length = 3
+
+    def search(self, queryset, term):
+        if len(term) < self.min_term_length or not sqlite_search_index_exists():
+            return super().search(queryset, term)
+
+        match = '"{}"'.format(term.replace('"', '""'))
+        matching_ids = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        return queryset.filter(id__in=matching_ids).annotate(**{RANK_ANNOTATION: name_match_rank(term)})
+
+
+def phone_prefix_q(prefix):
+    """
+    Match either E.164 phone column starting with ``prefix`` as an index range
+    scan (``LIKE 'x%'`` cannot use a plain B-tree index on SQLite or on
+    PostgreSQL with a non-C collation)
+    """
+    # Smallest string greater than every number starting with the prefix
+    head = prefix.rstrip('9')
+    if head == '+':
+        upper = None
+    else:
+        upper = head[:-1] + str(int(head[-1]) + 1)
+    query = Q()
+    for field in ('phone_e164', 'emergency_phone_e164'):
+        bounds = {f'{field}__gte': prefix}
+        if upper:
+            bounds[f'{field}__lt'] = upper
+        query |= Q(**bounds)
+    return query
+
+
+def search_members(queryset, term):
+    """Search with the backend; phone-like terms also match the E.164 index"""
+    prefix = phone_search_prefix(term)
+    if prefix:
+        # Digit runs like "0042" may also be the end of a membership ID (KTR20240042)
+        matches = get_search_backend().search(queryset.model.objects.all(), term)
+        return queryset.filter(phone_prefix_q(prefix) | Q(pk__in=matches.values('pk')))
+    return get_search_backend().search(queryset, term)
+
+
+def get_search_backend():
+    """Return the search backend for the default database"""
+    path = getattr(settings, 'MEMBER_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    return IContainsSearchBackend()
+
+
+# SQLite FTS5 shadow table -------------------------------------------------
+
+FTS_COLUMNS = ', '.join(SEARCH_FIELDS)
+FTS_NEW_VALUES = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+FTS_OLD_VALUES = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+
+SQLITE_FTS_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS membership_member_fts USING fts5("
+    f"{FTS_COLUMNS}, content='membership_member', content_rowid='id', tokenize='trigram')"
+)
+SQLITE_FTS_TRIGGERS_SQL = {
+    'membership_member_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS membership_member_fts_ai AFTER INSERT ON membership_member BEGIN
+            INSERT INTO membership_member_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {FTS_NEW_VALUES});
+        END""",
+    'membership_member_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS membership_member_fts_ad AFTER DELETE ON membership_member BEGIN
+            INSERT INTO membership_member_fts(membership_member_fts, rowid, {FTS_COLUMNS})
+            VALUES ('delete', old.id, {FTS_OLD_VALUES});
+        END""",
+    'membership_member_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS membership_member_fts_au AFTER UPDATE ON membership_member BEGIN
+            INSERT INTO membership_member_fts(membership_member_fts, rowid, {FTS_COLUMNS})
+            VALUES ('delete', old.id, {FTS_OLD_VALUES});
+            INSERT INTO membership_member_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {FTS_NEW_VALUES});
+        END""",
+}
+
+
+def sqlite_search_index_exists():
+    """Check (once per connection) that the FTS5 table is available"""
+    if not hasattr(connection, '_member_fts_exists'):
+        with connection.cursor() as cursor:
+            connection._member_fts_exists = 'membership_member_fts' in connection.introspection.table_names(cursor)
+    return connection._member_fts_exists
+
+
+def ensure_sqlite_search_index(db_connection, create=True):
+    """
+    Create the FTS5 table (unless ``create`` is False) and its sync triggers
+    if missing.
+
+    SQLite drops triggers whenever a migration rebuilds ``membership_member``,
+    so this also runs after every ``migrate`` (see ``update_search_index``)
+    and reindexes whenever triggers had to be recreated. Returns False if the
+    table is absent or this SQLite build lacks FTS5 or the trigram tokenizer.
+    """
+    with db_connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') "
+            "AND name LIKE 'membership_member%'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if 'membership_member' not in existing:
+            return False
+        if 'membership_member_fts' not in existing:
+            if not create:
+                return False
+            try:
+                cursor.execute(SQLITE_FTS_TABLE_SQL)
+            except OperationalError as e:
+                logger.warning("SQLite full-text search unavailable (%s); member search falls back to icontains", e)
+                return False
+
+        missing = [name for name in SQLITE_FTS_TRIGGERS_SQL if name not in existing]
+        for name in missing:
+            cursor.execute(SQLITE_FTS_TRIGGERS_SQL[name])
+        if missing:
+            # Rows written while triggers were missing are unknown: reindex everything
+            cursor.execute("INSERT INTO membership_member_fts(membership_member_fts) VALUES ('rebuild')")
+    db_connection.__dict__.pop('_member_fts_exists', None)
+    return True
+
+
+def drop_sqlite_search_index(db_connection):
+    with db_connection.cursor() as cursor:
+        for name in SQLITE_FTS_TRIGGERS_SQL:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute('DROP TABLE IF EXISTS membership_member_fts')
+    db_connection.__dict__.pop('_member_fts_exists', None)
+
+
+def update_search_index(sender, using, **kwargs):
+    """post_migrate receiver: restore SQLite search triggers dropped by table rebuilds"""
+    db_connection = connections[using]
+    if db_connection.vendor == 'sqlite':
+        ensure_sqlite_search_index(db_connection, create=False)
+
+
+# PostgreSQL trigram indexes ------------------------------------------------
+
+POSTGRES_TRGM_INDEXES = {
+    f'member_{field}_trgm_idx': f'UPPER(({field})::text) gin_trgm_ops'
+    for field in SEARCH_FIELDS
+}
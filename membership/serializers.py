@@ -1,12 +1,22 @@
 # membership/serializers.py
 
 from rest_framework import serializers
+from rest_framework import ISO_8601
+from rest_framework.settings import api_settings
 from django.utils import timezone
 from datetime import date
+from operator import itemgetter
 import re
 from .models import Member
 
 class MemberSerializer(serializers.ModelSerializer):
+    """
+    Member representation for the API.
+
+    Pass ``fields`` to serialize only a subset of ``Meta.fields`` (sparse
+    fieldsets); ``model_columns`` gives the columns those fields read so the
+    queryset can be narrowed to match with ``.only()``.
+    """
     # Add computed fields for better API responses
     age_from_dob = serializers.ReadOnlyField()
     is_baptized = serializers.ReadOnlyField()
@@ -14,6 +24,15 @@ class MemberSerializer(serializers.ModelSerializer):
     display_name = serializers.SerializerMethodField()
     contact_info = serializers.SerializerMethodField()
     
+    # Model columns read by each computed field
+    computed_sources = {
+        'age_from_dob': ['dob'],
+        'is_baptized': ['baptized'],
+        'has_completed_membership_class': ['membership_class'],
+        'display_name': ['full_name'],
+        'contact_info': ['phone', 'email'],
+    }
+    
     class Meta:
         model = Member
         fields = [
@@ -49,6 +68,54 @@ class MemberSerializer(serializers.ModelSerializer):
             'registration_date': {'error_messages': {'required': 'Tarehe ya usajili ni lazima.', 'invalid': 'Ingiza tarehe sahihi.'}},
         }
     
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            keep = set(fields)
+            for name in [name for name in self.fields if name not in keep]:
+                self.fields.pop(name)
+    
+    @classmethod
+    def model_columns(cls, fields):
+        """Model columns needed to serialize ``fields``"""
+        sources = cls.computed_sources
+        columns = []
+        for name in fields:
+            for column in sources.get(name, [name]):
+                if column not in columns:
+                    columns.append(column)
+        return columns
+    
+    @classmethod
+    def fields_for_user(cls, user, requested=None):
+        """
+        Fields ``user`` may see, in ``Meta.fields`` order, optionally narrowed
+        to the comma-separated ``requested`` list. A computed field is visible
+        only when every column it reads is. Raises ValidationError for names
+        that are not member fields at all.
+        """
+        profile = getattr(user, 'profile', None) if user.is_authenticated else None
+        accessible = profile.get_accessible_member_fields() if profile else []
+        sources = cls.computed_sources
+        if accessible == 'all':
+            visible = list(cls.Meta.fields)
+        else:
+            visible = [
+                name for name in cls.Meta.fields
+                if all(column in accessible for column in sources.get(name, [name]))
+            ]
+        if requested is None:
+            return visible
+        
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in cls.Meta.fields]
+        if unknown:
+            raise serializers.ValidationError({
+                'fields': f"Sehemu hizi hazijulikani: {', '.join(unknown)}."
+            })
+        # Fields hidden from the role are dropped silently rather than reported
+        return [name for name in visible if name in names]
+    
     def get_display_name(self, obj):
         """Get formatted display name"""
         return obj.get_display_name()
@@ -167,3 +234,77 @@ class MemberSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(errors)
         
         return data
+
+
+class MemberRowSerializer:
+    """
+    Read-only fast path for member lists.
+
+    Produces the same output as ``MemberSerializer`` from ``.values()`` rows
+    (dicts holding at least ``columns``) using one precompiled converter per
+    field, with computed fields evaluated inline against a single ``today``.
+    """
+    
+    def __init__(self, fields=None, today=None):
+        # Same key order as MemberSerializer, whatever order ``fields`` is in
+        self.fields = [
+            name for name in MemberSerializer.Meta.fields
+            if fields is None or name in fields
+        ]
+        self.columns = MemberSerializer.model_columns(self.fields)
+        self.today = today or timezone.now().date()
+        declared = MemberSerializer().fields
+        self.converters = [(name, self.converter(name, declared[name])) for name in self.fields]
+    
+    def converter(self, name, field):
+        """Return a function mapping a row to the representation of ``name``"""
+        computed = getattr(self, f'convert_{name}', None)
+        if computed is not None:
+            return computed
+        if isinstance(field, (serializers.CharField, serializers.ChoiceField)):
+            # Database strings (or NULL) are already their own representation
+            return itemgetter(name)
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if isinstance(field, serializers.DateField) and isinstance(output_format, str) \
+                and output_format.lower() == ISO_8601:
+            def convert_date(row):
+                value = row[name]
+                return value.isoformat() if value else None
+            return convert_date
+        
+        def convert(row):
+            value = row[name]
+            return None if value is None else field.to_representation(value)
+        return convert
+    
+    def convert_age_from_dob(self, row):
+        dob = row['dob']
+        if dob:
+            today = self.today
+            return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+        return None
+    
+    @staticmethod
+    def convert_is_baptized(row):
+        return row['baptized'] == 'Yes'
+    
+    @staticmethod
+    def convert_has_completed_membership_class(row):
+        return row['membership_class'] == 'Yes'
+    
+    @staticmethod
+    def convert_display_name(row):
+        return row['full_name'].title()
+    
+    @staticmethod
+    def convert_contact_info(row):
+        contacts = []
+        if row['phone']:
+            contacts.append(f"Simu: {row['phone']}")
+        if row['email']:
+            contacts.append(f"Email: {row['email']}")
+        return " | ".join(contacts) if contacts else "Hakuna taarifa za mawasiliano"
+    
+    def to_representation(self, rows):
+        converters = self.converters
+        return [{name: convert(row) for name, convert in converters} for row in rows]
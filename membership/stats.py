@@ -0,0 +1,193 @@
+"""
+Member statistics engine
+
+Dashboards read the pre-aggregated ``BranchStatsRollup`` table instead of
+scanning members: every counter comes from a single ``aggregate()`` of
+``Sum``s over the rollup rows, so any scope costs one round trip no matter
+how many counters the caller needs. The helpers at the bottom of this
+module maintain and rebuild the table.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import Member, BranchStatsRollup
+
+
+AGE_CATEGORIES = [value for value, label in Member._meta.get_field('age_category').choices]
+MEMBERSHIP_TYPES = [value for value, label in Member.MEMBERSHIP_CHOICES]
+
+
+def get_period_starts(today=None):
+    """Return (month_start, year_start) dates for 'new members' counters"""
+    today = today or timezone.localdate()
+    return today.replace(day=1), today.replace(month=1, day=1)
+
+
+def build_member_stats(row):
+    """Shape a flat aggregate row into the statistics dictionary"""
+    stats = {
+        key: row.get(key) or 0
+        for key in (
+            'total_members', 'male_members', 'female_members', 'baptized_members',
+            'new_members_this_year', 'new_members_this_month', 'membership_class_completed',
+        )
+    }
+    stats['by_age_category'] = {
+        category: row[f'age_category_{index}']
+        for index, category in enumerate(AGE_CATEGORIES)
+        if row.get(f'age_category_{index}')
+    }
+    stats['by_membership_type'] = {
+        membership_type: row[f'membership_type_{index}']
+        for index, membership_type in enumerate(MEMBERSHIP_TYPES)
+        if row.get(f'membership_type_{index}')
+    }
+    return stats
+
+
+def empty_member_stats():
+    """Statistics for an empty member set (no query needed)"""
+    return build_member_stats({})
+
+
+def annotate_branch_stats(branches, today=None):
+    """Annotate a Branch queryset with per-branch member counters (one GROUP BY)"""
+    month_start, _ = get_period_starts(today)
+    return branches.annotate(
+        total_members=Coalesce(Sum('stats_rollups__total'), 0),
+        new_this_month=Coalesce(
+            Sum('stats_rollups__total', filter=Q(stats_rollups__month__gte=month_start)), 0
+        ),
+        baptized=Coalesce(Sum('stats_rollups__baptized'), 0),
+    )
+
+
+# Rollup counter -> (member field, value) it counts; ``total`` counts every member
+ROLLUP_COUNTERS = {
+    'male': ('gender', 'Male'),
+    'female': ('gender', 'Female'),
+    'baptized': ('baptized', 'Yes'),
+    'membership_class_completed': ('membership_class', 'Yes'),
+    'age_mtoto': ('age_category', 'Mtoto'),
+    'age_kijana': ('age_category', 'Kijana'),
+    'age_mtu_mzima': ('age_category', 'Mtu mzima'),
+    'type_new': ('membership_type', 'New'),
+    'type_transfer': ('membership_type', 'Transfer'),
+    'type_returning': ('membership_type', 'Returning'),
+}
+ROLLUP_SOURCE_FIELDS = ('branch_id', 'registration_date') + tuple(
+    sorted({field for field, value in ROLLUP_COUNTERS.values()})
+)
+
+
+def rollup_member_stats(today=None, **filters):
+    """Compute member statistics from the rollup table, e.g. ``rollup_member_stats(branch=branch)``"""
+    month_start, year_start = get_period_starts(today)
+    aggregates = {
+        'total_members': Sum('total'),
+        'male_members': Sum('male'),
+        'female_members': Sum('female'),
+        'baptized_members': Sum('baptized'),
+        'new_members_this_year': Sum('total', filter=Q(month__gte=year_start)),
+        'new_members_this_month': Sum('total', filter=Q(month__gte=month_start)),
+        'membership_class_completed': Sum('membership_class_completed'),
+    }
+    for index, category in enumerate(AGE_CATEGORIES):
+        aggregates[f'age_category_{index}'] = Sum(rollup_counter_for('age_category', category))
+    for index, membership_type in enumerate(MEMBERSHIP_TYPES):
+        aggregates[f'membership_type_{index}'] = Sum(rollup_counter_for('membership_type', membership_type))
+    row = BranchStatsRollup.objects.filter(**filters).order_by().aggregate(**aggregates)
+    return build_member_stats(row)
+
+
+def rollup_counter_for(field, value):
+    """Name of the rollup counter tracking ``field == value``"""
+    for counter, (counter_field, counter_value) in ROLLUP_COUNTERS.items():
+        if (counter_field, counter_value) == (field, value):
+            return counter
+    raise KeyError(f"No rollup counter for {field}={value!r}")
+
+
+def member_rollup_values(member):
+    """The member attributes the rollup depends on"""
+    values = {field: getattr(member, field) for field in ROLLUP_SOURCE_FIELDS}
+    # Instances created from raw input may still hold the date as a string
+    values['registration_date'] = Member._meta.get_field('registration_date').to_python(
+        values['registration_date']
+    )
+    return values
+
+
+def rollup_key(values):
+    """(branch_id, month) bucket for a member's values"""
+    return values['branch_id'], values['registration_date'].replace(day=1)
+
+
+def rollup_counters(values):
+    """Names of the rollup counters a member contributes to"""
+    return ['total'] + [
+        counter for counter, (field, value) in ROLLUP_COUNTERS.items()
+        if values[field] == value
+    ]
+
+
+def apply_rollup_changes(changes):
+    """
+    Apply member changes to the rollup with F() increments.
+
+    ``changes`` is an iterable of ``(old_values, new_values)`` pairs as
+    returned by ``member_rollup_values``; ``None`` stands for "did not
+    exist" (create) or "no longer exists" (delete).
+    """
+    deltas = defaultdict(Counter)
+    for old, new in changes:
+        if old:
+            for counter in rollup_counters(old):
+                deltas[rollup_key(old)][counter] -= 1
+        if new:
+            for counter in rollup_counters(new):
+                deltas[rollup_key(new)][counter] += 1
+
+    for (branch_id, month), counters in deltas.items():
+        counters = {counter: delta for counter, delta in counters.items() if delta}
+        if counters:
+            apply_rollup_deltas(branch_id, month, counters)
+
+
+def apply_rollup_deltas(branch_id, month, counters):
+    """Add ``counters`` to one rollup row, creating the row if needed"""
+    rollups = BranchStatsRollup.objects.filter(branch_id=branch_id, month=month)
+    updates = {counter: F(counter) + delta for counter, delta in counters.items()}
+    if rollups.update(updated_at=timezone.now(), **updates):
+        return
+    if all(delta < 0 for delta in counters.values()):
+        # Nothing to decrement (e.g. the branch and its rollup are being deleted)
+        return
+    try:
+        with transaction.atomic():
+            BranchStatsRollup.objects.create(branch_id=branch_id, month=month, **counters)
+    except IntegrityError:
+        # Another request created the row first
+        rollups.update(updated_at=timezone.now(), **updates)
+
+
+def rebuild_stats_rollup():
+    """Recompute the whole rollup table from the member table; returns the row count"""
+    aggregates = {'total': Count('id')}
+    for counter, (field, value) in ROLLUP_COUNTERS.items():
+        aggregates[counter] = Count('id', filter=Q(**{field: value}))
+
+    rows = (
+        Member.objects.order_by()
+        .annotate(month=TruncMonth('registration_date'))
+        .values('branch_id', 'month')
+        .annotate(**aggregates)
+    )
+    with transaction.atomic():
+        BranchStatsRollup.objects.all().delete()
+        BranchStatsRollup.objects.bulk_create([BranchStatsRollup(**row) for row in rows])
+    return BranchStatsRollup.objects.count()
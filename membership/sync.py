@@ -0,0 +1,138 @@
+"""
+Offline attendance capture
+
+A device downloads a session roster (``attendance_roster``), records
+check-ins locally with its own timestamps and uploads them later as one
+batch tagged with a client-generated UUID. ``apply_batch`` applies a batch
+once: the AttendanceSyncBatch row is created in the same transaction as the
+attendance rows, so a retried upload (lost response, flaky connection)
+finds it and gets the stored result back instead of being applied again.
+
+Conflicts with check-ins from other devices, the kiosk or the web form are
+left to the (session, member) unique constraint: rows are inserted with
+``ignore_conflicts`` and the first record stored wins. Rows stored by this
+batch are counted afterwards through ``sync_batch``, so the reported counts
+stay exact while other devices sync at the same time.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AttendanceRecord, AttendanceSession, AttendanceSyncBatch, Member
+
+# Reasons reported for records that were not applied
+INVALID = 'invalid'
+UNKNOWN_SESSION = 'session'
+UNKNOWN_MEMBER = 'member'
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def parse_record(record):
+    """(session_id, member_id, client_marked_at, notes) or None if malformed"""
+    if not isinstance(record, dict):
+        return None
+    session_id, member_id = record.get('session'), record.get('member')
+    if not (_is_id(session_id) and _is_id(member_id)):
+        return None
+    client_marked_at = record.get('marked_at')
+    if client_marked_at is not None:
+        try:
+            client_marked_at = parse_datetime(client_marked_at)
+        except (TypeError, ValueError):
+            return None
+        if client_marked_at is None:
+            return None
+        if timezone.is_naive(client_marked_at):
+            client_marked_at = timezone.make_aware(client_marked_at)
+    return session_id, member_id, client_marked_at, str(record.get('notes') or '')
+
+
+def apply_batch(user, access, batch_id, device_id, records):
+    """
+    Apply one uploaded batch and return ``(batch, replayed)``.
+
+    ``replayed`` is True when ``batch_id`` was already applied; the stored
+    batch is returned unchanged (the caller checks it belongs to ``user``).
+    Records for closed sessions are accepted: they were captured while the
+    session was running, only delivered late.
+    """
+    batch = AttendanceSyncBatch.objects.filter(batch_id=batch_id).first()
+    if batch is not None:
+        return batch, True
+
+    rejected = []
+    parsed = []
+    for index, record in enumerate(records):
+        values = parse_record(record)
+        if values is None:
+            rejected.append({'index': index, 'reason': INVALID})
+        else:
+            parsed.append((index, values))
+
+    session_branches = {
+        session_id: branch_id
+        for session_id, branch_id in AttendanceSession.objects.filter(
+            pk__in={values[0] for index, values in parsed}
+        ).order_by().values_list('id', 'branch_id')
+        if access.can_access(branch_id)
+    }
+    member_branches = dict(
+        Member.objects.filter(pk__in={values[1] for index, values in parsed})
+        .order_by().values_list('id', 'branch_id')
+    )
+
+    # Earliest capture of each (session, member) pair within the batch
+    earliest = {}
+    for index, (session_id, member_id, client_marked_at, notes) in parsed:
+        branch_id = session_branches.get(session_id)
+        if branch_id is None:
+            rejected.append({'index': index, 'reason': UNKNOWN_SESSION})
+            continue
+        if member_branches.get(member_id) != branch_id:
+            rejected.append({'index': index, 'reason': UNKNOWN_MEMBER})
+            continue
+        key = (session_id, member_id)
+        current = earliest.get(key)
+        if current is None or (
+            client_marked_at is not None
+            and (current[0] is None or client_marked_at < current[0])
+        ):
+            earliest[key] = (client_marked_at, notes)
+    rejected.sort(key=lambda item: item['index'])
+
+    try:
+        with transaction.atomic():
+            batch = AttendanceSyncBatch.objects.create(
+                batch_id=batch_id, device_id=device_id, uploaded_by=user, record_count=len(records),
+            )
+            AttendanceRecord.objects.bulk_create(
+                [
+                    AttendanceRecord(
+                        session_id=session_id, member_id=member_id, marked_by=user, notes=notes,
+                        client_marked_at=client_marked_at, sync_batch=batch,
+                    )
+                    for (session_id, member_id), (client_marked_at, notes) in earliest.items()
+                ],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            created = AttendanceRecord.objects.filter(sync_batch=batch).count()
+            batch.result = {
+                'batch_id': str(batch_id),
+                'received': len(records),
+                'created': created,
+                # Already stored by another device, an earlier batch or this one
+                'duplicates': len(records) - len(rejected) - created,
+                'rejected': rejected,
+            }
+            batch.save(update_fields=['result'])
+    except IntegrityError:
+        # The same batch was uploaded concurrently and committed first
+        batch = AttendanceSyncBatch.objects.filter(batch_id=batch_id).first()
+        if batch is None:
+            raise
+        return batch, True
+    return batch, False
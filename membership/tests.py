@@ -1,3 +1,1498 @@
-from django.test import TestCase
+import csv
+import json
+import random
+import re
+import threading
+import uuid
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from authentication.models import AuditLog
+from church_portal.test_runner import SharedCacheMixin
+
+from . import kiosk
+from .models import (
+    Member, Branch, MembershipIdSequence, ChangeSequence, MemberTombstone,
+    AttendanceSession, AttendanceRecord, AttendanceSyncBatch,
+)
+from .serializers import MemberSerializer, MemberRowSerializer
+from .stats import AGE_CATEGORIES, MEMBERSHIP_TYPES, rollup_member_stats
+
+
+def create_member(**overrides):
+    """Create a member with sensible defaults for tests"""
+    data = {
+        'full_name': 'Test Member',
+        'gender': 'Male',
+        'age_category': 'Mtu mzima',
+        'address': 'Arusha',
+        'baptized': 'No',
+        'emergency_name': 'Contact',
+        'emergency_relation': 'Sibling',
+        'emergency_phone': '0712345678',
+        'membership_type': 'New',
+        'registration_date': date.today(),
+    }
+    data.update(overrides)
+    return Member.objects.create(**data)
+
+
+def count_member_stats(members):
+    """Reference statistics counted one query per counter"""
+    today = date.today()
+    this_year = members.filter(registration_date__year=today.year)
+    counts = {
+        'total_members': members.count(),
+        'male_members': members.filter(gender='Male').count(),
+        'female_members': members.filter(gender='Female').count(),
+        'baptized_members': members.filter(baptized='Yes').count(),
+        'new_members_this_year': this_year.count(),
+        'new_members_this_month': this_year.filter(registration_date__month=today.month).count(),
+        'membership_class_completed': members.filter(membership_class='Yes').count(),
+    }
+    counts['by_age_category'] = {
+        category: members.filter(age_category=category).count()
+        for category in AGE_CATEGORIES
+        if members.filter(age_category=category).exists()
+    }
+    counts['by_membership_type'] = {
+        membership_type: members.filter(membership_type=membership_type).count()
+        for membership_type in MEMBERSHIP_TYPES
+        if members.filter(membership_type=membership_type).exists()
+    }
+    return counts
+
+
+class MemberKeysetPaginationTests(TestCase):
+    """Cursor mode of /api/members/ must walk every row exactly once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('secretary', password='x')
+        cls.user.profile.role = 'secretary'
+        cls.user.profile.save()
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        names = ['Amina', 'Baraka', 'Amina', 'Daudi', 'Esther', 'Baraka', 'Faraja']
+        genders = ['Male', 'Female', 'Prefer not to say']
+        types = ['New', 'Transfer', 'Returning']
+        for i in range(23):
+            create_member(
+                branch=cls.branch,
+                full_name=names[i % len(names)],
+                gender=genders[i % 3],
+                membership_type=types[i % 3],
+                age_category=['Mtoto', 'Kijana', 'Mtu mzima'][i % 3],
+                registration_date=date.today() - timedelta(days=i % 4),
+                # Leave some IDs empty to exercise NULL ordering
+                membership_id=None if i % 5 == 0 else f'ARU{i:04d}',
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, link='next'):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            page = [row['full_name'] + str(row['membership_id']) for row in response.data['results']]
+            ids = ids + page if link == 'next' else page + ids
+            url = response.data[link]
+            pages += 1
+            self.assertLess(pages, 20)
+        return ids
+
+    def expected(self, ordering):
+        field = ordering.lstrip('-')
+        rows = list(Member.objects.values('full_name', 'membership_id', 'id', field))
+        rows.sort(key=lambda row: (row['full_name'], row['id']))
+        if field != 'full_name':
+            rows.sort(key=lambda row: (row[field] is not None, row[field] or ''),
+                      reverse=ordering.startswith('-'))
+        else:
+            rows.sort(key=lambda row: row['full_name'], reverse=ordering.startswith('-'))
+        return [row['full_name'] + str(row['membership_id']) for row in rows]
+
+    def test_walks_every_ordering_forward_and_back(self):
+        orderings = [
+            'full_name', '-full_name', 'registration_date', '-registration_date',
+            'membership_id', '-membership_id', 'gender', '-gender',
+            'age_category', '-age_category', 'membership_type', '-membership_type',
+        ]
+        for ordering in orderings:
+            with self.subTest(ordering=ordering):
+                forward = self.walk(f'/api/members/?pagination=cursor&page_size=4&ordering={ordering}')
+                self.assertEqual(forward, self.expected(ordering))
+
+                # Walk to the last page, then back to the start via previous links
+                url = f'/api/members/?pagination=cursor&page_size=4&ordering={ordering}'
+                while True:
+                    response = self.client.get(url)
+                    if not response.data['next']:
+                        break
+                    url = response.data['next']
+                backward = self.walk(response.data['previous'], link='previous')
+                self.assertEqual(backward + [
+                    row['full_name'] + str(row['membership_id']) for row in response.data['results']
+                ], forward)
+
+    def test_cursor_from_other_ordering_is_rejected(self):
+        response = self.client.get('/api/members/?pagination=cursor&page_size=4&ordering=full_name')
+        cursor_url = response.data['next'].replace('ordering=full_name', 'ordering=gender')
+        self.assertEqual(self.client.get(cursor_url).status_code, 404)
+        self.assertEqual(self.client.get('/api/members/?cursor=garbage').status_code, 404)
+
+    def test_page_number_mode_is_unchanged(self):
+        response = self.client.get('/api/members/?page=2&page_size=10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 23)
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class MemberStatisticsTests(TestCase):
+    """The shared stats engine must match naive per-counter queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+        today = date.today()
+        last_year = today.replace(year=today.year - 1)
+        create_member(branch=cls.branch, gender='Female', baptized='Yes', membership_class='Yes')
+        create_member(branch=cls.branch, gender='Male', age_category='Kijana', registration_date=last_year)
+        create_member(branch=cls.other, gender='Female', membership_type='Transfer', baptized='Yes')
+        create_member(branch=cls.other, gender='Prefer not to say', age_category='Mtoto',
+                      membership_type='Returning', registration_date=last_year)
+
+    def test_single_query_matches_naive_counts(self):
+        with self.assertNumQueries(1):
+            stats = rollup_member_stats()
+
+        self.assertEqual(stats, count_member_stats(Member.objects.all()))
+        self.assertEqual(stats['by_age_category'], {'Mtu mzima': 2, 'Kijana': 1, 'Mtoto': 1})
+        self.assertEqual(stats['by_membership_type'], {'New': 2, 'Transfer': 1, 'Returning': 1})
+
+    def test_statistics_endpoint_and_branch_scope(self):
+        from authentication.branch_context import get_branch_scoped_stats
+
+        response = APIClient().get('/api/statistics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_members'], 4)
+
+        with self.assertNumQueries(1):
+            stats = get_branch_scoped_stats(None, self.branch)
+        self.assertEqual(stats['total_members'], 2)
+        self.assertEqual(stats['baptized_members'], 1)
+
+
+class HomePageBranchStatsTests(TestCase):
+    """Multi-branch home page must not issue queries per branch"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('admin', password='x')
+        self.user.profile.role = 'admin'
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def add_branch(self, code):
+        branch = Branch.objects.create(name=f'Branch {code}', code=code)
+        create_member(branch=branch, baptized='Yes')
+        create_member(branch=branch, registration_date=date.today() - timedelta(days=400))
+        return branch
+
+    def home_page_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_constant_in_branch_count(self):
+        self.add_branch('ARU')
+        self.add_branch('DAR')
+        _, two_branches = self.home_page_queries()
+
+        for code in ('DOD', 'MWZ', 'MBY'):
+            self.add_branch(code)
+        response, five_branches = self.home_page_queries()
+
+        self.assertEqual(two_branches, five_branches)
+        branch_stats = {row['code']: row for row in response.context['branches_with_stats']}
+        self.assertEqual(len(branch_stats), 5)
+        self.assertEqual(branch_stats['DOD']['total_members'], 2)
+        self.assertEqual(branch_stats['DOD']['baptized'], 1)
+        self.assertEqual(branch_stats['DOD']['new_this_month'], 1)
+
+
+class BranchStatsRollupTests(TestCase):
+    """Signals must keep the rollup equal to a full recount"""
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='Arusha', code='ARU')
+        self.other = Branch.objects.create(name='Dodoma', code='DOD')
+
+    def assertRollupMatchesMembers(self):
+        self.assertEqual(rollup_member_stats(), count_member_stats(Member.objects.all()))
+        for branch in (self.branch, self.other):
+            self.assertEqual(
+                rollup_member_stats(branch=branch),
+                count_member_stats(Member.objects.filter(branch=branch)),
+            )
+
+    def test_signals_track_create_update_and_delete(self):
+        last_year = date.today().replace(year=date.today().year - 1)
+        member = create_member(branch=self.branch, gender='Female', baptized='Yes')
+        create_member(branch=self.other, age_category='Kijana', membership_type='Transfer')
+        create_member(branch=None, registration_date=last_year)
+        self.assertRollupMatchesMembers()
+
+        member.branch = self.other
+        member.gender = 'Male'
+        member.registration_date = last_year
+        member.membership_class = 'Yes'
+        member.save()
+        self.assertRollupMatchesMembers()
+
+        member.delete()
+        self.assertRollupMatchesMembers()
+
+        self.other.delete()
+        self.assertEqual(rollup_member_stats()['total_members'], 1)
+
+    def test_rebuild_command_recomputes_from_scratch(self):
+        create_member(branch=self.branch, baptized='Yes')
+        create_member(branch=self.other)
+        # Bulk updates bypass the signals and leave the rollup stale
+        Member.objects.update(branch=self.other)
+        call_command('rebuild_stats_rollup', stdout=StringIO())
+        self.assertRollupMatchesMembers()
+        self.assertEqual(rollup_member_stats(branch=self.other)['total_members'], 2)
+
+    def test_setup_branches_keeps_rollup_current(self):
+        create_member(branch=self.branch)
+        orphan = create_member(branch=None, full_name='Bila Tawi', membership_id='ARU0099')
+        call_command('setup_branches', stdout=StringIO())
+        orphan.refresh_from_db()
+        self.assertIsNotNone(orphan.branch_id)
+        self.assertRollupMatchesMembers()
+
+
+class MembershipIdSequenceTests(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='Arusha', code='aru')
+
+    def test_continues_after_existing_ids_and_reserves_blocks(self):
+        year = date.today().year
+        create_member(branch=self.branch, membership_id=f'ARU{year}0041')
+        member = Member(branch=self.branch)
+        self.assertEqual(member.generate_membership_id(), f'ARU{year}0042')
+        self.assertEqual(
+            MembershipIdSequence.allocate_ids(self.branch, count=3),
+            [f'ARU{year}0043', f'ARU{year}0044', f'ARU{year}0045'],
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(member.generate_membership_id(), f'ARU{year}0046')
+
+    def test_fallback_without_update_returning(self):
+        # MySQL/MariaDB have no UPDATE ... RETURNING; the row-lock path must agree
+        with mock.patch.object(connection, 'vendor', 'mysql'), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                MembershipIdSequence.allocate_ids(self.branch, count=2),
+                [f'ARU{date.today().year}0001', f'ARU{date.today().year}0002'],
+            )
+            self.assertEqual(ChangeSequence.reserve('test', count=5), 1)
+            self.assertEqual(ChangeSequence.reserve('test'), 6)
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE') and 'RETURNING' in q['sql']])
+
+    def test_single_registration_allocates_only_with_a_branch(self):
+        row = {
+            'full_name': 'Mshirika Mpya', 'gender': 'Female', 'age_category': 'Mtu mzima',
+            'address': 'Arusha', 'baptized': 'Yes', 'emergency_name': 'Contact',
+            'emergency_relation': 'Sibling', 'emergency_phone': '0712345678',
+            'membership_type': 'New', 'registration_date': date.today().isoformat(),
+        }
+        response = self.client.post('/api/register/', row, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        # Public registrations have no branch yet, so no ID is allocated
+        self.assertIsNone(response.json()['member']['membership_id'])
+        self.assertFalse(MembershipIdSequence.objects.exists())
+
+        user = User.objects.create_user('secretary', password='x')
+        user.profile.role = 'secretary'
+        user.profile.save()
+        user.profile.branches.add(self.branch)
+        self.client.force_login(user)
+        session = self.client.session
+        session['selected_branch_id'] = self.branch.id
+        session.save()
+        response = self.client.post('/api/register/', row, content_type='application/json')
+        member = Member.objects.get(membership_id=response.json()['member']['membership_id'])
+        self.assertEqual((member.membership_id, member.branch), (f'ARU{date.today().year}0001', self.branch))
+
+
+class MembershipIdConcurrencyTests(TransactionTestCase):
+    """Concurrent registrations must never receive the same membership ID"""
+
+    def test_many_threads_registering_at_once(self):
+        branch = Branch.objects.create(name='Arusha', code='ARU')
+        threads, per_thread = 8, 4
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def register():
+            try:
+                barrier.wait()
+                for i in range(per_thread):
+                    member = Member(
+                        branch=branch, full_name='Concurrent', gender='Female', address='Arusha',
+                        baptized='No', emergency_name='Contact', emergency_relation='Sibling',
+                        emergency_phone='0712345678', membership_type='New',
+                        registration_date=date.today(),
+                    )
+                    member.membership_id = member.generate_membership_id()
+                    member.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=register) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        ids = sorted(Member.objects.values_list('membership_id', flat=True))
+        year = date.today().year
+        self.assertEqual(ids, [f'ARU{year}{n:04d}' for n in range(1, threads * per_thread + 1)])
+
+
+class MemberBulkCreateTests(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='Arusha', code='ARU')
+        self.user = User.objects.create_user('secretary', password='x')
+        self.user.profile.role = 'secretary'
+        self.user.profile.primary_branch = self.branch
+        self.user.profile.save()
+        self.user.profile.branches.add(self.branch)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def row(self, **overrides):
+        data = {
+            'full_name': 'Bulk Member', 'gender': 'Female', 'age_category': 'Mtu mzima',
+            'address': 'Arusha', 'baptized': 'Yes', 'emergency_name': 'Contact',
+            'emergency_relation': 'Sibling', 'emergency_phone': '0712345678',
+            'membership_type': 'New', 'registration_date': date.today().isoformat(),
+        }
+        data.update(overrides)
+        return data
+
+    def test_json_array_with_partial_errors(self):
+        rows = [self.row(), self.row(gender='Unknown'), self.row(full_name='Second')]
+        response = self.client.post('/api/register/bulk/', rows, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        year = date.today().year
+        results = response.data['results']
+        self.assertEqual(results[0]['membership_id'], f'ARU{year}0001')
+        self.assertIn('gender', results[1]['errors'])
+        self.assertEqual(results[2]['membership_id'], f'ARU{year}0002')
+        self.assertEqual(Member.objects.filter(branch=self.branch).count(), 2)
+        self.assertEqual(rollup_member_stats(branch=self.branch)['baptized_members'], 2)
+
+    def test_ndjson_stream(self):
+        body = '\n'.join(json.dumps(self.row(full_name=f'Row {i}')) for i in range(25)) + '\n'
+        response = self.client.post(
+            f'/api/register/bulk/?branch={self.branch.id}', body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 25)
+        self.assertEqual(rollup_member_stats(branch=self.branch)['total_members'], 25)
+        # bulk_create bypasses save(), so the view normalizes phones itself
+        self.assertFalse(Member.objects.filter(emergency_phone_e164__isnull=True).exists())
+
+    def test_malformed_json_is_rejected(self):
+        response = self.client.post('/api/register/bulk/', '[{"full_name": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        body = '{"full_name": "Amina"}\n{oops}\n'
+        response = self.client.post('/api/register/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 2', response.json()['detail'])
+        self.assertFalse(Member.objects.exists())
+
+    def test_rejects_non_numeric_branch(self):
+        response = self.client.post('/api/register/bulk/?branch=abc', [self.row()], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Member.objects.exists())
+
+    def test_requires_register_permission(self):
+        self.user.profile.role = 'member'
+        self.user.profile.save()
+        response = self.client.post('/api/register/bulk/', [self.row()], format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Member.objects.exists())
+
+
+class MemberExportTests(TestCase):
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='Arusha', code='ARU')
+        other = Branch.objects.create(name='Dodoma', code='DOD')
+        create_member(branch=self.branch, full_name='Amina Juma', gender='Female', membership_id='ARU1')
+        create_member(branch=self.branch, full_name='Baraka Juma', gender='Male', membership_id='ARU2')
+        create_member(branch=other, full_name='Daudi Juma', gender='Male', membership_id='DOD1')
+        self.user = User.objects.create_user('secretary', password='x')
+        self.user.profile.role = 'secretary'
+        self.user.profile.save()
+        self.user.profile.branches.add(self.branch)
+        self.client.force_login(self.user)
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/members/export/{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(StringIO(content)))
+
+    def test_streams_filtered_rows_with_role_columns(self):
+        rows = self.export('?search=juma&gender=Male')
+        # Secretaries only get their accessible columns, and only their branch
+        self.assertEqual(rows[0], [
+            'ID', 'Jina Kamili', 'Jinsia', 'Simu', 'Barua Pepe', 'Anuani',
+            'Aina ya Ushirika', 'Tarehe ya Usajili',
+        ])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][:3], ['ARU2', 'Baraka Juma', 'Mwanaume'])
+        self.assertTrue(AuditLog.objects.filter(user=self.user, action='export_data').exists())
+
+    def test_requires_export_permission(self):
+        self.user.profile.role = 'member'
+        self.user.profile.save()
+        self.assertEqual(self.client.get('/api/members/export/').status_code, 403)
+
+
+class MemberIndexUsageTests(TestCase):
+    """Branch-scoped directory and stats queries must hit the composite/partial indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+        for i in range(40):
+            create_member(
+                branch=cls.branch if i % 2 else cls.other,
+                gender=['Male', 'Female'][i % 2],
+                baptized=['Yes', 'No', 'No'][i % 3],
+                membership_class=['Yes', 'No'][i % 2],
+                registration_date=date.today() - timedelta(days=i * 10),
+            )
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_new_member_counters_use_branch_date_index(self):
+        month_start = date.today().replace(day=1)
+        self.assertUsesIndex(
+            self.branch.members.filter(registration_date__gte=month_start),
+            'member_branch_regdate_idx',
+        )
+
+    def test_directory_filters_use_branch_indexes(self):
+        from .views import filter_member_queryset
+        members = Member.objects.filter(branch=self.branch)
+        self.assertUsesIndex(
+            filter_member_queryset(members, {'baptized': 'Yes'}),
+            'member_baptized_recent_idx', 'member_branch_baptized_idx',
+        )
+        # Either the equality index or the one that also serves the date ordering
+        self.assertUsesIndex(
+            filter_member_queryset(members, {'gender': 'Female'}),
+            'member_branch_gender_idx', 'member_branch_regdate_idx',
+        )
+        self.assertUsesIndex(
+            members.filter(membership_class='Yes'),
+            'member_class_done_recent_idx', 'member_branch_class_idx',
+        )
+
+
+class MemberSearchTests(TestCase):
+    """The SQLite FTS5 backend must match icontains semantics and rank results"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('secretary', password='x')
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.juma = create_member(branch=cls.branch, full_name='Juma Hassan', email='juma@example.com')
+        cls.amina = create_member(branch=cls.branch, full_name='Amina Juma', phone='0755123456')
+        cls.other = create_member(branch=cls.branch, full_name='Daudi Mollel', emergency_phone='0799000111')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, term, **params):
+        from .views import filter_member_queryset
+        return list(filter_member_queryset(Member.objects.all(), {'search': term, **params}))
+
+    def test_matches_same_rows_as_icontains(self):
+        from .search import IContainsSearchBackend
+        for term in ['juma', 'JUMA', 'mollel', '0755', '9000', 'example.com', 'ARU', 'zz', 'xyz']:
+            expected = set(IContainsSearchBackend().search(Member.objects.all(), term))
+            self.assertEqual(set(self.search(term)), expected, term)
+
+    def test_ranked_by_relevance(self):
+        # Both fields of Juma Hassan match "juma"; Amina Juma only by name
+        self.assertEqual(self.search('juma'), [self.juma, self.amina])
+        # An explicit ordering still wins over relevance
+        self.assertEqual(self.search('juma', ordering='full_name'), [self.amina, self.juma])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.other.full_name = 'Neema Kimaro'
+        self.other.save()
+        Member.objects.filter(pk=self.amina.pk).update(full_name='Amina Salim')
+        self.juma.delete()
+        self.assertEqual(self.search('kimaro'), [self.other])
+        self.assertEqual(self.search('mollel'), [])
+        self.assertEqual(self.search('juma'), [])
+        self.assertEqual(self.search('salim'), [self.amina])
+
+    def test_cursor_pages_over_ranked_results(self):
+        for i in range(5):
+            create_member(branch=self.branch, full_name=f'Juma {i}')
+        seen = []
+        url = '/api/members/?pagination=cursor&page_size=2&search=juma'
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['full_name'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+
+class MemberPhoneE164Tests(TestCase):
+
+    def test_to_e164(self):
+        from .phones import to_e164
+        for value in ['0712345678', '0712 345-678', '+254712345678', '254712345678', '00254712345678', '(0712) 345 678']:
+            self.assertEqual(to_e164(value), '+254712345678', value)
+        for value in ['', None, '12', 'not a phone', '712345678']:
+            self.assertIsNone(to_e164(value), value)
+
+    def test_save_and_bulk_update_paths(self):
+        member = create_member(phone='0712 345-678', emergency_phone='+254 799 000111')
+        self.assertEqual((member.phone_e164, member.emergency_phone_e164), ('+254712345678', '+254799000111'))
+
+        member.phone = '0700111222'
+        member.save(update_fields=['phone'])
+        member.refresh_from_db()
+        self.assertEqual(member.phone_e164, '+254700111222')
+
+        # QuerySet.update() bypasses save(); the backfill command repairs it
+        Member.objects.filter(pk=member.pk).update(phone='0733444555', phone_e164=None)
+        out = StringIO()
+        call_command('backfill_phone_e164', batch_size=1, stdout=out)
+        self.assertIn('1 members', out.getvalue())
+        member.refresh_from_db()
+        self.assertEqual(member.phone_e164, '+254733444555')
+
+    def test_phone_search_uses_e164_index(self):
+        from .views import filter_member_queryset
+        amina = create_member(full_name='Amina', phone='0712345678')
+        baraka = create_member(full_name='Baraka', phone='', emergency_phone='0712999000')
+        create_member(full_name='Daudi', phone='0799123456', emergency_phone='0799000000')
+
+        def search(term):
+            return set(filter_member_queryset(Member.objects.all(), {'search': term}))
+
+        self.assertEqual(search('0712'), {amina, baraka})
+        self.assertEqual(search('+254 712 345'), {amina})
+        self.assertEqual(search('0712345678'), {amina})
+        self.assertEqual(search('254712999'), {baraka})
+        # Digit-only terms still reach the other search fields
+        kiosk_id = create_member(full_name='Eliya', membership_id='KTR20240042', phone='0755000111')
+        self.assertEqual(search('0042'), {kiosk_id})
+        plan = filter_member_queryset(Member.objects.all(), {'search': '0712'}).explain()
+        self.assertIn('phone_e164', plan)
+        # Index range scans plus the FTS lookup, never a full table scan
+        self.assertNotRegex(plan, r'SCAN membership_member(\s|$)')
+
+
+class MemberSuggestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+        cls.amina = create_member(branch=cls.branch, full_name='Amina Juma', membership_id='ARU1')
+        cls.juma = create_member(branch=cls.branch, full_name='Juma Hassan', membership_id='ARU2')
+        cls.hidden = create_member(branch=cls.other, full_name='Juma Mollel', membership_id='DOD1')
+        cls.user = User.objects.create_user('secretary', password='x')
+        cls.user.profile.role = 'secretary'
+        cls.user.profile.save()
+        cls.user.profile.branches.add(cls.branch)
+
+    def setUp(self):
+        from .typeahead import member_typeahead
+        self.index = member_typeahead
+        self.index.build()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def suggest(self, query):
+        response = self.client.get('/api/members/suggest/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [row['full_name'] for row in response.data['results']]
+
+    def test_prefix_match_filtered_by_branch(self):
+        # Names starting with the query rank first; other branches are hidden
+        self.assertEqual(self.suggest('ju'), ['Juma Hassan', 'Amina Juma'])
+        self.assertEqual(self.suggest('JUMA has'), ['Juma Hassan'])
+        self.assertEqual(self.suggest('aru2'), ['Juma Hassan'])
+        self.assertEqual(self.suggest('mollel'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_member(branch=self.branch, full_name='Neema Kimaro')
+            self.amina.full_name = 'Amina Salim'
+            self.amina.save()
+            self.juma.delete()
+        # Served from memory without a rebuild
+        with self.assertNumQueries(0):
+            suggestions = self.index.suggest('kim', branch_ids={self.branch.id})
+        self.assertEqual([row['full_name'] for row in suggestions], ['Neema Kimaro'])
+        self.assertEqual(self.suggest('juma'), [])
+        self.assertEqual(self.suggest('salim'), ['Amina Salim'])
+
+    def test_stale_index_is_rebuilt_in_the_background(self):
+        self.addCleanup(self.index.build)
+        self.index._built_at -= self.index.max_age + 1
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_load():
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(self.index, '_load', side_effect=slow_load) as load, \
+                mock.patch('membership.typeahead.connection'):
+            # The old index answers while the rebuild runs, and only one rebuild starts
+            with self.assertNumQueries(0):
+                self.assertEqual(self.index.suggest('juma has')[0]['full_name'], 'Juma Hassan')
+                self.assertTrue(started.wait(5))
+                self.index.suggest('amina')
+            # Saves committed during the rebuild are kept for the new index
+            self.index.update(self.juma.id, self.branch.id, 'ARU2', 'Juma Mwakyusa')
+            self.assertEqual(self.index._pending[-1][1][3], 'Juma Mwakyusa')
+            release.set()
+            self.index._refresh_thread.join(5)
+        self.assertEqual(load.call_count, 1)
+        self.assertIsNone(self.index._pending)
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.member = create_member(branch=cls.branch, full_name='Amina Juma')
+        create_member(branch=cls.branch, full_name='Baraka Juma')
+        cls.user = User.objects.create_user('secretary', password='x')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_revalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        # Seconds-resolution Last-Modified cannot see deletions or same-second edits
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date()).status_code, 200)
+
+        repeat = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat['ETag'], etag)
+
+        change()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        return changed
+
+    def test_member_list_edit(self):
+        def edit():
+            self.member.full_name = 'Amina Salim'
+            self.member.save()
+        self.assert_revalidates('/api/members/?search=amina', edit)
+
+    def test_member_list_delete(self):
+        self.assert_revalidates('/api/members/', lambda: Member.objects.filter(full_name='Baraka Juma').delete())
+
+    def test_member_list_etag_changes_with_the_age(self):
+        # age_from_dob moves on the birthday without any row changing
+        self.user.profile.role = 'admin'
+        self.user.profile.save()
+        today = timezone.now()
+        Member.objects.filter(pk=self.member.pk).update(
+            dob=(today + timedelta(days=1)).date().replace(year=today.year - 30)
+        )
+        etag = self.client.get('/api/members/')['ETag']
+        with mock.patch('membership.serializers.timezone.now', return_value=today + timedelta(days=1)):
+            self.assertEqual(self.client.get('/api/members/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cursor_page_runs_no_aggregate(self):
+        url = '/api/members/?pagination=cursor&page_size=1'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        member_queries = [q['sql'] for q in queries.captured_queries if 'membership_member' in q['sql']]
+        self.assertEqual(len(member_queries), 1)
+        self.assertNotRegex(member_queries[0], r'(COUNT|MAX)\(')
+
+        with CaptureQueriesContext(connection) as queries:
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertFalse([q for q in queries.captured_queries if re.search(r'(COUNT|MAX)\(', q['sql'])])
+
+        # The next page is a different page with its own tag
+        next_page = self.client.get(response.data['next'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(next_page.status_code, 200)
+
+    def test_query_string_is_part_of_etag(self):
+        etag = self.client.get('/api/members/')['ETag']
+        self.assertEqual(self.client.get('/api/members/?gender=Female', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_statistics(self):
+        response = self.assert_revalidates('/api/statistics/', lambda: create_member(branch=self.branch))
+        self.assertEqual(response.data['total_members'], 3)
+
+
+class MemberSparseFieldsetTests(TestCase):
+    """?fields= on /api/members/, limited by the role's visible fields"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        for i in range(12):
+            create_member(
+                branch=cls.branch, full_name=f'Mshirika {i}',
+                registration_date=date.today() - timedelta(days=i % 3),
+            )
+        cls.users = {}
+        for role in ['admin', 'secretary', 'member']:
+            user = User.objects.create_user(role, password='x')
+            user.profile.role = role
+            user.profile.save()
+            cls.users[role] = user
+
+    def get(self, role, url):
+        client = APIClient()
+        client.force_authenticate(self.users[role])
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        member_selects = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "membership_member"' in query['sql'] and 'COUNT(' not in query['sql']
+        ]
+        return response, member_selects
+
+    def test_default_fields_follow_role(self):
+        response, selects = self.get('admin', '/api/members/')
+        self.assertIn('emergency_phone', response.data['results'][0])
+        self.assertIn('contact_info', response.data['results'][0])
+
+        response, selects = self.get('member', '/api/members/')
+        self.assertEqual(
+            list(response.data['results'][0]),
+            ['full_name', 'display_name', 'membership_type'],
+        )
+        # Hidden columns are not even loaded
+        self.assertNotIn('"membership_member"."phone"', selects[0])
+        self.assertNotIn('"membership_member"."dob"', selects[0])
+
+    def test_requested_fields_are_intersected_with_role(self):
+        response, selects = self.get('secretary', '/api/members/?fields=full_name,contact_info,dob')
+        self.assertEqual(response.status_code, 200)
+        # dob is hidden from secretaries; contact_info reads phone and email, which are not
+        self.assertEqual(list(response.data['results'][0]), ['full_name', 'contact_info'])
+        self.assertIn('"membership_member"."email"', selects[0])
+        self.assertNotIn('"membership_member"."address"', selects[0])
+
+        response, selects = self.get('member', '/api/members/?fields=phone')
+        self.assertEqual(response.data['results'][0], {})
+
+    def test_unknown_field_is_rejected(self):
+        response, selects = self.get('admin', '/api/members/?fields=full_name,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', str(response.data['fields']))
+
+    def test_cursor_pages_load_their_keys(self):
+        url = '/api/members/?pagination=cursor&page_size=5&fields=full_name&ordering=-registration_date'
+        seen = []
+        while url:
+            response, selects = self.get('member', url)
+            # One page query; the cursor keys come with it rather than per row
+            self.assertEqual(len(selects), 1)
+            seen += [row['full_name'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(sorted(seen), sorted(f'Mshirika {i}' for i in range(12)))
+
+    def test_fields_are_part_of_etag(self):
+        client = APIClient()
+        client.force_authenticate(self.users['admin'])
+        etag = client.get('/api/members/')['ETag']
+        self.users['admin'].profile.role = 'member'
+        self.users['admin'].profile.save()
+        self.assertEqual(client.get('/api/members/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class MemberRowSerializerTests(TestCase):
+    """The .values() fast path must render exactly what MemberSerializer does"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        rng = random.Random(2024)
+        today = date.today()
+        maybe_date = lambda: rng.choice([None, today, today - timedelta(days=rng.randint(1, 30000))])
+        for i in range(150):
+            create_member(
+                branch=cls.branch,
+                full_name=rng.choice(['amina juma', 'BARAKA o\'neil', 'Esther  Wanjiru', 'daudi-mwita', 'Ñandu']),
+                gender=rng.choice([value for value, label in Member.GENDER_CHOICES]),
+                dob=rng.choice([None, today.replace(year=today.year - 30), date(2000, 2, 29),
+                                today - timedelta(days=rng.randint(1, 30000))]),
+                marital_status=rng.choice(['', 'Single', 'Widowed']),
+                phone=rng.choice(['', '0712345678', '+254712345678']),
+                email=rng.choice(['', 'amina@example.com']),
+                salvation_date=maybe_date(),
+                baptized=rng.choice(['Yes', 'No']),
+                baptism_date=maybe_date(),
+                membership_class=rng.choice(['', 'Yes', 'No', 'Not Yet']),
+                previous_church=rng.choice(['', 'AIC']),
+                registration_date=maybe_date() or today,
+                membership_id=None if i % 7 == 0 else f'ARU{i:04d}',
+            )
+
+    def test_matches_model_serializer_on_random_field_sets(self):
+        rng = random.Random(7)
+        all_fields = MemberSerializer.Meta.fields
+        members = list(Member.objects.order_by('id'))
+        for trial in range(40):
+            fields = None if trial == 0 else rng.sample(all_fields, rng.randint(1, len(all_fields)))
+            with self.subTest(fields=fields):
+                expected = MemberSerializer(members, many=True, fields=fields).data
+                fast = MemberRowSerializer(fields)
+                rows = Member.objects.order_by('id').values(*fast.columns)
+                self.assertEqual(
+                    JSONRenderer().render(fast.to_representation(rows)),
+                    JSONRenderer().render(expected),
+                )
+
+    def test_list_api_uses_identical_output(self):
+        user = User.objects.create_user('pastor', password='x')
+        user.profile.role = 'pastor'
+        user.profile.save()
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/members/?page_size=100&ordering=membership_id')
+        members = Member.objects.order_by('membership_id')[:100]
+        self.assertEqual(
+            json.loads(response.content)['results'],
+            json.loads(JSONRenderer().render(MemberSerializer(members, many=True).data)),
+        )
+
+
+class MemberChangeFeedTests(TestCase):
+    """/api/members/changes/ returns only what changed since a change_seq"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+        cls.user = User.objects.create_user('secretary', password='x')
+        cls.user.profile.role = 'secretary'
+        cls.user.profile.save()
+        cls.user.profile.branches.add(cls.branch)
+        cls.admin = User.objects.create_user('admin', password='x')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def changes(self, since=0, **params):
+        response = self.client.get('/api/members/changes/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_saves_bump_change_seq(self):
+        first = create_member(branch=self.branch, full_name='Amina Juma')
+        second = create_member(branch=self.branch, full_name='Baraka Juma')
+        self.assertLess(first.change_seq, second.change_seq)
+        first.full_name = 'Amina Salim'
+        first.save(update_fields=['full_name'])
+        first.refresh_from_db()
+        self.assertGreater(first.change_seq, second.change_seq)
+
+    def test_delta_contains_only_new_changes(self):
+        amina = create_member(branch=self.branch, full_name='Amina Juma')
+        create_member(branch=self.branch, full_name='Baraka Juma')
+        create_member(branch=self.other, full_name='Daudi Mwita')
+
+        data = self.changes()
+        self.assertEqual({row['full_name'] for row in data['changed']}, {'Amina Juma', 'Baraka Juma'})
+        self.assertFalse(data['has_more'])
+        # Fields follow the role (secretaries do not see dob)
+        self.assertNotIn('dob', data['changed'][0])
+
+        since = data['next_since']
+        self.assertEqual(self.changes(since)['changed'], [])
+
+        amina.full_name = 'Amina Salim'
+        amina.save()
+        Member.objects.filter(full_name='Baraka Juma').delete()
+        data = self.changes(since)
+        self.assertEqual([row['full_name'] for row in data['changed']], ['Amina Salim'])
+        self.assertEqual(len(data['deleted']), 1)
+
+    def test_branch_moves_leave_tombstone_in_old_branch(self):
+        member = create_member(branch=self.branch, full_name='Amina Juma')
+        since = self.changes()['next_since']
+        member.branch = self.other
+        member.save()
+
+        data = self.changes(since)
+        self.assertEqual(data['changed'], [])
+        self.assertEqual([row['id'] for row in data['deleted']], [member.id])
+
+        # Clients syncing every branch only see the updated row
+        self.client.force_authenticate(self.admin)
+        data = self.changes(since)
+        self.assertEqual([row['id'] for row in data['changed']], [member.id])
+        self.assertEqual(data['deleted'], [])
+
+    def test_pages_through_changes_and_deletions_in_order(self):
+        members = [create_member(branch=self.branch, full_name=f'Mshirika {i}') for i in range(7)]
+        deleted_id = members[2].id
+        members[2].delete()
+        members[4].save()
+        since, seen_changed, seen_deleted = 0, {}, set()
+        while True:
+            data = self.changes(since, limit=3, branch=self.branch.id)
+            seqs = [row['change_seq'] for row in data['changed'] + data['deleted']]
+            self.assertTrue(all(seq > since for seq in seqs))
+            seen_changed.update({row['id']: row['change_seq'] for row in data['changed']})
+            seen_deleted.update(row['id'] for row in data['deleted'])
+            since = data['next_since']
+            if not data['has_more']:
+                break
+        self.assertEqual(set(seen_changed), {member.id for i, member in enumerate(members) if i != 2})
+        self.assertEqual(seen_deleted, {deleted_id})
+
+    def test_pages_across_branch_logs(self):
+        self.client.force_authenticate(self.admin)
+        expected = set()
+        for branch in (None, self.branch, self.other):
+            expected.update(create_member(branch=branch).id for i in range(3))
+        since, seen = 0, []
+        while True:
+            data = self.changes(since, limit=2)
+            seen += [row['id'] for row in data['changed']]
+            since = data['next_since']
+            if not data['has_more']:
+                break
+        self.assertEqual(sorted(seen), sorted(expected))
+        self.assertEqual(
+            since,
+            ','.join(f'{branch}:{ChangeSequence.current(ChangeSequence.member_log(branch))[0]}'
+                     for branch in (0, self.branch.id, self.other.id)),
+        )
+        self.assertEqual(self.changes(since)['changed'], [])
+
+        member = create_member(branch=self.other)
+        self.assertEqual([row['id'] for row in self.changes(since)['changed']], [member.id])
+        # A plain number only makes sense for one branch log
+        self.assertEqual(self.client.get('/api/members/changes/', {'since': 5}).status_code, 400)
+
+    def test_branches_write_to_their_own_logs(self):
+        create_member(branch=self.branch)
+        with CaptureQueriesContext(connection) as queries:
+            create_member(branch=self.other)
+        self.assertFalse([
+            q for q in queries.captured_queries
+            if 'membership_changesequence' in q['sql'] and f"'members:{self.branch.id}'" in q['sql']
+        ])
+        self.assertEqual(ChangeSequence.current(ChangeSequence.member_log(self.branch.id))[0], 1)
+        self.assertEqual(ChangeSequence.current(ChangeSequence.member_log(self.other.id))[0], 1)
+
+    def test_feed_reads_one_snapshot(self):
+        # A change committed between the member and tombstone queries must
+        # not be skipped by next_since
+        gone = create_member(branch=self.branch)
+        since = self.changes(branch=self.branch.id)['next_since']
+        late = create_member(branch=self.branch)
+        gone_id = gone.id
+        gone.delete()
+        with CaptureQueriesContext(connection) as queries:
+            data = self.changes(since, branch=self.branch.id)
+        self.assertEqual([row['id'] for row in data['changed']], [late.id])
+        self.assertEqual([row['id'] for row in data['deleted']], [gone_id])
+        self.assertEqual(data['next_since'], ChangeSequence.current(ChangeSequence.member_log(self.branch.id))[0])
+        sqls = [q['sql'] for q in queries.captured_queries]
+        first = next(i for i, sql in enumerate(sqls) if 'membership_changesequence' in sql)
+        last = max(i for i, sql in enumerate(sqls) if 'membership_membertombstone' in sql)
+        self.assertTrue(any(sql.startswith('SAVEPOINT') for sql in sqls[:first]))
+        self.assertTrue(any(sql.startswith('RELEASE SAVEPOINT') for sql in sqls[last:]))
+
+    def test_bulk_registration_reserves_sequence_block(self):
+        create_member(branch=self.branch)
+        since = self.changes()['next_since']
+        row = {
+            'full_name': 'Bulk Row', 'gender': 'Male', 'age_category': 'Mtu mzima', 'address': 'Arusha',
+            'baptized': 'No', 'emergency_name': 'Mama', 'emergency_relation': 'Mama',
+            'emergency_phone': '0712345678', 'membership_type': 'New', 'registration_date': str(date.today()),
+        }
+        response = self.client.post(f'/api/register/bulk/?branch={self.branch.id}', [row, row], format='json')
+        self.assertEqual(response.status_code, 201)
+        seqs = [row['change_seq'] for row in self.changes(since)['changed']]
+        self.assertEqual(len(set(seqs)), 2)
+
+    def test_access_and_pruning(self):
+        response = self.client.get('/api/members/changes/', {'branch': self.other.id})
+        self.assertEqual(response.status_code, 403)
+
+        member = create_member(branch=self.branch)
+        since = self.changes()['next_since']
+        member.delete()
+        create_member(branch=self.branch)
+        MemberTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=365))
+        call_command('prune_member_tombstones', days=90, stdout=StringIO())
+        self.assertFalse(MemberTombstone.objects.exists())
+
+        response = self.client.get('/api/members/changes/', {'since': since})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.data['reset'])
+        self.assertEqual(len(self.changes(0)['changed']), 1)
+
+
+class AttendanceMarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+        cls.user = User.objects.create_user('secretary', password='x')
+        cls.user.profile.role = 'secretary'
+        cls.user.profile.save()
+        cls.user.profile.branches.add(cls.branch)
+        cls.session = AttendanceSession.objects.create(
+            branch=cls.branch, title='Ibada ya Jumapili', service_type='sunday_service',
+            date=date.today(), start_time='09:00', created_by=cls.user,
+        )
+        cls.members = [
+            create_member(branch=cls.branch, full_name=f'Mshirika {i}', membership_id=f'ARU{i:04d}')
+            for i in range(5)
+        ]
+        cls.outsider = create_member(branch=cls.other, membership_id='DOD0001')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/attendance/{self.session.id}/mark/'
+
+    def test_marks_by_pk_and_membership_id(self):
+        body = [self.members[0].id, 'ARU0001', 'ARU0002', 'DOD0001', 'HAKUNA', 99999]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, body, format='json')
+        self.assertEqual(response.status_code, 200)
+        # One lookup for all members, one set-based insert
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(len([q for q in sql if 'FROM "membership_member"' in q]), 1)
+        self.assertEqual(len([q for q in sql if q.startswith('INSERT') and '"membership_attendancerecord"' in q]), 1)
+        self.assertEqual(response.data['marked'], 3)
+        self.assertEqual(response.data['already_marked'], 0)
+        # Members of other branches are not found in this session's branch
+        self.assertEqual(response.data['not_found'], [99999, 'DOD0001', 'HAKUNA'])
+
+        response = self.client.post(self.url, {'members': ['ARU0002', 'ARU0003'], 'notes': 'Mlango wa pili'}, format='json')
+        self.assertEqual(response.data['marked'], 1)
+        self.assertEqual(response.data['already_marked'], 1)
+        self.assertEqual(AttendanceRecord.objects.filter(session=self.session).count(), 4)
+        record = AttendanceRecord.objects.get(member=self.members[3])
+        self.assertEqual((record.marked_by, record.notes), (self.user, 'Mlango wa pili'))
+        self.assertLess(abs(timezone.now() - record.marked_at), timedelta(minutes=1))
+        self.assertFalse(AttendanceSyncBatch.objects.exists())
+
+    def test_mark_present_returns_only_the_rows_it_inserted(self):
+        # e.g. a kiosk scan stored between the request's lookup and its insert
+        AttendanceRecord.objects.create(session=self.session, member=self.members[1], marked_by=self.user)
+        member_ids = {self.members[0].id, self.members[1].id}
+        self.assertEqual(
+            AttendanceRecord.mark_present(self.session, member_ids, self.user, batch_size=1),
+            {self.members[0].id},
+        )
+        # Without INSERT ... RETURNING (MySQL/MariaDB) the locked pre-read agrees
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            self.assertEqual(
+                AttendanceRecord.mark_present(self.session, member_ids | {self.members[2].id}, self.user),
+                {self.members[2].id},
+            )
+        self.assertEqual(AttendanceRecord.objects.filter(session=self.session).count(), 3)
+
+    def test_requires_permission_and_branch_access(self):
+        self.user.profile.role = 'member'
+        self.user.profile.save()
+        self.assertEqual(self.client.post(self.url, ['ARU0001'], format='json').status_code, 403)
+
+        self.user.profile.role = 'secretary'
+        self.user.profile.save()
+        self.user.profile.branches.remove(self.branch)
+        self.assertEqual(self.client.post(self.url, ['ARU0001'], format='json').status_code, 404)
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    def test_rejects_empty_and_closed_sessions(self):
+        self.assertEqual(self.client.post(self.url, [], format='json').status_code, 400)
+        AttendanceSession.objects.filter(pk=self.session.pk).update(is_active=False)
+        self.assertEqual(self.client.post(self.url, ['ARU0001'], format='json').status_code, 400)
+
+
+class KioskCheckInTests(SharedCacheMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+        cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+        cls.user = User.objects.create_user('kiosk', password='x')
+        cls.user.profile.role = 'secretary'
+        cls.user.profile.save()
+        cls.user.profile.branches.add(cls.branch)
+        cls.session = AttendanceSession.objects.create(
+            branch=cls.branch, title='Ibada ya Jumapili', service_type='sunday_service',
+            date=date.today(), start_time='09:00', created_by=cls.user,
+        )
+        cls.members = [
+            create_member(branch=cls.branch, full_name=f'Mshirika {i}', membership_id=f'ARU{i:04d}')
+            for i in range(300)
+        ]
+        create_member(branch=cls.other, membership_id='DOD0001')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/attendance/{self.session.id}/checkin/'
+        # Flushed explicitly so the tests control when rows are written
+        self.writer = kiosk.AttendanceWriter(AttendanceRecord, max_batch_size=1000, flush_interval=3600, ignore_conflicts=True)
+        patcher = mock.patch('membership.kiosk.attendance_writer', self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        kiosk.roster_cache.clear()
+        self.addCleanup(kiosk.roster_cache.clear)
+
+    def scan(self, membership_id):
+        return self.client.post(self.url, {'membership_id': membership_id}, format='json')
+
+    def test_repeat_scans_are_answered_from_memory(self):
+        response = self.scan('aru0001 ')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'status': kiosk.CHECKED_IN, 'full_name': 'Mshirika 1'})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.scan('ARU0001')
+        self.assertEqual(response.data['status'], kiosk.ALREADY_CHECKED_IN)
+        self.assertFalse([q for q in queries.captured_queries if 'membership_' in q['sql']])
+
+        self.assertFalse(AttendanceRecord.objects.exists())
+        self.assertEqual(kiosk.flush_checkins(), 1)
+        record = AttendanceRecord.objects.get()
+        self.assertEqual((record.member_id, record.marked_by), (self.members[1].id, self.user))
+
+    def test_unknown_ids_and_late_registrations(self):
+        self.assertEqual(self.scan('ARU0002').status_code, 200)
+        response = self.scan('DOD0001')
+        self.assertEqual((response.status_code, response.data['status']), (404, kiosk.NOT_FOUND))
+        self.assertEqual(self.scan('').status_code, 400)
+
+        # Registered after the roster was loaded
+        late = create_member(branch=self.branch, full_name='Mgeni Mpya', membership_id='ARU9999')
+        response = self.scan('ARU9999')
+        self.assertEqual(response.data, {'status': kiosk.CHECKED_IN, 'full_name': 'Mgeni Mpya'})
+        self.writer.flush()
+        self.assertTrue(AttendanceRecord.objects.filter(member=late).exists())
+
+    def test_roster_reload_keeps_existing_check_ins(self):
+        AttendanceRecord.objects.create(session=self.session, member=self.members[5], marked_by=self.user)
+        self.assertEqual(self.scan('ARU0005').data['status'], kiosk.ALREADY_CHECKED_IN)
+        self.scan('ARU0006')
+
+        # A stale roster is reloaded without forgetting the queued check-in
+        kiosk.roster_cache.get(self.session.id).loaded_at -= kiosk.roster_cache.max_age + 1
+        self.assertEqual(self.scan('ARU0006').data['status'], kiosk.ALREADY_CHECKED_IN)
+        self.writer.flush()
+        self.assertEqual(AttendanceRecord.objects.filter(session=self.session).count(), 2)
+
+    def test_closed_sessions_and_removed_members(self):
+        self.assertEqual(self.scan('ARU0010').status_code, 200)
+        moved = self.members[11]
+        moved.branch = self.other
+        moved.save()
+        self.assertEqual(self.scan('ARU0011').data['status'], kiosk.NOT_FOUND)
+
+        # Deleted between the scan and the flush: the row is dropped, later rows still written
+        self.scan('ARU0012')
+        self.members[12].delete()
+        self.scan('ARU0013')
+        with self.assertLogs('membership.kiosk', 'WARNING'):
+            self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(
+            set(AttendanceRecord.objects.values_list('member_id', flat=True)),
+            {self.members[10].id, self.members[13].id},
+        )
+
+        # Closed after the roster was cached
+        AttendanceSession.objects.filter(pk=self.session.pk).update(is_active=False)
+        self.assertEqual(self.scan('ARU0014').status_code, 400)
+        self.assertEqual(self.scan('ARU0015').status_code, 400)
+        self.assertEqual(self.writer.flush(), 0)
+
+    def test_requires_permission_access_and_open_session(self):
+        self.user.profile.role = 'member'
+        self.user.profile.save()
+        self.assertEqual(self.scan('ARU0001').status_code, 403)
+        self.user.profile.role = 'secretary'
+        self.user.profile.save()
+
+        self.assertEqual(self.client.post('/api/attendance/99999/checkin/', {'membership_id': 'ARU0001'}, format='json').status_code, 404)
+        AttendanceSession.objects.filter(pk=self.session.pk).update(is_active=False)
+        self.assertEqual(self.scan('ARU0001').status_code, 400)
+        self.assertEqual(self.writer.flush(), 0)
+
+    def test_other_branch_roster_is_not_loaded(self):
+        other_session = AttendanceSession.objects.create(
+            branch=self.other, title='Ibada ya Jumapili', service_type='sunday_service',
+            date=date.today(), start_time='09:00', created_by=self.user,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'/api/attendance/{other_session.id}/checkin/', {'membership_id': 'DOD0001'}, format='json'
+            )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse([q for q in queries.captured_queries if 'membership_member' in q['sql']])
+        self.assertNotIn(other_session.id, kiosk.roster_cache._rosters)
+
+    def test_batch_flushes_and_rows_land(self):
+        """Many scans with repeats queue one row per member and a flush writes them all"""
+        ids = [f'ARU{i % 25:04d}' for i in range(60)]
+        statuses = [self.scan(membership_id).data['status'] for membership_id in ids]
+        self.assertEqual(statuses.count(kiosk.CHECKED_IN), 25)
+        self.assertEqual(len(self.writer), 25)
+        self.assertFalse(AttendanceRecord.objects.exists())
+        self.assertEqual(self.writer.flush(), 25)
+        self.assertEqual(
+            set(AttendanceRecord.objects.filter(session=self.session).values_list('member_id', flat=True)),
+            {member.id for member in self.members[:25]},
+        )
+
+
+def create_sync_fixture(cls):
+    """Branches, an attendance secretary, a session and members for sync tests"""
+    cls.branch = Branch.objects.create(name='Arusha', code='ARU')
+    cls.other = Branch.objects.create(name='Dodoma', code='DOD')
+    cls.user = User.objects.create_user('secretary', password='x')
+    cls.user.profile.role = 'secretary'
+    cls.user.profile.save()
+    cls.user.profile.branches.add(cls.branch)
+    cls.session = AttendanceSession.objects.create(
+        branch=cls.branch, title='Ibada ya Jumapili', service_type='sunday_service',
+        date=date.today(), start_time='09:00', created_by=cls.user,
+    )
+    cls.other_session = AttendanceSession.objects.create(
+        branch=cls.other, title='Ibada ya Jumapili', service_type='sunday_service',
+        date=date.today(), start_time='09:00', created_by=cls.user,
+    )
+    cls.members = [
+        create_member(branch=cls.branch, full_name=f'Mshirika {i}', membership_id=f'ARU{i:04d}')
+        for i in range(40)
+    ]
+    cls.outsider = create_member(branch=cls.other, membership_id='DOD0001')
+
+
+class AttendanceOfflineSyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_sync_fixture(cls)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, records, batch_id=None, **extra):
+        body = {'batch_id': str(batch_id or uuid.uuid4()), 'device_id': 'simu-1', 'records': records, **extra}
+        return self.client.post('/api/attendance/sync/', body, format='json')
+
+    def record(self, member, minutes=0, session=None):
+        marked_at = timezone.now().replace(microsecond=0) - timedelta(hours=1) + timedelta(minutes=minutes)
+        return {'session': (session or self.session).id, 'member': member.id, 'marked_at': marked_at.isoformat()}
+
+    def test_roster_snapshot(self):
+        AttendanceRecord.objects.create(session=self.session, member=self.members[3], marked_by=self.user)
+        response = self.client.get(f'/api/attendance/{self.session.id}/roster/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['session']['branch_id'], self.branch.id)
+        self.assertEqual(response.data['fields'], ['id', 'membership_id', 'full_name'])
+        self.assertEqual(
+            [tuple(row) for row in response.data['members']],
+            [(m.id, m.membership_id, m.full_name) for m in self.members],
+        )
+        self.assertEqual(response.data['checked_in'], [self.members[3].id])
+        self.assertEqual(response.data['since'], ChangeSequence.current(ChangeSequence.member_log(self.branch.id))[0])
+
+        # The delta feed picks up from the snapshot
+        self.members[0].full_name = 'Jina Jipya'
+        self.members[0].save()
+        changes = self.client.get('/api/members/changes/', {'branch': self.branch.id, 'since': response.data['since']})
+        self.assertEqual([m['id'] for m in changes.data['changed']], [self.members[0].id])
+
+        self.assertEqual(self.client.get(f'/api/attendance/{self.other_session.id}/roster/').status_code, 404)
+
+    def test_applies_batch_and_reports_results(self):
+        AttendanceRecord.objects.create(session=self.session, member=self.members[0], marked_by=self.user)
+        records = [
+            self.record(self.members[0]),                          # marked online already
+            self.record(self.members[1], minutes=5),
+            self.record(self.members[1], minutes=2),               # scanned twice: earliest kept
+            {**self.record(self.members[2]), 'notes': 'Mgeni'},
+            self.record(self.outsider),                            # not in the session's branch
+            self.record(self.outsider, session=self.other_session),  # branch not accessible
+            {'session': self.session.id, 'member': 'ARU0003'},
+            {**self.record(self.members[4]), 'marked_at': 'jana'},
+        ]
+        response = self.upload(records)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {key: response.data[key] for key in ('received', 'created', 'duplicates', 'replayed')},
+            {'received': 8, 'created': 2, 'duplicates': 2, 'replayed': False},
+        )
+        self.assertEqual(response.data['rejected'], [
+            {'index': 4, 'reason': 'member'},
+            {'index': 5, 'reason': 'session'},
+            {'index': 6, 'reason': 'invalid'},
+            {'index': 7, 'reason': 'invalid'},
+        ])
+
+        record = AttendanceRecord.objects.get(member=self.members[1])
+        self.assertEqual(record.client_marked_at.isoformat(), records[2]['marked_at'])
+        self.assertEqual(record.sync_batch.device_id, 'simu-1')
+        self.assertEqual(AttendanceRecord.objects.get(member=self.members[2]).notes, 'Mgeni')
+        self.assertIsNone(AttendanceRecord.objects.get(member=self.members[0]).sync_batch)
+
+    def test_retried_batch_is_not_applied_twice(self):
+        batch_id = uuid.uuid4()
+        first = self.upload([self.record(self.members[5])], batch_id=batch_id)
+        # The retry carries more records, but the stored result is returned as is
+        retry = self.upload([self.record(self.members[5]), self.record(self.members[6])], batch_id=batch_id)
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.data['replayed'])
+        self.assertEqual({**retry.data, 'replayed': False}, first.data)
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+        self.assertEqual(AttendanceSyncBatch.objects.count(), 1)
+
+        other = User.objects.create_user('mwingine', password='x')
+        other.profile.role = 'secretary'
+        other.profile.save()
+        other.profile.branches.add(self.branch)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.upload([self.record(self.members[5])], batch_id=batch_id).status_code, 409)
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.upload([self.record(self.members[0])], batch_id='si-uuid').status_code, 400)
+        self.assertEqual(self.upload([]).status_code, 400)
+
+        # Closed sessions still accept records captured while they were open
+        AttendanceSession.objects.filter(pk=self.session.pk).update(is_active=False)
+        self.assertEqual(self.upload([self.record(self.members[0])]).data['created'], 1)
+
+        self.user.profile.role = 'member'
+        self.user.profile.save()
+        self.assertEqual(self.upload([self.record(self.members[1])]).status_code, 403)
+        self.assertEqual(self.client.get(f'/api/attendance/{self.session.id}/roster/').status_code, 403)
+
+
+class AttendanceSyncHarnessTests(TransactionTestCase):
+    """Many devices uploading overlapping batches at once, some retrying"""
+
+    def test_devices_syncing_at_once(self):
+        create_sync_fixture(self)
+        devices, per_device = 8, 15
+        rng = random.Random(25)
+        # Overlapping captures: the same member is often scanned on several devices
+        uploads = [
+            (uuid.uuid4(), [
+                {'session': self.session.id, 'member': member.id, 'marked_at': timezone.now().isoformat()}
+                for member in rng.sample(self.members, per_device)
+            ])
+            for _ in range(devices)
+        ]
+        barrier = threading.Barrier(devices * 2)
+        results, errors = [], []
+
+        def device(batch_id, records):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                # Each device sends its batch twice, as if the first response was lost
+                for _ in range(2):
+                    response = client.post('/api/attendance/sync/', {
+                        'batch_id': str(batch_id), 'records': records,
+                    }, format='json')
+                    results.append((batch_id, response.status_code, response.data))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=device, args=upload)
+            for upload in uploads for _ in range(2)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual({status_code for batch_id, status_code, data in results}, {200})
+        expected = {member['member'] for batch_id, records in uploads for member in records}
+        stored = list(AttendanceRecord.objects.filter(session=self.session).values_list('member_id', flat=True))
+        self.assertEqual(sorted(stored), sorted(expected))
+        self.assertEqual(AttendanceSyncBatch.objects.count(), devices)
+
+        # Every upload of a batch reported the same counts, and each batch was applied once
+        by_batch = {}
+        for batch_id, status_code, data in results:
+            by_batch.setdefault(batch_id, set()).add((data['created'], data['duplicates']))
+        self.assertTrue(all(len(counts) == 1 for counts in by_batch.values()))
+        self.assertEqual(sum(next(iter(counts))[0] for counts in by_batch.values()), len(expected))
+        self.assertEqual(sum(not data['replayed'] for batch_id, status_code, data in results), devices)
@@ -0,0 +1,222 @@
+"""
+In-process typeahead index for member name suggestions
+
+Each worker keeps a sorted list of tokens (the interned, lower-cased words of
+every member's name plus the membership ID) with a parallel array of member
+IDs, and answers prefix queries with ``bisect``. The index is built on first
+use, then kept current by Member save/delete signals (after commit). Saves
+handled by other workers never reach this process, so once the index is
+older than ``MEMBER_TYPEAHEAD_MAX_AGE`` seconds a background thread rebuilds
+it while the old one keeps answering.
+"""
+import heapq
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Member
+
+
+def tokenize(text):
+    return [sys.intern(token) for token in text.casefold().split()]
+
+
+class MemberTypeaheadIndex:
+    """Prefix index over (branch_id, membership_id, full_name) of every member"""
+
+    # Single characters match a large share of all names
+    min_query_length = 2
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._tokens = []
+        self._member_ids = array('q')
+        self._built_at = None
+        self._build_lock = threading.Lock()
+        self._refresh_thread = None
+        # Updates made while a rebuild reads the table, replayed onto its result
+        self._pending = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def entry_tokens(membership_id, full_name):
+        tokens = set(tokenize(full_name))
+        if membership_id:
+            tokens.add(membership_id.casefold())
+        return tokens
+
+    def build(self):
+        """Load every member from the database, replacing the current index"""
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        with self._lock:
+            self._pending = []
+        try:
+            self._load()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _load(self):
+        entries = {}
+        pairs = []
+        rows = Member.objects.order_by().values_list('id', 'branch_id', 'membership_id', 'full_name')
+        for member_id, branch_id, membership_id, full_name in rows.iterator(chunk_size=5000):
+            entries[member_id] = (branch_id, membership_id, full_name, full_name.casefold())
+            pairs.extend((token, member_id) for token in self.entry_tokens(membership_id, full_name))
+        pairs.sort()
+        tokens = [token for token, member_id in pairs]
+        member_ids = array('q', (member_id for token, member_id in pairs))
+        del pairs
+        with self._lock:
+            self._entries = entries
+            self._tokens = tokens
+            self._member_ids = member_ids
+            self._built_at = time.monotonic()
+            pending, self._pending = self._pending, None
+            for method, args in pending:
+                method(*args)
+
+    def ensure_current(self):
+        """Build the index on first use; refresh a stale one in the background"""
+        if self._built_at is None:
+            with self._build_lock:
+                # Concurrent first requests wait for a single build
+                if self._built_at is None:
+                    self._build()
+        elif self.is_stale():
+            with self._lock:
+                if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                    return
+                self._refresh_thread = threading.Thread(
+                    target=self._refresh, name='MemberTypeaheadRefresh', daemon=True
+                )
+                self._refresh_thread.start()
+
+    def _refresh(self):
+        try:
+            self.build()
+        finally:
+            # The thread never sees request_finished, so close its connection
+            connection.close()
+
+    def is_stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.max_age
+
+    def update(self, member_id, branch_id, membership_id, full_name):
+        """Add or replace one member (no-op until the index is built)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((self.update, (member_id, branch_id, membership_id, full_name)))
+            if self._built_at is None:
+                return
+            self._remove_tokens(member_id)
+            self._entries[member_id] = (branch_id, membership_id, full_name, full_name.casefold())
+            for token in self.entry_tokens(membership_id, full_name):
+                position = self._position(token, member_id)
+                self._tokens.insert(position, token)
+                self._member_ids.insert(position, member_id)
+
+    def update_members(self, members):
+        """Add or replace Member instances, e.g. after bulk_create"""
+        for member in members:
+            self.update(member.pk, member.branch_id, member.membership_id, member.full_name)
+
+    def remove(self, member_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((self.remove, (member_id,)))
+            if self._built_at is None:
+                return
+            self._remove_tokens(member_id)
+            self._entries.pop(member_id, None)
+
+    def _remove_tokens(self, member_id):
+        entry = self._entries.get(member_id)
+        if entry is None:
+            return
+        branch_id, membership_id, full_name, folded_name = entry
+        for token in self.entry_tokens(membership_id, full_name):
+            position = self._position(token, member_id)
+            if (position < len(self._tokens) and self._tokens[position] == token
+                    and self._member_ids[position] == member_id):
+                del self._tokens[position]
+                del self._member_ids[position]
+
+    def _position(self, token, member_id):
+        """Index of (token, member_id) in the (token, member ID) order"""
+        low = bisect_left(self._tokens, token)
+        high = bisect_right(self._tokens, token, low)
+        return bisect_left(self._member_ids, member_id, low, high)
+
+    def _prefix_matches(self, prefix):
+        """Member IDs with a token starting with ``prefix``"""
+        low = bisect_left(self._tokens, prefix)
+        # Every token with this prefix sorts below prefix + U+10FFFF
+        high = bisect_left(self._tokens, prefix + '\U0010ffff', low)
+        return set(self._member_ids[low:high])
+
+    def suggest(self, query, branch_ids=None, limit=10):
+        """
+        Members whose name (or membership ID) has a word starting with every
+        word of ``query``; names starting with the query come first.
+        ``branch_ids=None`` means no branch restriction.
+        """
+        terms = tokenize(query)
+        if not terms or len(query.strip()) < self.min_query_length:
+            return []
+        self.ensure_current()
+
+        with self._lock:
+            # Scan the most selective (longest) term, then check the others
+            terms.sort(key=len, reverse=True)
+            candidates = self._prefix_matches(terms[0])
+            for term in terms[1:]:
+                if not candidates:
+                    break
+                candidates &= self._prefix_matches(term)
+            entries = self._entries
+            results = [
+                (member_id, entries[member_id]) for member_id in candidates
+                if branch_ids is None or entries[member_id][0] in branch_ids
+            ]
+
+        folded_query = query.strip().casefold()
+        best = heapq.nsmallest(limit, results, key=lambda row: (
+            not row[1][3].startswith(folded_query), row[1][3], row[0]
+        ))
+        return [
+            {'id': member_id, 'branch_id': branch_id, 'membership_id': membership_id, 'full_name': full_name}
+            for member_id, (branch_id, membership_id, full_name, folded_name) in best
+        ]
+
+
+member_typeahead = MemberTypeaheadIndex(
+    max_age=getattr(settings, 'MEMBER_TYPEAHEAD_MAX_AGE', 300)
+)
+
+
+@receiver(post_save, sender=Member)
+def update_typeahead_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: member_typeahead.update_members([instance]))
+
+
+@receiver(post_delete, sender=Member)
+def update_typeahead_on_delete(sender, instance, **kwargs):
+    member_id = instance.pk
+    transaction.on_commit(lambda: member_typeahead.remove(member_id))
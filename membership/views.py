@@ -2,32 +2,45 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import transaction
 from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import IsAuthenticated
+import csv
 import logging
-from .models import Member, Branch, News
-from .serializers import MemberSerializer
+import uuid
+from . import changes, sync
+from .conditional import content_validators, queryset_validators
+from .kiosk import NOT_FOUND, SESSION_CLOSED, roster_cache
+from .models import (
+    Member, Branch, News, MembershipIdSequence, BranchStatsRollup, ChangeSequence, MemberTombstone,
+    AttendanceSession, AttendanceRecord,
+)
+from .pagination import MemberPagination, MemberKeysetPagination
+from .parsers import NDJSONParser
+from .search import RANK_ANNOTATION, search_members
+from .serializers import MemberSerializer, MemberRowSerializer
+from .typeahead import member_typeahead
+from .stats import (
+    rollup_member_stats, annotate_branch_stats, apply_rollup_changes, member_rollup_values
+)
+from church_portal.parsers import OrjsonParser
 from authentication.views import can_view_directory, can_register_members
 from authentication.utils import log_user_action, filter_member_fields
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Custom pagination class
-class MemberPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
 def home_page(request):
     """Home page with branch-aware statistics and features"""
-    from authentication.branch_context import BranchContextManager, get_branch_scoped_stats
+    from authentication.branch_context import (
+        BranchContextManager, get_branch_scoped_stats, get_aggregated_overview_stats
+    )
     
     # Handle branch reset (clear context)
     if request.GET.get('reset') == '1':
@@ -87,38 +100,22 @@ def home_page(request):
         }
         
         try:
-            from django.db.models import Count
-            from datetime import datetime, timedelta
-            
-            # Get current month for filtering
-            current_month = datetime.now().replace(day=1)
-            
             # Get user's accessible branches if authenticated
             if request.user.is_authenticated and hasattr(request.user, 'profile'):
-                profile = request.user.profile
-                context['user_branches'] = BranchContextManager.get_user_branch_options(request.user)
-                
-                if profile.is_system_admin:
-                    members_queryset = Member.objects.all()
-                else:
-                    members_queryset = profile.get_accessible_members()
+                # Per-branch counters come from one annotated GROUP BY query
+                context['user_branches'] = list(annotate_branch_stats(
+                    BranchContextManager.get_user_branch_options(request.user)
+                ))
                 
                 # Calculate aggregated overview statistics across all accessible branches
-                context['stats'] = {
-                    'total_members': members_queryset.count(),
-                    'new_members_this_month': members_queryset.filter(registration_date__gte=current_month).count(),
-                    'baptized_members': members_queryset.filter(baptized='Yes').count(),
-                    'membership_class_completed': members_queryset.filter(membership_class='Yes').count(),
-                }
+                context['stats'] = get_aggregated_overview_stats(request)
                 
                 # Store as aggregated stats for consistency
                 context['aggregated_stats'] = context['stats']
                 
                 # Calculate branch-specific statistics for multi-branch view
-                branches_with_stats = []
-                for branch in context['user_branches']:
-                    branch_members = Member.objects.filter(branch=branch)
-                    branch_data = {
+                context['branches_with_stats'] = [
+                    {
                         'id': branch.id,
                         'name': branch.name,
                         'code': branch.code,
@@ -127,14 +124,12 @@ def home_page(request):
                         'email': branch.email,
                         'pastor_name': branch.pastor_name,
                         'is_active': branch.is_active,
-                        'total_members': branch_members.count(),
-                        'new_this_month': branch_members.filter(
-                            registration_date__gte=current_month
-                        ).count(),
-                        'baptized': branch_members.filter(baptized='Yes').count(),
+                        'total_members': branch.total_members,
+                        'new_this_month': branch.new_this_month,
+                        'baptized': branch.baptized,
                     }
-                    branches_with_stats.append(branch_data)
-                context['branches_with_stats'] = branches_with_stats
+                    for branch in context['user_branches']
+                ]
         except Exception as e:
             logger.warning(f"Error calculating statistics: {e}")
             # Use default empty stats if calculation fails
@@ -188,13 +183,23 @@ class MemberCreateView(generics.CreateAPIView):
     permission_classes = []  # Remove authentication requirement to allow new members to register
     
     def create(self, request, *args, **kwargs):
+        from authentication.branch_context import BranchContextManager
+        
         try:
             # Log the registration attempt
             logger.info(f"New member registration attempt: {request.data.get('full_name', 'Unknown')}")
             
             serializer = self.get_serializer(data=request.data)
             if serializer.is_valid():
-                member = serializer.save()
+                # Staff register into their selected branch and get an ID from its
+                # sequence; public registrations keep no branch and no ID yet
+                branch = BranchContextManager.get_branch_context(request)
+                if branch is not None:
+                    member = serializer.save(
+                        branch=branch, membership_id=MembershipIdSequence.allocate_ids(branch)[0]
+                    )
+                else:
+                    member = serializer.save()
                 logger.info(f"New member registered successfully: {member.full_name} (ID: {member.membership_id})")
                 
                 # Return success response with member details
@@ -217,110 +222,634 @@ class MemberCreateView(generics.CreateAPIView):
                 'error': 'Hitilafu ya server imetokea. Tafadhali jaribu tena.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class MemberListView(generics.ListAPIView):
-    """API view for listing members with search and filtering - requires authentication"""
+class MemberBulkCreateView(generics.GenericAPIView):
+    """
+    API view for registering many members in one request.
+
+    Accepts a JSON array or an NDJSON stream of member objects. Every row is
+    validated with MemberSerializer; valid rows get a block of membership IDs
+    and are inserted with bulk_create in one transaction, and the response
+    reports success or errors per row.
+    """
+    queryset = Member.objects.all()
     serializer_class = MemberSerializer
-    pagination_class = MemberPagination
     permission_classes = [IsAuthenticated]
+    parser_classes = [OrjsonParser, NDJSONParser]
+    max_rows = 10000
+    batch_size = 500
     
-    def get_queryset(self):
-        queryset = Member.objects.all()
+    def post(self, request, *args, **kwargs):
+        from authentication.branch_context import BranchContextManager
         
-        # Search functionality
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(full_name__icontains=search) |
-                Q(membership_id__icontains=search) |
-                Q(phone__icontains=search) |
-                Q(email__icontains=search) |
-                Q(emergency_phone__icontains=search)
-            )
+        if not can_register_members(request.user):
+            return Response({
+                'error': 'Huna ruhusa ya kusajili washirika.'
+            }, status=status.HTTP_403_FORBIDDEN)
         
-        # Filter by gender
-        gender = self.request.query_params.get('gender', None)
-        if gender:
-            queryset = queryset.filter(gender=gender)
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({
+                'error': 'Tuma orodha ya washirika (JSON array au NDJSON).'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_rows:
+            return Response({
+                'error': f'Washirika wasizidi {self.max_rows} kwa ombi moja.'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Filter by age category
-        age_category = self.request.query_params.get('age_category', None)
-        if age_category:
-            queryset = queryset.filter(age_category=age_category)
+        # Branch from ?branch=, then the selected branch, then the user's primary branch
+        branch_id = request.query_params.get('branch')
+        if branch_id:
+            try:
+                branch_id = int(branch_id)
+            except ValueError:
+                return Response({
+                    'error': 'branch lazima iwe namba.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            branch = Branch.objects.filter(id=branch_id, is_active=True).first()
+            if not branch or not BranchContextManager.user_can_access_branch(request.user, branch.id, request=request):
+                return Response({
+                    'error': 'Tawi halipatikani au huna ruhusa.'
+                }, status=status.HTTP_403_FORBIDDEN)
+        else:
+            branch = BranchContextManager.get_branch_context(request) or request.user.profile.primary_branch
+        if not branch:
+            return Response({
+                'error': 'Chagua tawi la kusajili washirika.'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Filter by membership type
-        membership_type = self.request.query_params.get('membership_type', None)
-        if membership_type:
-            queryset = queryset.filter(membership_type=membership_type)
+        # Validate every row before touching the database
+        results = []
+        valid = []
+        for index, row in enumerate(rows):
+            serializer = self.get_serializer(data=row)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+                results.append(None)
+            else:
+                results.append({'index': index, 'success': False, 'errors': serializer.errors})
         
-        # Filter by baptized status
-        baptized = self.request.query_params.get('baptized', None)
-        if baptized:
-            queryset = queryset.filter(baptized=baptized)
+        if valid:
+            membership_ids = MembershipIdSequence.allocate_ids(branch, count=len(valid))
+            members = [
+                Member(branch=branch, membership_id=membership_id, **data)
+                for membership_id, (index, data) in zip(membership_ids, valid)
+            ]
+            for member in members:
+                member.normalize_phones()
+            with transaction.atomic():
+                # bulk_create bypasses save(), so reserve change feed positions here
+                first_seq = ChangeSequence.reserve(ChangeSequence.member_log(branch.id), count=len(members))
+                for offset, member in enumerate(members):
+                    member.change_seq = first_seq + offset
+                Member.objects.bulk_create(members, batch_size=self.batch_size)
+                # bulk_create bypasses the rollup and typeahead signals
+                apply_rollup_changes([(None, member_rollup_values(member)) for member in members])
+                transaction.on_commit(lambda: member_typeahead.update_members(members))
+            
+            for member, (index, data) in zip(members, valid):
+                results[index] = {'index': index, 'success': True, 'membership_id': member.membership_id}
+            
+            log_user_action(
+                user=request.user,
+                action='register_member',
+                request=request,
+                details={'bulk': True, 'branch': branch.code, 'created': len(members)}
+            )
         
-        # Ordering
-        ordering = self.request.query_params.get('ordering', '-registration_date')
-        valid_orderings = [
-            'full_name', '-full_name', 'registration_date', '-registration_date',
-            'membership_id', '-membership_id', 'gender', '-gender',
-            'age_category', '-age_category', 'membership_type', '-membership_type'
-        ]
-        if ordering in valid_orderings:
-            queryset = queryset.order_by(ordering)
-        else:
-            queryset = queryset.order_by('-registration_date')
+        failed = len(rows) - len(valid)
+        logger.info(f"Bulk member registration: {len(valid)} created, {failed} failed (branch {branch.code})")
         
-        return queryset
+        if not valid:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            'success': failed == 0,
+            'created': len(valid),
+            'failed': failed,
+            'results': results,
+        }, status=response_status)
+
+MEMBER_LIST_ORDERINGS = [
+    'full_name', '-full_name', 'registration_date', '-registration_date',
+    'membership_id', '-membership_id', 'gender', '-gender',
+    'age_category', '-age_category', 'membership_type', '-membership_type'
+]
+
+
+def filter_member_queryset(queryset, params):
+    """Apply the member list search, filter and ordering query parameters"""
+    # Search functionality
+    search = (params.get('search') or '').strip()
+    if search:
+        queryset = search_members(queryset, search)
+    
+    # Filter by gender
+    gender = params.get('gender', None)
+    if gender:
+        queryset = queryset.filter(gender=gender)
+    
+    # Filter by age category
+    age_category = params.get('age_category', None)
+    if age_category:
+        queryset = queryset.filter(age_category=age_category)
+    
+    # Filter by membership type
+    membership_type = params.get('membership_type', None)
+    if membership_type:
+        queryset = queryset.filter(membership_type=membership_type)
+    
+    # Filter by baptized status
+    baptized = params.get('baptized', None)
+    if baptized:
+        queryset = queryset.filter(baptized=baptized)
+    
+    # Ordering (ranked searches default to best match first)
+    ordering = params.get('ordering', None)
+    if ordering in MEMBER_LIST_ORDERINGS:
+        queryset = queryset.order_by(ordering)
+    elif RANK_ANNOTATION in queryset.query.annotations:
+        queryset = queryset.order_by(f'-{RANK_ANNOTATION}', '-registration_date')
+    else:
+        queryset = queryset.order_by('-registration_date')
+    
+    return queryset
+
+
+class MemberListView(generics.ListAPIView):
+    """API view for listing members with search and filtering - requires authentication"""
+    serializer_class = MemberSerializer
+    pagination_class = MemberPagination
+    permission_classes = [IsAuthenticated]
+    
+    @property
+    def paginator(self):
+        """Use keyset pagination when the client opts in with ?pagination=cursor"""
+        if not hasattr(self, '_paginator'):
+            if MemberKeysetPagination.is_requested(self.request):
+                self._paginator = MemberKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+    
+    def get_member_fields(self):
+        """Serialized fields: the role's visible fields narrowed by ?fields="""
+        if not hasattr(self, '_member_fields'):
+            self._member_fields = MemberSerializer.fields_for_user(
+                self.request.user, self.request.query_params.get('fields')
+            )
+        return self._member_fields
+    
+    def get_queryset(self):
+        queryset = filter_member_queryset(Member.objects.all(), self.request.query_params)
+        # Load only the columns the serialized fields read
+        columns = MemberSerializer.model_columns(self.get_member_fields())
+        # Keep annotations such as the search rank selectable for cursor keys
+        return queryset.values(*columns or ['id'], *queryset.query.annotations)
+    
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_member_fields())
+        return super().get_serializer(*args, **kwargs)
     
     def list(self, request, *args, **kwargs):
         try:
-            response = super().list(request, *args, **kwargs)
-            logger.info(f"Member list requested - returned {len(response.data.get('results', []))} members")
-            return response
+            # Rows are plain dicts from .values(); MemberRowSerializer renders
+            # them exactly as MemberSerializer would, without model instances
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            rows = MemberRowSerializer(self.get_member_fields()).to_representation(
+                queryset if page is None else page
+            )
+            response = self.get_paginated_response(rows) if page is not None else Response(rows)
+            # 304 when the page (rows, count and cursor links) is what the client
+            # already holds; built from the page so no query covers the whole scope
+            validators = content_validators(request, response.data, request.user.pk)
+            if validators.not_modified:
+                return validators.not_modified
+            logger.info(f"Member list requested - returned {len(rows)} members")
+            return validators.apply(response)
+        except APIException:
+            raise
         except Exception as e:
             logger.error(f"Error retrieving member list: {str(e)}")
             return Response({
                 'error': 'Hitilafu imetokea wakati wa kupakia orodha ya washirika.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class Echo:
+    """Pseudo-buffer whose write() returns the value, for streaming csv.writer output"""
+    
+    def write(self, value):
+        return value
+
+
+# Export columns in file order with their CSV headers
+MEMBER_EXPORT_COLUMNS = [
+    ('membership_id', 'ID'),
+    ('full_name', 'Jina Kamili'),
+    ('gender', 'Jinsia'),
+    ('age_category', 'Kundi la Umri'),
+    ('dob', 'Tarehe ya Kuzaliwa'),
+    ('marital_status', 'Hali ya Ndoa'),
+    ('phone', 'Simu'),
+    ('email', 'Barua Pepe'),
+    ('address', 'Anuani'),
+    ('salvation_date', 'Tarehe ya Kuokoka'),
+    ('baptized', 'Amebatizwa'),
+    ('baptism_date', 'Tarehe ya Ubatizo'),
+    ('membership_class', 'Darasa la Ushirika'),
+    ('previous_church', 'Kanisa la Awali'),
+    ('emergency_name', 'Jina la Mtu wa Dharura'),
+    ('emergency_relation', 'Mahusiano'),
+    ('emergency_phone', 'Simu ya Dharura'),
+    ('membership_type', 'Aina ya Ushirika'),
+    ('registration_date', 'Tarehe ya Usajili'),
+]
+MEMBER_EXPORT_CHOICES = {
+    'gender': dict(Member.GENDER_CHOICES),
+    'marital_status': dict(Member.MARITAL_CHOICES),
+    'baptized': dict(Member.BAPTIZED_CHOICES),
+    'membership_class': dict(Member.CLASS_CHOICES),
+    'membership_type': dict(Member.MEMBERSHIP_CHOICES),
+}
+
+
+@login_required
+def member_export(request):
+    """Stream the filtered member directory as CSV - requires export permission"""
+    profile = getattr(request.user, 'profile', None)
+    if not profile or not profile.can_export_data:
+        return HttpResponseForbidden("Access denied: Insufficient privileges.")
+    
+    # Same search/filter/ordering parameters as the member list API
+    queryset = filter_member_queryset(profile.get_accessible_members(), request.GET)
+    
+    # Only the columns this role may see are selected from the database
+    allowed = filter_member_fields(dict.fromkeys(field for field, header in MEMBER_EXPORT_COLUMNS), request.user)
+    columns = [(field, header) for field, header in MEMBER_EXPORT_COLUMNS if field in allowed]
+    fields = [field for field, header in columns]
+    translations = [MEMBER_EXPORT_CHOICES.get(field) for field in fields]
+    
+    log_user_action(
+        user=request.user,
+        action='export_data',
+        request=request,
+        details={
+            'format': 'csv',
+            'fields': fields,
+            'filters': {key: value for key, value in request.GET.items()},
+        }
+    )
+    
+    def rows():
+        yield [header for field, header in columns]
+        for values in queryset.values_list(*fields).iterator(chunk_size=2000):
+            yield [
+                translation.get(value, value) if translation else ('' if value is None else value)
+                for value, translation in zip(values, translations)
+            ]
+    
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows()),
+        content_type='text/csv; charset=utf-8',
+    )
+    filename = f"orodha_ya_washirika_{timezone.localdate().isoformat()}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    logger.info(f"Member export started by {request.user.username} ({len(fields)} columns)")
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def member_suggest(request):
+    """Name autocomplete for the directory search box, served from the in-process typeahead index"""
+    from authentication.middleware import get_branch_access
+    
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    if not query:
+        return Response({'results': []})
+    
+    access = get_branch_access(request)
+    branch_ids = None if access.is_system_admin else access.accessible_branch_ids
+    suggestions = member_typeahead.suggest(query, branch_ids=branch_ids, limit=limit)
+    
+    # Only show membership IDs to roles that can see them
+    if 'membership_id' not in filter_member_fields({'membership_id': None}, request.user):
+        for suggestion in suggestions:
+            del suggestion['membership_id']
+    return Response({'results': suggestions})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def member_changes(request):
+    """
+    Delta sync: members changed or removed since the ``?since=`` cursor.
+
+    Clients keep ``next_since`` and send it back; ``has_more`` means they
+    are not caught up yet. The cursor holds a position in each branch's
+    change log (a plain number with ``?branch=``; see membership/changes.py).
+    ``deleted`` lists members deleted or moved out of the requested scope
+    (``?branch=`` or every accessible branch). A cursor older than the
+    pruned tombstones gets 410 and must resync from 0.
+    """
+    from authentication.middleware import get_branch_access
+    
+    access = get_branch_access(request)
+    members = Member.objects.all()
+    tombstones = MemberTombstone.objects.all()
+    branch_id = request.query_params.get('branch')
+    try:
+        branch_id = int(branch_id) if branch_id else None
+        since = changes.parse_cursor(request.query_params.get('since', 0), branch_id)
+        limit = min(max(int(request.query_params.get('limit', 500)), 1), 5000)
+    except ValueError:
+        return Response({
+            'error': 'since, branch na limit si sahihi.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if branch_id is not None:
+        if not access.can_access(branch_id):
+            return Response({
+                'error': 'Huna ruhusa ya kuona tawi hili.'
+            }, status=status.HTTP_403_FORBIDDEN)
+        members = members.filter(branch_id=branch_id)
+        tombstones = tombstones.filter(branch_id=branch_id)
+        branches = {branch_id}
+    elif not access.is_system_admin:
+        members = members.filter(branch_id__in=access.accessible_branch_ids)
+        tombstones = tombstones.filter(branch_id__in=access.accessible_branch_ids)
+        branches = set(access.accessible_branch_ids)
+    else:
+        branches = None
+    
+    row_serializer = MemberRowSerializer(MemberSerializer.fields_for_user(request.user))
+    try:
+        changed_rows, deleted_rows, positions, has_more = changes.read_changes(
+            members, tombstones, branches, since, limit, row_serializer.columns
+        )
+    except changes.CursorExpired:
+        return Response({
+            'error': 'Mabadiliko ya zamani yamefutwa. Pakua orodha yote upya (since=0).',
+            'reset': True,
+        }, status=status.HTTP_410_GONE)
+    
+    if branch_id is not None:
+        since, next_since = since.get(branch_id, 0), positions.get(branch_id, since.get(branch_id, 0))
+    else:
+        since, next_since = changes.format_cursor(since), changes.format_cursor(positions)
+    
+    logger.info(f"Member changes since {since}: {len(changed_rows)} changed, {len(deleted_rows)} deleted")
+    return Response({
+        'since': since,
+        'next_since': next_since,
+        'has_more': has_more,
+        'changed': [
+            {'id': row['id'], 'branch_id': row['branch_id'], 'change_seq': row['change_seq'], **data}
+            for row, data in zip(changed_rows, row_serializer.to_representation(changed_rows))
+        ],
+        'deleted': [
+            {'id': row['member_id'], 'branch_id': row['branch_id'], 'change_seq': row['change_seq']}
+            for row in deleted_rows
+        ],
+    })
+
+# Largest list accepted by attendance_mark in one request
+ATTENDANCE_MARK_MAX_ROWS = 5000
+
+
+def can_manage_attendance(access):
+    """Attendance permission from the request's cached BranchAccess"""
+    return bool(access.user_access and access.user_access['permissions']['can_manage_attendance'])
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def attendance_mark(request, session_id):
+    """
+    Mark many members present for an attendance session in one request.
+
+    The body is a JSON list (or ``{"members": [...], "notes": ""}``) of
+    member primary keys (numbers) and/or membership IDs (strings). Members
+    are resolved with one query, limited to the session's branch, and
+    inserted with ``AttendanceRecord.mark_present``, which skips members
+    already marked and reports exactly the rows it stored.
+    """
+    from authentication.middleware import get_branch_access
+    
+    access = get_branch_access(request)
+    if not can_manage_attendance(access):
+        return Response({
+            'error': 'Huna ruhusa ya kusimamia mahudhurio.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    session = AttendanceSession.objects.filter(pk=session_id).only('id', 'branch_id', 'is_active').order_by().first()
+    if session is None or not access.can_access(session.branch_id):
+        return Response({
+            'error': 'Kipindi hakipatikani au huna ruhusa.'
+        }, status=status.HTTP_404_NOT_FOUND)
+    if not session.is_active:
+        return Response({
+            'error': 'Kipindi hiki kimefungwa.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = request.data
+    notes = ''
+    if isinstance(data, dict):
+        notes = str(data.get('notes') or '')
+        data = data.get('members')
+    if not isinstance(data, list) or not data:
+        return Response({
+            'error': 'Tuma orodha ya washirika (namba za ushirika au namba za utambulisho).'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(data) > ATTENDANCE_MARK_MAX_ROWS:
+        return Response({
+            'error': f'Washirika wasizidi {ATTENDANCE_MARK_MAX_ROWS} kwa ombi moja.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    pks = {value for value in data if isinstance(value, int) and not isinstance(value, bool)}
+    membership_ids = {value.strip() for value in data if isinstance(value, str) and value.strip()}
+    found = list(
+        Member.objects.filter(branch_id=session.branch_id)
+        .filter(Q(pk__in=pks) | Q(membership_id__in=membership_ids))
+        .order_by().values_list('id', 'membership_id')
+    )
+    member_ids = {member_id for member_id, membership_id in found}
+    not_found = sorted(
+        (pks - member_ids) | (membership_ids - {membership_id for member_id, membership_id in found}),
+        key=str,
+    )
+    
+    marked = len(AttendanceRecord.mark_present(session, member_ids, request.user, notes))
+    
+    already_marked = len(member_ids) - marked
+    logger.info(f"Attendance for session {session.pk}: {marked} marked, {already_marked} already present, {len(not_found)} not found")
+    return Response({
+        'session': session.pk,
+        'marked': marked,
+        'already_marked': already_marked,
+        'not_found': not_found,
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def attendance_checkin(request, session_id):
+    """
+    Kiosk scan: check one membership ID in to a session.
+
+    Answered from the worker's in-memory roster; the attendance row is
+    written shortly afterwards by the batching writer in membership.kiosk.
+    """
+    from authentication.middleware import get_branch_access
+    
+    access = get_branch_access(request)
+    if not can_manage_attendance(access):
+        return Response({
+            'error': 'Huna ruhusa ya kusimamia mahudhurio.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    # Check access before loading (and caching) the branch's whole roster
+    branch_id = roster_cache.branch_id(session_id)
+    roster = roster_cache.get(session_id) if branch_id is not None and access.can_access(branch_id) else None
+    if roster is None:
+        return Response({
+            'error': 'Kipindi hakipatikani au huna ruhusa.'
+        }, status=status.HTTP_404_NOT_FOUND)
+    if not roster.is_active:
+        return Response({
+            'error': 'Kipindi hiki kimefungwa.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    membership_id = request.data.get('membership_id') if isinstance(request.data, dict) else None
+    if not isinstance(membership_id, str) or not membership_id.strip():
+        return Response({
+            'error': 'Namba ya ushirika inahitajika.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    result, full_name = roster.check_in(membership_id, request.user)
+    if result == SESSION_CLOSED:
+        return Response({
+            'error': 'Kipindi hiki kimefungwa.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if result == NOT_FOUND:
+        return Response({
+            'status': result,
+            'error': 'Mshirika hapatikani katika tawi hili.'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({'status': result, 'full_name': full_name})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def attendance_roster(request, session_id):
+    """
+    Roster snapshot for taking a session's attendance offline.
+
+    Members are sent as compact ``[id, membership_id, full_name]`` rows
+    with the IDs already checked in. ``since`` is the member change
+    sequence the snapshot was read at: devices refresh the roster with
+    ``/api/members/changes/?branch=<branch>&since=<since>``.
+    """
+    from authentication.middleware import get_branch_access
+    
+    access = get_branch_access(request)
+    if not can_manage_attendance(access):
+        return Response({
+            'error': 'Huna ruhusa ya kusimamia mahudhurio.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    session = AttendanceSession.objects.filter(pk=session_id).values(
+        'id', 'branch_id', 'title', 'service_type', 'date', 'start_time', 'is_active'
+    ).first()
+    if session is None or not access.can_access(session['branch_id']):
+        return Response({
+            'error': 'Kipindi hakipatikani au huna ruhusa.'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    # Read the sequence first so changes racing the snapshot show up in the delta feed
+    since = ChangeSequence.current(ChangeSequence.member_log(session['branch_id']))[0]
+    members = list(
+        Member.objects.filter(branch_id=session['branch_id'])
+        .order_by('id').values_list('id', 'membership_id', 'full_name')
+    )
+    checked_in = list(
+        AttendanceRecord.objects.filter(session_id=session_id)
+        .order_by('member_id').values_list('member_id', flat=True)
+    )
+    return Response({
+        'session': session,
+        'since': since,
+        'fields': ['id', 'membership_id', 'full_name'],
+        'members': members,
+        'checked_in': checked_in,
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def attendance_sync(request):
+    """
+    Upload attendance captured offline.
+
+    Body: ``{"batch_id": "<uuid>", "device_id": "", "records": [{"session": 1,
+    "member": 2, "marked_at": "<ISO 8601>", "notes": ""}, ...]}``. Uploading
+    the same ``batch_id`` again returns the first result with
+    ``replayed: true``; see membership.sync for how conflicts are resolved.
+    """
+    from authentication.middleware import get_branch_access
+    
+    access = get_branch_access(request)
+    if not can_manage_attendance(access):
+        return Response({
+            'error': 'Huna ruhusa ya kusimamia mahudhurio.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    data = request.data if isinstance(request.data, dict) else {}
+    try:
+        batch_id = uuid.UUID(str(data.get('batch_id')))
+    except ValueError:
+        return Response({
+            'error': 'batch_id lazima iwe UUID.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    records = data.get('records')
+    if not isinstance(records, list) or not records:
+        return Response({
+            'error': 'Tuma orodha ya mahudhurio (records).'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(records) > ATTENDANCE_MARK_MAX_ROWS:
+        return Response({
+            'error': f'Mahudhurio yasizidi {ATTENDANCE_MARK_MAX_ROWS} kwa ombi moja.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    batch, replayed = sync.apply_batch(
+        request.user, access, batch_id, str(data.get('device_id') or '')[:100], records
+    )
+    if batch.uploaded_by_id != request.user.id:
+        return Response({
+            'error': 'batch_id hii imeshatumika.'
+        }, status=status.HTTP_409_CONFLICT)
+    if not replayed:
+        logger.info(f"Attendance sync batch {batch_id}: {batch.result['created']} created, {batch.result['duplicates']} duplicates, {len(batch.result['rejected'])} rejected")
+    return Response({**batch.result, 'replayed': replayed})
+
 @api_view(['GET'])
 def member_statistics(request):
     """API endpoint for member statistics"""
     try:
-        current_year = timezone.now().year
-        current_month = timezone.now().month
-        
-        stats = {
-            'total_members': Member.objects.count(),
-            'male_members': Member.objects.filter(gender='Male').count(),
-            'female_members': Member.objects.filter(gender='Female').count(),
-            'baptized_members': Member.objects.filter(baptized='Yes').count(),
-            'new_members_this_year': Member.objects.filter(
-                registration_date__year=current_year
-            ).count(),
-            'new_members_this_month': Member.objects.filter(
-                registration_date__year=current_year,
-                registration_date__month=current_month
-            ).count(),
-            'membership_class_completed': Member.objects.filter(
-                membership_class='Yes'
-            ).count(),
-            'by_age_category': dict(
-                Member.objects.values('age_category').annotate(
-                    count=Count('age_category')
-                ).values_list('age_category', 'count')
-            ),
-            'by_membership_type': dict(
-                Member.objects.values('membership_type').annotate(
-                    count=Count('membership_type')
-                ).values_list('membership_type', 'count')
-            ),
-        }
+        # "New this month/year" counters also change when the date does
+        validators = queryset_validators(request, BranchStatsRollup.objects.all(), timezone.localdate())
+        if validators.not_modified:
+            return validators.not_modified
+        stats = rollup_member_stats()
         
         logger.info("Member statistics requested")
-        return Response(stats)
+        return validators.apply(Response(stats))
         
     except Exception as e:
         logger.error(f"Error retrieving member statistics: {str(e)}")
         return Response({
             'error': 'Hitilafu imetokea wakati wa kupakia takwimu.'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -7,28 +7,16 @@ from django.db import migrations, connection
 def check_table_exists(table_name):
     """Check if a table exists in the database"""
     with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = %s
-            );
-        """, [table_name])
-        return cursor.fetchone()[0]
+        return table_name in connection.introspection.table_names(cursor)
 
 
 def check_column_exists(table_name, column_name):
     """Check if a column exists in a table"""
+    if not check_table_exists(table_name):
+        return False
     with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.columns 
-                WHERE table_schema = 'public' 
-                AND table_name = %s 
-                AND column_name = %s
-            );
-        """, [table_name, column_name])
-        return cursor.fetchone()[0]
+        columns = connection.introspection.get_table_description(cursor, table_name)
+        return any(column.name == column_name for column in columns)
 
 
 class SafeCreateModel(migrations.CreateModel):
@@ -93,3 +81,45 @@ class SafeAlterField(migrations.AlterField):
             super().database_forwards(app_label, schema_editor, from_state, to_state)
         else:
             print(f"Column {column_name} doesn't exist in {table_name}, skipping alteration")
+
+
+def check_index_exists(table_name, index_name):
+    """Check if an index exists on a table"""
+    if not check_table_exists(table_name):
+        return False
+    with connection.cursor() as cursor:
+        return index_name in connection.introspection.get_constraints(cursor, table_name)
+
+
+class SafeAddIndex(migrations.AddIndex):
+    """
+    Custom AddIndex operation that skips existing indexes and builds new ones
+    with CREATE INDEX CONCURRENTLY on PostgreSQL (so the table stays writable).
+    Other databases get a plain CREATE INDEX. Migrations using it must set
+    ``atomic = False``.
+    """
+    
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        table_name = model._meta.db_table
+        
+        if check_index_exists(table_name, self.index.name):
+            print(f"Index {self.index.name} already exists on {table_name}, skipping creation")
+        elif schema_editor.connection.vendor == 'postgresql':
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+    
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        
+        if not check_index_exists(model._meta.db_table, self.index.name):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
@@ -1,11 +1,52 @@
 // Church Membership Directory JavaScript
+//
+// Search, filters and ordering are applied by the server (/api/members/);
+// the page loads results one cursor page at a time as the user scrolls.
+
+// Column headers that map to an ordering the API accepts
+const SORTABLE_COLUMNS = ['membership_id', 'full_name', 'gender', 'age_category', 'membership_type', 'registration_date'];
+
+// Query parameter names for each filter select
+const FILTER_PARAMS = {
+    gender: 'gender',
+    ageCategory: 'age_category',
+    membershipType: 'membership_type',
+    baptized: 'baptized'
+};
+
+// Small least-recently-used cache of API responses keyed by URL
+class ResponseCache {
+    constructor(maxEntries = 20) {
+        this.maxEntries = maxEntries;
+        this.entries = new Map();
+    }
+
+    get(key) {
+        if (!this.entries.has(key)) return undefined;
+        const value = this.entries.get(key);
+        // Re-insert to mark as most recently used
+        this.entries.delete(key);
+        this.entries.set(key, value);
+        return value;
+    }
+
+    set(key, value) {
+        this.entries.delete(key);
+        this.entries.set(key, value);
+        if (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+
+    clear() {
+        this.entries.clear();
+    }
+}
 
 class MembershipDirectory {
     constructor() {
         this.members = [];
-        this.filteredMembers = [];
-        this.currentPage = 1;
-        this.itemsPerPage = 10;
+        this.pageSize = 25;
         this.sortColumn = null;
         this.sortDirection = 'asc';
         this.searchTerm = '';
@@ -15,14 +56,21 @@ class MembershipDirectory {
             membershipType: '',
             baptized: ''
         };
-        
+        this.nextUrl = null;
+        this.loading = false;
+        this.controller = null;
+        this.cache = new ResponseCache(20);
+        this.pending = new Map();
+        this.observer = null;
+
         this.init();
     }
 
     init() {
         this.setupEventListeners();
-        this.loadMembers();
         this.setupAccessibility();
+        this.loadStatistics();
+        this.loadMembers();
     }
 
     setupEventListeners() {
@@ -30,8 +78,11 @@ class MembershipDirectory {
         const searchInput = document.getElementById('searchInput');
         if (searchInput) {
             searchInput.addEventListener('input', this.debounce(() => {
-                this.searchTerm = searchInput.value.toLowerCase();
-                this.filterAndDisplay();
+                const term = searchInput.value.trim();
+                if (term !== this.searchTerm) {
+                    this.searchTerm = term;
+                    this.loadMembers();
+                }
             }, 300));
         }
 
@@ -39,7 +90,7 @@ class MembershipDirectory {
         document.querySelectorAll('.filter-select').forEach(select => {
             select.addEventListener('change', (e) => {
                 this.filters[e.target.dataset.filter] = e.target.value;
-                this.filterAndDisplay();
+                this.loadMembers();
             });
         });
 
@@ -49,14 +100,37 @@ class MembershipDirectory {
             exportBtn.addEventListener('click', () => this.exportToCSV());
         }
 
+        // Sorting and row actions (the table is re-rendered, so delegate)
+        const tableContainer = document.querySelector('.table-container');
+        if (tableContainer) {
+            tableContainer.addEventListener('click', (e) => {
+                const th = e.target.closest('[data-sort]');
+                if (th) {
+                    this.sortMembers(th.dataset.sort);
+                    return;
+                }
+                const viewBtn = e.target.closest('.view-btn');
+                if (viewBtn) {
+                    this.showMemberDetails(Number(viewBtn.dataset.index));
+                }
+            });
+            tableContainer.addEventListener('keydown', (e) => {
+                const th = e.target.closest('[data-sort]');
+                if (th && (e.key === 'Enter' || e.key === ' ')) {
+                    e.preventDefault();
+                    this.sortMembers(th.dataset.sort);
+                }
+            });
+        }
+
         // Modal close functionality
         const modal = document.getElementById('memberModal');
         const closeBtn = document.querySelector('.close-btn');
-        
+
         if (closeBtn) {
             closeBtn.addEventListener('click', () => this.closeModal());
         }
-        
+
         if (modal) {
             modal.addEventListener('click', (e) => {
                 if (e.target === modal) {
@@ -94,30 +168,102 @@ class MembershipDirectory {
         }
     }
 
-    async loadMembers() {
-        this.showLoading();
-        
-        try {
-            const response = await fetch('/api/members/');
-            
+    // URL of the first page for the current search, filters and ordering
+    buildQueryUrl() {
+        const params = new URLSearchParams({
+            pagination: 'cursor',
+            page_size: this.pageSize
+        });
+        if (this.searchTerm) params.set('search', this.searchTerm);
+        Object.entries(FILTER_PARAMS).forEach(([filter, param]) => {
+            if (this.filters[filter]) params.set(param, this.filters[filter]);
+        });
+        if (this.sortColumn) {
+            params.set('ordering', `${this.sortDirection === 'desc' ? '-' : ''}${this.sortColumn}`);
+        }
+        return `/api/members/?${params.toString()}`;
+    }
+
+    // Fetch one page, from the cache (or an identical in-flight request) when possible
+    fetchPage(url, signal) {
+        const cached = this.cache.get(url);
+        if (cached) return Promise.resolve(cached);
+        if (this.pending.has(url)) return this.pending.get(url);
+
+        const request = fetch(url, {
+            signal,
+            headers: { 'Accept': 'application/json' },
+            credentials: 'same-origin'
+        }).then(response => {
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            
-            const data = await response.json();
-            // Handle paginated response from Django REST framework
-            this.members = data.results || data;
-            this.filteredMembers = [...this.members];
-            this.totalCount = data.count || this.members.length;
-            
-            this.hideLoading();
-            this.updateStatistics();
+            return response.json();
+        }).then(data => {
+            this.cache.set(url, data);
+            return data;
+        }).finally(() => {
+            this.pending.delete(url);
+        });
+        this.pending.set(url, request);
+        return request;
+    }
+
+    // Start over for a new query; any request for the previous query is cancelled
+    async loadMembers() {
+        if (this.controller) {
+            this.controller.abort();
+        }
+        // Aborted requests must not be shared with the new query
+        this.pending.clear();
+        this.controller = new AbortController();
+        this.members = [];
+        this.nextUrl = null;
+        this.loading = false;
+        this.showLoading();
+        await this.loadNextPage(this.buildQueryUrl());
+    }
+
+    async loadNextPage(url = this.nextUrl) {
+        if (!url || this.loading) return;
+        const controller = this.controller;
+        this.loading = true;
+
+        try {
+            const data = await this.fetchPage(url, controller.signal);
+            if (controller !== this.controller) return;
+
+            this.members = this.members.concat(data.results || []);
+            this.nextUrl = data.next;
             this.displayMembers();
-            this.setupTableSorting();
-            
+            this.prefetch(this.nextUrl, controller);
+
         } catch (error) {
+            if (error.name === 'AbortError') return;
             console.error('Failed to load members:', error);
             this.showError('Imeshindwa kupakia orodha ya washirika. Tafadhali jaribu tena.');
+        } finally {
+            if (controller === this.controller) {
+                this.loading = false;
+            }
+        }
+    }
+
+    // Warm the cache with the following page so scrolling does not wait on it
+    prefetch(url, controller) {
+        if (!url || this.cache.get(url)) return;
+        this.fetchPage(url, controller.signal).catch(() => {
+            // Loaded again (and reported) when the user reaches it
+        });
+    }
+
+    async loadStatistics() {
+        try {
+            const response = await fetch('/api/statistics/', { credentials: 'same-origin' });
+            if (!response.ok) return;
+            this.updateStatistics(await response.json());
+        } catch (error) {
+            console.error('Failed to load statistics:', error);
         }
     }
 
@@ -133,10 +279,6 @@ class MembershipDirectory {
         }
     }
 
-    hideLoading() {
-        // Loading will be replaced by table content
-    }
-
     showError(message) {
         const tableContainer = document.querySelector('.table-container');
         if (tableContainer) {
@@ -148,78 +290,28 @@ class MembershipDirectory {
         }
     }
 
-    updateStatistics() {
-        const stats = {
-            total: this.members.length,
-            male: this.members.filter(m => m.gender === 'Male').length,
-            female: this.members.filter(m => m.gender === 'Female').length,
-            baptized: this.members.filter(m => m.baptized === 'Yes').length
-        };
-
+    updateStatistics(stats) {
         // Update stat cards
         const totalStat = document.getElementById('totalMembers');
         const maleStat = document.getElementById('maleMembers');
         const femaleStat = document.getElementById('femaleMembers');
         const baptizedStat = document.getElementById('baptizedMembers');
 
-        if (totalStat) totalStat.textContent = stats.total;
-        if (maleStat) maleStat.textContent = stats.male;
-        if (femaleStat) femaleStat.textContent = stats.female;
-        if (baptizedStat) baptizedStat.textContent = stats.baptized;
-    }
-
-    filterAndDisplay() {
-        this.filteredMembers = this.members.filter(member => {
-            // Search filter
-            const matchesSearch = !this.searchTerm || 
-                member.full_name.toLowerCase().includes(this.searchTerm) ||
-                member.emergency_phone.includes(this.searchTerm) ||
-                member.membership_id.toString().includes(this.searchTerm);
-
-            // Other filters
-            const matchesGender = !this.filters.gender || member.gender === this.filters.gender;
-            const matchesAge = !this.filters.ageCategory || member.age_category === this.filters.ageCategory;
-            const matchesMembership = !this.filters.membershipType || member.membership_type === this.filters.membershipType;
-            const matchesBaptized = !this.filters.baptized || member.baptized === this.filters.baptized;
-
-            return matchesSearch && matchesGender && matchesAge && matchesMembership && matchesBaptized;
-        });
-
-        this.currentPage = 1; // Reset to first page when filtering
-        this.displayMembers();
+        if (totalStat) totalStat.textContent = stats.total_members || 0;
+        if (maleStat) maleStat.textContent = stats.male_members || 0;
+        if (femaleStat) femaleStat.textContent = stats.female_members || 0;
+        if (baptizedStat) baptizedStat.textContent = stats.baptized_members || 0;
     }
 
     sortMembers(column) {
+        if (!SORTABLE_COLUMNS.includes(column)) return;
         if (this.sortColumn === column) {
             this.sortDirection = this.sortDirection === 'asc' ? 'desc' : 'asc';
         } else {
             this.sortColumn = column;
             this.sortDirection = 'asc';
         }
-
-        this.filteredMembers.sort((a, b) => {
-            let aVal = a[column] || '';
-            let bVal = b[column] || '';
-
-            // Handle different data types
-            if (column === 'membership_id') {
-                aVal = parseInt(aVal);
-                bVal = parseInt(bVal);
-            } else if (column === 'registration_date') {
-                aVal = new Date(aVal);
-                bVal = new Date(bVal);
-            } else {
-                aVal = aVal.toString().toLowerCase();
-                bVal = bVal.toString().toLowerCase();
-            }
-
-            if (aVal < bVal) return this.sortDirection === 'asc' ? -1 : 1;
-            if (aVal > bVal) return this.sortDirection === 'asc' ? 1 : -1;
-            return 0;
-        });
-
-        this.displayMembers();
-        this.updateSortIndicators();
+        this.loadMembers();
     }
 
     updateSortIndicators() {
@@ -237,150 +329,114 @@ class MembershipDirectory {
         }
     }
 
-    setupTableSorting() {
-        document.querySelectorAll('[data-sort]').forEach(th => {
-            th.addEventListener('click', () => {
-                const column = th.dataset.sort;
-                this.sortMembers(column);
-            });
-            
-            // Add keyboard support
-            th.addEventListener('keydown', (e) => {
-                if (e.key === 'Enter' || e.key === ' ') {
-                    e.preventDefault();
-                    const column = th.dataset.sort;
-                    this.sortMembers(column);
-                }
-            });
-            
-            th.setAttribute('tabindex', '0');
-            th.setAttribute('role', 'button');
-            th.setAttribute('aria-label', `Panga kwa ${th.textContent}`);
-        });
+    renderHeader(column, label) {
+        return `<th data-sort="${column}" class="sortable" tabindex="0" role="columnheader"
+                    aria-label="Panga kwa ${label}">${label}</th>`;
     }
 
-    displayMembers() {
-        const startIndex = (this.currentPage - 1) * this.itemsPerPage;
-        const endIndex = startIndex + this.itemsPerPage;
-        const pageMembers = this.filteredMembers.slice(startIndex, endIndex);
+    renderRow(member, index) {
+        return `
+            <tr role="row">
+                <td role="cell">${this.escapeHtml(member.membership_id) || '-'}</td>
+                <td role="cell">${this.escapeHtml(member.full_name)}</td>
+                <td role="cell">${this.translateGender(member.gender)}</td>
+                <td role="cell">${member.age_category || '-'}</td>
+                <td role="cell">${this.formatPhoneNumbers(member.phone, member.emergency_phone)}</td>
+                <td role="cell">${this.translateMembershipType(member.membership_type)}</td>
+                <td role="cell">${this.formatDate(member.registration_date)}</td>
+                <td role="cell">
+                    <div class="member-actions">
+                        <button class="action-btn view-btn" data-index="${index}"
+                                aria-label="Ona maelezo ya ${this.escapeHtml(member.full_name)}">
+                            Ona
+                        </button>
+                    </div>
+                </td>
+            </tr>
+        `;
+    }
 
+    displayMembers() {
         const tableContainer = document.querySelector('.table-container');
         if (!tableContainer) return;
 
-        const tableHTML = `
-            <table class="member-table" role="table">
-                <thead>
-                    <tr role="row">
-                        <th data-sort="membership_id" class="sortable" tabindex="0" role="columnheader">ID</th>
-                        <th data-sort="full_name" class="sortable" tabindex="0" role="columnheader">Jina Kamili</th>
-                        <th data-sort="gender" class="sortable" tabindex="0" role="columnheader">Jinsia</th>
-                        <th data-sort="age_category" class="sortable" tabindex="0" role="columnheader">Umri</th>
-                        <th data-sort="phone" class="sortable" tabindex="0" role="columnheader">Namba za Simu</th>
-                        <th data-sort="membership_type" class="sortable" tabindex="0" role="columnheader">Aina ya Ushirika</th>
-                        <th data-sort="registration_date" class="sortable" tabindex="0" role="columnheader">Tarehe ya Usajili</th>
-                        <th role="columnheader">Vitendo</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    ${pageMembers.map(member => `
-                        <tr role="row" data-member-id="${member.membership_id}">
-                            <td role="cell">${member.membership_id}</td>
-                            <td role="cell">${this.escapeHtml(member.full_name)}</td>
-                            <td role="cell">${this.translateGender(member.gender)}</td>
-                            <td role="cell">${member.age_category || '-'}</td>
-                            <td role="cell">${this.formatPhoneNumbers(member.phone, member.emergency_phone)}</td>
-                            <td role="cell">${this.translateMembershipType(member.membership_type)}</td>
-                            <td role="cell">${this.formatDate(member.registration_date)}</td>
-                            <td role="cell">
-                                <div class="member-actions">
-                                    <button class="action-btn view-btn" 
-                                            onclick="memberDirectory.showMemberDetails(${member.membership_id})"
-                                            aria-label="Ona maelezo ya ${member.full_name}">
-                                        Ona
-                                    </button>
-                                </div>
-                            </td>
-                        </tr>
-                    `).join('')}
-                </tbody>
-            </table>
-        `;
+        const tbody = tableContainer.querySelector('.member-table tbody');
+        const rendered = tbody ? tbody.rows.length : 0;
 
-        tableContainer.innerHTML = tableHTML;
-        this.setupTableSorting();
-        this.updateSortIndicators();
+        if (tbody && rendered <= this.members.length && rendered > 0) {
+            // Append only the newly loaded page
+            tbody.insertAdjacentHTML('beforeend',
+                this.members.slice(rendered).map((member, i) => this.renderRow(member, rendered + i)).join(''));
+        } else {
+            tableContainer.innerHTML = `
+                <table class="member-table" role="table">
+                    <thead>
+                        <tr role="row">
+                            ${this.renderHeader('membership_id', 'ID')}
+                            ${this.renderHeader('full_name', 'Jina Kamili')}
+                            ${this.renderHeader('gender', 'Jinsia')}
+                            ${this.renderHeader('age_category', 'Umri')}
+                            <th role="columnheader">Namba za Simu</th>
+                            ${this.renderHeader('membership_type', 'Aina ya Ushirika')}
+                            ${this.renderHeader('registration_date', 'Tarehe ya Usajili')}
+                            <th role="columnheader">Vitendo</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+                        ${this.members.map((member, i) => this.renderRow(member, i)).join('')}
+                    </tbody>
+                </table>
+            `;
+            this.updateSortIndicators();
+        }
         this.updatePagination();
     }
 
     updatePagination() {
-        const totalPages = Math.ceil(this.filteredMembers.length / this.itemsPerPage);
-        const startItem = (this.currentPage - 1) * this.itemsPerPage + 1;
-        const endItem = Math.min(this.currentPage * this.itemsPerPage, this.filteredMembers.length);
-
-        // Update pagination info
         const paginationInfo = document.querySelector('.pagination-info');
         if (paginationInfo) {
-            paginationInfo.textContent = `Inaonyesha ${startItem}-${endItem} ya ${this.filteredMembers.length} washirika`;
+            paginationInfo.textContent = this.members.length === 0
+                ? 'Hakuna washirika wanaolingana na utafutaji'
+                : `Inaonyesha washirika ${this.members.length}${this.nextUrl ? ' (wapo zaidi)' : ''}`;
         }
 
-        // Update pagination buttons
         const pagination = document.querySelector('.pagination');
         if (!pagination) return;
 
-        let paginationHTML = `
-            <button class="page-btn" ${this.currentPage === 1 ? 'disabled' : ''} 
-                    onclick="memberDirectory.goToPage(${this.currentPage - 1})"
-                    aria-label="Ukurasa wa awali">
-                ← Awali
-            </button>
-        `;
-
-        // Page numbers
-        const maxVisiblePages = 5;
-        let startPage = Math.max(1, this.currentPage - Math.floor(maxVisiblePages / 2));
-        let endPage = Math.min(totalPages, startPage + maxVisiblePages - 1);
-
-        if (endPage - startPage + 1 < maxVisiblePages) {
-            startPage = Math.max(1, endPage - maxVisiblePages + 1);
+        if (this.observer) {
+            this.observer.disconnect();
         }
-
-        for (let i = startPage; i <= endPage; i++) {
-            paginationHTML += `
-                <button class="page-btn ${i === this.currentPage ? 'active' : ''}"
-                        onclick="memberDirectory.goToPage(${i})"
-                        aria-label="Ukurasa ${i}"
-                        ${i === this.currentPage ? 'aria-current="page"' : ''}>
-                    ${i}
-                </button>
-            `;
+        if (!this.nextUrl) {
+            pagination.innerHTML = '';
+            return;
         }
 
-        paginationHTML += `
-            <button class="page-btn" ${this.currentPage === totalPages ? 'disabled' : ''} 
-                    onclick="memberDirectory.goToPage(${this.currentPage + 1})"
-                    aria-label="Ukurasa wa mwisho">
-                Mwisho →
+        // The button doubles as the infinite-scroll sentinel
+        pagination.innerHTML = `
+            <button class="page-btn load-more-btn" aria-label="Pakia washirika zaidi">
+                Pakia zaidi ↓
             </button>
         `;
+        const loadMoreBtn = pagination.querySelector('.load-more-btn');
+        loadMoreBtn.addEventListener('click', () => this.loadNextPage());
 
-        pagination.innerHTML = paginationHTML;
-    }
-
-    goToPage(page) {
-        const totalPages = Math.ceil(this.filteredMembers.length / this.itemsPerPage);
-        if (page >= 1 && page <= totalPages) {
-            this.currentPage = page;
-            this.displayMembers();
+        if ('IntersectionObserver' in window) {
+            this.observer = new IntersectionObserver((entries) => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    this.loadNextPage();
+                }
+            }, { rootMargin: '200px' });
+            this.observer.observe(loadMoreBtn);
         }
     }
 
-    showMemberDetails(memberId) {
-        const member = this.members.find(m => m.membership_id === memberId);
+    showMemberDetails(index) {
+        const member = this.members[index];
         if (!member) return;
 
         const modal = document.getElementById('memberModal');
         const modalContent = document.querySelector('.member-details');
-        
+
         if (!modal || !modalContent) return;
 
         modalContent.innerHTML = `
@@ -392,7 +448,7 @@ class MembershipDirectory {
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Jinsia:</span>
-                    <span class="detail-value">${this.translateGender(member.gender)}</span>
+                    <span class="detail-value">${this.translateGender(member.gender) || '-'}</span>
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Kundi la Umri:</span>
@@ -407,23 +463,23 @@ class MembershipDirectory {
                     <span class="detail-value">${this.translateMaritalStatus(member.marital_status)}</span>
                 </div>
             </div>
-            
+
             <div class="detail-section">
                 <h4>Taarifa za Mawasiliano</h4>
                 <div class="detail-item">
                     <span class="detail-label">Namba ya Simu:</span>
-                    <span class="detail-value">${member.phone || '-'}</span>
+                    <span class="detail-value">${this.escapeHtml(member.phone) || '-'}</span>
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Barua Pepe:</span>
-                    <span class="detail-value">${member.email || '-'}</span>
+                    <span class="detail-value">${this.escapeHtml(member.email) || '-'}</span>
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Anuani:</span>
-                    <span class="detail-value">${this.escapeHtml(member.address)}</span>
+                    <span class="detail-value">${this.escapeHtml(member.address) || '-'}</span>
                 </div>
             </div>
-            
+
             <div class="detail-section">
                 <h4>Taarifa za Kiroho</h4>
                 <div class="detail-item">
@@ -432,7 +488,7 @@ class MembershipDirectory {
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Amebatizwa:</span>
-                    <span class="detail-value">${member.baptized === 'Yes' ? 'Ndio' : 'Hapana'}</span>
+                    <span class="detail-value">${member.baptized ? (member.baptized === 'Yes' ? 'Ndio' : 'Hapana') : '-'}</span>
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Tarehe ya Ubatizo:</span>
@@ -444,27 +500,27 @@ class MembershipDirectory {
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Kanisa la Awali:</span>
-                    <span class="detail-value">${member.previous_church || '-'}</span>
+                    <span class="detail-value">${this.escapeHtml(member.previous_church) || '-'}</span>
                 </div>
             </div>
-            
+
             <div class="detail-section">
                 <h4>Mtu wa Dharura na Ushirika</h4>
                 <div class="detail-item">
                     <span class="detail-label">Jina la Mtu wa Dharura:</span>
-                    <span class="detail-value">${this.escapeHtml(member.emergency_name)}</span>
+                    <span class="detail-value">${this.escapeHtml(member.emergency_name) || '-'}</span>
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Mahusiano:</span>
-                    <span class="detail-value">${this.escapeHtml(member.emergency_relation)}</span>
+                    <span class="detail-value">${this.escapeHtml(member.emergency_relation) || '-'}</span>
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Simu ya Dharura:</span>
-                    <span class="detail-value">${member.emergency_phone}</span>
+                    <span class="detail-value">${this.escapeHtml(member.emergency_phone) || '-'}</span>
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Aina ya Ushirika:</span>
-                    <span class="detail-value">${this.translateMembershipType(member.membership_type)}</span>
+                    <span class="detail-value">${this.translateMembershipType(member.membership_type) || '-'}</span>
                 </div>
                 <div class="detail-item">
                     <span class="detail-label">Tarehe ya Usajili:</span>
@@ -474,7 +530,7 @@ class MembershipDirectory {
         `;
 
         modal.classList.add('show');
-        
+
         // Focus management for accessibility
         const closeBtn = modal.querySelector('.close-btn');
         if (closeBtn) {
@@ -490,52 +546,20 @@ class MembershipDirectory {
     }
 
     exportToCSV() {
-        const headers = [
-            'ID', 'Jina Kamili', 'Jinsia', 'Kundi la Umri', 'Tarehe ya Kuzaliwa',
-            'Hali ya Ndoa', 'Simu', 'Barua Pepe', 'Anuani', 'Tarehe ya Kuokoka',
-            'Amebatizwa', 'Tarehe ya Ubatizo', 'Darasa la Ushirika', 'Kanisa la Awali',
-            'Jina la Mtu wa Dharura', 'Mahusiano', 'Simu ya Dharura',
-            'Aina ya Ushirika', 'Tarehe ya Usajili'
-        ];
-
-        const csvContent = [
-            headers.join(','),
-            ...this.filteredMembers.map(member => [
-                member.membership_id,
-                `"${member.full_name}"`,
-                this.translateGender(member.gender),
-                member.age_category || '',
-                member.dob || '',
-                this.translateMaritalStatus(member.marital_status),
-                member.phone || '',
-                member.email || '',
-                `"${member.address}"`,
-                member.salvation_date || '',
-                member.baptized === 'Yes' ? 'Ndio' : 'Hapana',
-                member.baptism_date || '',
-                this.translateMembershipClass(member.membership_class),
-                member.previous_church || '',
-                `"${member.emergency_name}"`,
-                `"${member.emergency_relation}"`,
-                member.emergency_phone,
-                this.translateMembershipType(member.membership_type),
-                member.registration_date
-            ].join(','))
-        ].join('\n');
-
-        const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-        const link = document.createElement('a');
-        const url = URL.createObjectURL(blob);
-        link.setAttribute('href', url);
-        link.setAttribute('download', `orodha_ya_washirika_${new Date().toISOString().split('T')[0]}.csv`);
-        link.style.visibility = 'hidden';
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
+        // The server streams every matching member, not just the loaded pages
+        const params = new URLSearchParams();
+        if (this.searchTerm) params.set('search', this.searchTerm);
+        Object.entries(FILTER_PARAMS).forEach(([filter, param]) => {
+            if (this.filters[filter]) params.set(param, this.filters[filter]);
+        });
+
+        const query = params.toString();
+        window.location.href = `/api/members/export/${query ? `?${query}` : ''}`;
     }
 
     // Utility functions
     escapeHtml(text) {
+        if (text === null || text === undefined) return '';
         const map = {
             '&': '&amp;',
             '<': '&lt;',
@@ -543,7 +567,7 @@ class MembershipDirectory {
             '"': '&quot;',
             "'": '&#039;'
         };
-        return text.replace(/[&<>"']/g, m => map[m]);
+        return String(text).replace(/[&<>"']/g, m => map[m]);
     }
 
     formatDate(dateString) {
@@ -582,15 +606,15 @@ class MembershipDirectory {
 
     formatPhoneNumbers(phone, emergencyPhone) {
         const phones = [];
-        
+
         if (phone && phone.trim()) {
-            phones.push(`<div><strong>Simu:</strong> ${phone}</div>`);
+            phones.push(`<div><strong>Simu:</strong> ${this.escapeHtml(phone)}</div>`);
         }
-        
+
         if (emergencyPhone && emergencyPhone.trim()) {
-            phones.push(`<div><strong>Dharura:</strong> ${emergencyPhone}</div>`);
+            phones.push(`<div><strong>Dharura:</strong> ${this.escapeHtml(emergencyPhone)}</div>`);
         }
-        
+
         return phones.length > 0 ? phones.join('') : '-';
     }
 
@@ -622,10 +646,10 @@ document.addEventListener('DOMContentLoaded', () => {
     memberDirectory = new MembershipDirectory();
 });
 
-// Handle page visibility changes for performance
+// Drop cached pages when the user returns to the tab so edits made
+// elsewhere show up on the next query
 document.addEventListener('visibilitychange', () => {
     if (document.visibilityState === 'visible' && memberDirectory) {
-        // Refresh data when page becomes visible (optional)
-        // memberDirectory.loadMembers();
+        memberDirectory.cache.clear();
     }
 });